@@ -0,0 +1,103 @@
+# Benchmark of the Customer Sales Table builders against the pipeline they replaced.
+# Usage: python benchmarks/bench_summaries.py [rows ...]   (default 1000000 10000000)
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# The app's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from discount_calc import discount
+from sales_query import sales_query
+from utilities import month_order
+
+
+GROUPS = 400
+DETAIL = ["Material Family", "Material Group", "Material Description"]
+
+# Sales lines typed the way apply_sales_schema types them
+def make_sales(rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+
+    def category(values, size=rows):
+        values = np.asarray(values)
+        return pd.Categorical.from_codes(rng.integers(0, len(values), size), categories=values)
+
+    material = rng.integers(0, 12, rows)
+    descriptions = np.array([f"{g} Grade {i}" for g in ["PP", "LLDPE", "HDPE"] for i in range(4)])
+    df = pd.DataFrame({
+        "Regional Office": category(["North", "South", "East", "West", "Central"]),
+        "Sold-to Group": category([f"Group {i}" for i in range(GROUPS)]),
+        "Material Group": pd.Categorical(np.array(["PP", "LLDPE", "HDPE"])[material // 4]),
+        "Material Description": pd.Categorical(descriptions[material]),
+        "Fiscal Year": rng.integers(2023, 2026, rows).astype("int16"),
+        "Month Name": pd.Categorical(np.array(month_order)[rng.integers(0, 12, rows)],
+                                     categories=month_order, ordered=True),
+        "Quantity": rng.integers(1, 50, rows) * 25.0,
+    })
+    df["Material Family"] = pd.Categorical(np.where(material < 4, "PP", "PE"))
+    return df
+
+# MOU and non-zero average inputs as the home dashboard passes them
+def make_group_inputs(seed: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    keys = pd.MultiIndex.from_product([[f"Group {i}" for i in range(GROUPS)], ["PP", "PE"]],
+                                      names=["Sold-to Group", "Material Family"]).to_frame(index=False)
+    mou = keys.assign(**{"MOU Qty": rng.integers(0, 400, len(keys)) * 100.0})
+    non_zero = keys.assign(**{"Non-Zero Avg Qty": rng.random(len(keys)) * 4e4,
+                              "%Non-Zero Avg": rng.random(len(keys)) * 150})
+    return mou, non_zero
+
+# Detail groupby, family groupby + pivot, pivot_table and merge - the steps both
+# builders ran before the single aggregation
+def legacy_detail_pivot(sales_agg: pd.DataFrame, index_list: list) -> pd.DataFrame:
+    family_totals = (sales_agg.groupby(index_list + ["Material Family"], as_index=False, observed=True)["Quantity"]
+                     .sum().pivot(index=index_list, columns="Material Family", values="Quantity").fillna(0.0)
+                     .rename(columns={"PP": "Total PP Qty", "PE": "Total PE Qty"}).reset_index())
+    sales_pivot = sales_agg.pivot_table(index=index_list, columns=DETAIL, values="Quantity",
+                                        aggfunc="sum", fill_value=0.0, observed=True)
+    sales_pivot.columns = [f"{fam} | {grp} | {desc}" for fam, grp, desc in sales_pivot.columns]
+    return sales_pivot.reset_index().merge(family_totals, on=index_list, how="left")
+
+def legacy_mou_sales(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df["Quantity"] = pd.to_numeric(df["Quantity"], errors="coerce").fillna(0.0)
+    keys = ["Regional Office", "Sold-to Group"] + DETAIL
+    for col in keys:
+        df[col] = df[col].astype(str)
+    sales_agg = df.groupby(keys, as_index=False, observed=True)["Quantity"].sum()
+    return legacy_detail_pivot(sales_agg, ["Regional Office", "Sold-to Group"])
+
+def legacy_sales_summary(df: pd.DataFrame, index_list: list) -> pd.DataFrame:
+    return legacy_detail_pivot(sales_query.sum_by(df, index_list + DETAIL), index_list)
+
+def best_of(fn, repeat: int = 3) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1_000_000, 10_000_000]
+    mou, non_zero = make_group_inputs()
+    print(f"{'rows':>12} {'table':<36} {'before (s)':>11} {'after (s)':>10} {'speedup':>8}")
+    for rows in sizes:
+        df = make_sales(rows)
+        cases = [
+            ("build_sales_mou_summary",
+             lambda: legacy_mou_sales(df),
+             lambda: discount.build_sales_mou_summary(df, mou, non_zero)),
+            ("build_sales_summary (FY, Month)",
+             lambda: legacy_sales_summary(df, ["Fiscal Year", "Month Name"]),
+             lambda: discount.build_sales_summary(df, ["Fiscal Year", "Month Name"])),
+            ("build_sales_summary (Office, Group)",
+             lambda: legacy_sales_summary(df, ["Regional Office", "Sold-to Group"]),
+             lambda: discount.build_sales_summary(df, ["Regional Office", "Sold-to Group"])),
+        ]
+        for name, before, after in cases:
+            t_before, t_after = best_of(before), best_of(after)
+            print(f"{rows:>12,} {name:<36} {t_before:>11.3f} {t_after:>10.3f} {t_before / t_after:>7.1f}x")
+        del df
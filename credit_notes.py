@@ -0,0 +1,260 @@
+import os
+import json
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import streamlit as st
+import pandas as pd
+from discount_calc import discount, DISCOUNT_TYPES
+from discount_cache import discount_cache
+from discount_engine import discount_engine
+from discount_rules import discount_rules
+
+
+FISCAL_START = 4  # April
+
+# Frames apply_discount reads from the session - a worker gets them as arguments, the
+# sales rows cut down to its fiscal year
+SESSION_FRAMES = ["Sales Data", "CMR Data", "MOU Data"]
+# Worker processes of a batch - each holds a copy of its year's frames
+MAX_WORKERS = 4
+# Grain and measures of the long-format result
+CREDIT_NOTE_KEYS = ["Regional Office", "Sold-to Party", "Sold-to-Party Name", "Sold-to Group"]
+CREDIT_NOTE_VALUES = ["Quantity", "Month Credit Note", "Annual Credit Note"]
+# Slices of a month a rule can touch, and the evaluated months kept per session
+SLICE_KEYS = ["Material Group", "Sold-to Group"]
+MAX_CACHED_MONTHS = 24
+# Loaded frames an evaluated month depends on - a reload of any of them starts it afresh
+MONTH_SOURCES = ["Sales Data", "CMR Data", "MOU Data", "Group Data"]
+
+class credit_notes():
+
+    # (Year, Month) of every month of a fiscal year, April to March
+    @staticmethod
+    def fiscal_months(fiscal_year: int) -> list[tuple[int, int]]:
+        return ([(fiscal_year, month) for month in range(FISCAL_START, 13)] +
+                [(fiscal_year + 1, month) for month in range(1, FISCAL_START)])
+
+    # Credit notes of one month per customer, as the Credit Notes page computes them.
+    # frames stand in for the session frames; cache_version is the discount JSON's
+    @staticmethod
+    def month_credit_notes(discount_json: dict, year: int, month: int, frames: dict = None,
+                           cache_version=None) -> pd.DataFrame:
+        df = discount.session_frame("Sales Data", frames)
+        filtered_df = df[(df["Year"] == year) & (df["Month"] == month)].copy()
+        monthly_discounts = discount.filter_discounts_for_month(discount_json, year, month, cache_version)
+        if not monthly_discounts or filtered_df.empty:
+            return None
+
+        df_with_discount = discount_cache.apply_discount(filtered_df, monthly_discounts, year, month, frames,
+                                                         cache_version)
+        result = (df_with_discount
+                  .groupby(CREDIT_NOTE_KEYS, as_index=False, observed=True)[CREDIT_NOTE_VALUES].sum())
+        result.insert(0, "Fiscal Year", year if month >= FISCAL_START else year - 1)
+        result.insert(1, "Year", year)
+        result.insert(2, "Month", month)
+        return result
+
+    # Session frames cut down to what one fiscal year's months read - its sales rows (by
+    # the Fiscal Year column and by Year / Month) plus the CMR and MOU tables. The rows get
+    # a data_version of their own, so a worker's caches never mix two years' slices
+    @staticmethod
+    def fiscal_year_frames(fiscal_year: int) -> dict:
+        frames = {name: st.session_state[name] for name in SESSION_FRAMES}
+        sales = frames["Sales Data"]
+        month = pd.to_numeric(sales["Month"]).to_numpy()
+        year = pd.to_numeric(sales["Year"]).to_numpy()
+        rows = ((sales["Fiscal Year"] == fiscal_year).to_numpy()
+                | (np.where(month >= FISCAL_START, year, year - 1) == fiscal_year))
+        sales = sales[rows]
+        version = sales.attrs.get("data_version")
+        sales.attrs = {**sales.attrs, "data_version": None if version is None else f"{version}/FY{fiscal_year}"}
+        frames["Sales Data"] = sales
+        return frames
+
+    # One month; failures are reported instead of stopping the batch
+    @staticmethod
+    def run_month(discount_json: dict, year: int, month: int, frames: dict = None, cache_version=None) -> tuple:
+        try:
+            return year, month, credit_notes.month_credit_notes(discount_json, year, month, frames, cache_version), None
+        except Exception as e:
+            return year, month, None, f"{type(e).__name__}: {e}"
+
+    # Some months of one fiscal year in a worker, from the year's frames it was handed
+    @staticmethod
+    def run_months(discount_json: dict, months: list[tuple[int, int]], frames: dict, cache_version=None) -> list[tuple]:
+        return [credit_notes.run_month(discount_json, year, month, frames, cache_version)
+                for year, month in months]
+
+    # Credit notes of every month of the fiscal years in one long frame. Months run in
+    # parallel worker processes - each fiscal year's months are dealt out across the
+    # workers, so a single year uses all of them; workers=1 runs them here, one after another
+    @staticmethod
+    def compute_fiscal_years(fiscal_years: list[int], discount_json: dict, workers: int = None,
+                             cache_version=None) -> pd.DataFrame:
+        months = {fiscal_year: credit_notes.fiscal_months(fiscal_year) for fiscal_year in fiscal_years}
+        workers = min(sum(len(m) for m in months.values()), MAX_WORKERS, workers or os.cpu_count() or 1)
+
+        if workers <= 1:
+            results = [credit_notes.run_month(discount_json, year, month, cache_version=cache_version)
+                       for fiscal_year in fiscal_years
+                       for year, month in months[fiscal_year]]
+        else:
+            # spawn - forking a server process that runs threads is not safe
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = []
+                for fiscal_year in fiscal_years:
+                    frames = credit_notes.fiscal_year_frames(fiscal_year)
+                    # Every workers-th month, so early and late months share the load
+                    futures += [pool.submit(credit_notes.run_months, discount_json,
+                                            months[fiscal_year][start::workers], frames, cache_version)
+                                for start in range(workers)]
+                done = {}
+                for future in futures:
+                    for result in future.result():
+                        done[result[:2]] = result
+            # Back in calendar order, as the serial path returns them
+            results = [done[(year, month)] for fiscal_year in fiscal_years for year, month in months[fiscal_year]]
+
+        monthly = [frame for _, _, frame, _ in results if frame is not None]
+        result = (pd.concat(monthly, ignore_index=True) if monthly else
+                  pd.DataFrame(columns=["Fiscal Year", "Year", "Month"] + CREDIT_NOTE_KEYS + CREDIT_NOTE_VALUES))
+        result.attrs = {
+            "errors": {f"{year}-{month:02d}": error for year, month, _, error in results if error},
+            "months_computed": len(monthly),
+        }
+        return result
+
+    # Content key of a discount record - a modified record is a removed one plus an added one
+    @staticmethod
+    def record_key(record: dict) -> str:
+        return json.dumps(record, sort_keys=True, default=str)
+
+    # {discount type: (removed records, added records)} between two monthly discount sets.
+    # None when they cannot be patched - a discount type appeared or went away (the result's
+    # columns change), or the records both sets share are in a different order
+    @staticmethod
+    def rule_changes(old_discounts: dict, new_discounts: dict) -> dict:
+        if old_discounts.keys() != new_discounts.keys():
+            return None
+
+        changes = {}
+        for discount_type in new_discounts:
+            old_keys = [credit_notes.record_key(r) for r in old_discounts[discount_type]]
+            new_keys = [credit_notes.record_key(r) for r in new_discounts[discount_type]]
+            kept = Counter(old_keys) & Counter(new_keys)
+
+            split = []
+            for keys, records in ((old_keys, old_discounts[discount_type]), (new_keys, new_discounts[discount_type])):
+                left, same, changed = kept.copy(), [], []
+                for key, record in zip(keys, records):
+                    if left[key] > 0:
+                        left[key] -= 1
+                        same.append(key)
+                    else:
+                        changed.append(record)
+                split.append((same, changed))
+
+            (old_same, removed), (new_same, added) = split
+            if old_same != new_same:
+                return None
+            if removed or added:
+                changes[discount_type] = (removed, added)
+        return changes
+
+    # {record key: {slice code, ...}} - the (Material Group, Sold-to Group) slices of the
+    # month each record's billing lines fall in, coded as discount_engine.key_codes codes them
+    @staticmethod
+    def touched_slices(filtered_df: pd.DataFrame, discounts: dict, slice_codes: np.ndarray,
+                       cache_version=None) -> dict:
+        compiled = discount_rules.compile(discounts, cache_version)
+        records = [(discount_type, rule) for discount_type in DISCOUNT_TYPES
+                   for rule in compiled.get(discount_type, ())]
+        rule_ids, positions = discount_engine.match(filtered_df, [rule for _, rule in records])
+
+        touched = {}
+        n_slices = int(slice_codes.max()) + 1 if len(slice_codes) else 1
+        pairs = np.unique(rule_ids * n_slices + slice_codes[positions])
+        for rule_id, code in zip(pairs // n_slices, pairs % n_slices):
+            discount_type, rule = records[rule_id]
+            record = discounts[discount_type][rule.position]
+            touched.setdefault(credit_notes.record_key(record), set()).add(int(code))
+        return touched
+
+    # Credit-note change per slice the patch re-evaluated, only where something changed
+    @staticmethod
+    def delta_report(old_lines: pd.DataFrame, new_lines: pd.DataFrame, rows: np.ndarray,
+                     year: int, month: int) -> pd.DataFrame:
+        values = ["Month Credit Note", "Annual Credit Note"]
+        old = old_lines.iloc[rows].groupby(SLICE_KEYS, as_index=False, observed=True, dropna=False)[values].sum()
+        new = new_lines.iloc[rows].groupby(SLICE_KEYS, as_index=False, observed=True, dropna=False)[values].sum()
+        delta = old.merge(new, on=SLICE_KEYS, suffixes=(" Before", " After"))
+        for col in values:
+            delta[f"{col} Change"] = delta[f"{col} After"] - delta[f"{col} Before"]
+        delta = delta[(delta["Month Credit Note Change"] != 0) | (delta["Annual Credit Note Change"] != 0)]
+        delta.insert(0, "Year", year)
+        delta.insert(1, "Month", month)
+        return delta.reset_index(drop=True)
+
+    # Month's billing lines with discounts, and the delta report of the last scheme change.
+    # After the first full evaluation of a month, a change to its schemes re-evaluates only
+    # the lines of the slices the added / removed records touch, and patches them into the
+    # kept result. Group totals for slab rates come from the kept aggregates. cache_version is
+    # the one the discount file was read with
+    @staticmethod
+    def evaluate_month(filtered_df: pd.DataFrame, monthly_discounts: dict, year: int, month: int,
+                       cache_version=None):
+        cache = st.session_state.setdefault("Credit Note Months", {})
+        versions = tuple(st.session_state[name].attrs.get("data_version") if name in st.session_state else None
+                         for name in MONTH_SOURCES)
+        month_key = (versions, year, month)
+        entry = cache.get(month_key)
+
+        changes = None
+        if entry is not None and entry["index"].equals(filtered_df.index):
+            changes = credit_notes.rule_changes(entry["discounts"], monthly_discounts)
+
+        if changes is None:
+            memo = discount_engine.new_memo(per_frame=False)
+            slice_codes, _ = discount_engine.key_codes(filtered_df, SLICE_KEYS)
+            lines = discount_cache.apply_discount(filtered_df, monthly_discounts, year, month,
+                                                  cache_version=cache_version)
+            delta = None
+        elif not changes:
+            return entry["lines"], entry["delta"]
+        else:
+            memo, slice_codes = entry["memo"], entry["slice_codes"]
+            slices = set()
+            for discount_type, (removed, added) in changes.items():
+                for record in removed:
+                    slices |= entry["touched"].get(credit_notes.record_key(record), set())
+                for touched in credit_notes.touched_slices(filtered_df, {discount_type: added}, slice_codes).values():
+                    slices |= touched
+
+            rows = np.flatnonzero(np.isin(slice_codes, list(slices)))
+            lines = entry["lines"].copy()
+            if len(rows):
+                patch = discount.apply_discount(filtered_df, monthly_discounts, year, month, memo, rows,
+                                                cache_version=cache_version)
+                for col in patch.columns:
+                    if patch[col].dtype == float:
+                        column = lines[col].to_numpy(dtype=float, copy=True)
+                        column[rows] = patch[col].to_numpy()
+                        lines[col] = column
+                lines.attrs = dict(patch.attrs)
+            delta = credit_notes.delta_report(entry["lines"], lines, rows, year, month)
+
+        if month_key not in cache and len(cache) >= MAX_CACHED_MONTHS:
+            cache.pop(next(iter(cache)))
+        cache[month_key] = {
+            "index": filtered_df.index,
+            "discounts": monthly_discounts,
+            "lines": lines,
+            "memo": memo,
+            "slice_codes": slice_codes,
+            "touched": credit_notes.touched_slices(filtered_df, monthly_discounts, slice_codes, cache_version),
+            "delta": delta,
+        }
+        return lines, delta
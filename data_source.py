@@ -0,0 +1,235 @@
+import os
+import json
+import duckdb
+import streamlit as st
+import pandas as pd
+from gsheet_api import gsheet_api
+
+
+# Backend used when st.secrets has no [data_source] section
+DEFAULT_BACKEND = "sheets"
+LOCAL_EXTENSIONS = [".parquet", ".csv"]
+# Sheet layout of each worksheet mirrored into a local replica
+REPLICA_META = "replica.json"
+
+# Google Sheets - the production source
+class sheets_backend():
+
+    @staticmethod
+    def revision(config: dict) -> str:
+        return gsheet_api.source_revision(st.secrets["file_address"]["SPREADSHEET_URL"])
+
+    @staticmethod
+    def read_worksheets(config: dict, worksheet_names: list[str]) -> dict:
+        frames = gsheet_api.batch_get_frames(st.secrets["file_address"]["SPREADSHEET_URL"], worksheet_names)
+        for df in frames.values():
+            df.attrs["source"] = "sheets"
+        return frames
+
+    # Header and the raw rows from start_row down, in one request
+    @staticmethod
+    def read_rows(config: dict, worksheet_name: str, start_row: int) -> tuple[list, list]:
+        header_values, rows = gsheet_api.batch_get_values(st.secrets["file_address"]["SPREADSHEET_URL"], [
+            gsheet_api.worksheet_range(worksheet_name, 1, 1),
+            gsheet_api.worksheet_range(worksheet_name, start_row),
+        ])
+        return (header_values[0] if header_values else []), rows
+
+# Folder with one <worksheet>.parquet or <worksheet>.csv per worksheet
+class local_backend():
+
+    @staticmethod
+    def worksheet_path(config: dict, worksheet_name: str) -> str:
+        for ext in LOCAL_EXTENSIONS:
+            path = os.path.join(config["path"], worksheet_name + ext)
+            if os.path.exists(path):
+                return path
+        raise FileNotFoundError(f"No local extract for worksheet {worksheet_name} in {config['path']}")
+
+    # Changes whenever a file in the folder is rewritten
+    @staticmethod
+    def revision(config: dict) -> str:
+        stats = [
+            os.stat(os.path.join(config["path"], name))
+            for name in sorted(os.listdir(config["path"]))
+            if os.path.splitext(name)[1] in LOCAL_EXTENSIONS
+        ]
+        return f"local@{max((s.st_mtime_ns for s in stats), default=0)}-{sum(s.st_size for s in stats)}"
+
+    @staticmethod
+    def read_worksheets(config: dict, worksheet_names: list[str]) -> dict:
+        frames = {}
+        for name in worksheet_names:
+            path = local_backend.worksheet_path(config, name)
+            df = pd.read_parquet(path) if path.endswith(".parquet") else pd.read_csv(path)
+            frames[name] = with_sheet_attrs(df)
+        return frames
+
+    # Mirror worksheets as CSV - parsed back with the same type inference as a sheet read
+    @staticmethod
+    def write_worksheets(config: dict, frames: dict):
+        os.makedirs(config["path"], exist_ok=True)
+        layout = local_backend.read_layout(config)
+        for name, df in frames.items():
+            path = os.path.join(config["path"], name + ".csv")
+            df.to_csv(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+            layout[name] = {"header": df.attrs.get("header"), "sheet_rows": df.attrs.get("sheet_rows")}
+        local_backend.write_layout(config, layout)
+
+    # Add rows read from the sheet below a mirrored worksheet that ends on the row above
+    # them. Any other replica is left for the next full read to rewrite
+    @staticmethod
+    def append_rows(config: dict, worksheet_name: str, header: list, rows: list, start_row: int):
+        layout = local_backend.read_layout(config)
+        mirrored = layout.get(worksheet_name, {})
+        path = os.path.join(config["path"], worksheet_name + ".csv")
+        if not os.path.exists(path) or mirrored.get("header") != header or mirrored.get("sheet_rows") != start_row - 1:
+            return
+
+        columns = pd.read_csv(path, nrows=0).columns
+        df = gsheet_api.values_to_frame(header, rows).reindex(columns=columns)
+        df.to_csv(path, mode="a", header=False, index=False)
+        layout[worksheet_name] = {"header": header, "sheet_rows": start_row - 1 + len(rows)}
+        local_backend.write_layout(config, layout)
+
+    @staticmethod
+    def read_layout(config: dict) -> dict:
+        path = os.path.join(config["path"], REPLICA_META)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def write_layout(config: dict, layout: dict):
+        path = os.path.join(config["path"], REPLICA_META)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(layout, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+# DuckDB database file with one table per worksheet
+class duckdb_backend():
+
+    @staticmethod
+    def revision(config: dict) -> str:
+        stat = os.stat(config["path"])
+        return f"duckdb@{stat.st_mtime_ns}-{stat.st_size}"
+
+    @staticmethod
+    def read_worksheets(config: dict, worksheet_names: list[str]) -> dict:
+        with duckdb.connect(config["path"], read_only=True) as con:
+            return {
+                name: with_sheet_attrs(con.execute('SELECT * FROM "{}"'.format(name.replace('"', '""'))).df())
+                for name in worksheet_names
+            }
+
+BACKENDS = {
+    "sheets": sheets_backend,
+    "local": local_backend,
+    "duckdb": duckdb_backend,
+}
+
+# Header and row count the way a sheet read reports them
+def with_sheet_attrs(df: pd.DataFrame) -> pd.DataFrame:
+    df.attrs["header"] = [str(col) for col in df.columns]
+    df.attrs["sheet_rows"] = len(df) + 1
+    return df
+
+class data_source():
+
+    # [data_source] backend / path, plus an optional fallback_backend / fallback_path
+    @staticmethod
+    def config() -> dict:
+        return dict(st.secrets.get("data_source", {}))
+
+    @staticmethod
+    def backend_name() -> str:
+        return data_source.config().get("backend", DEFAULT_BACKEND)
+
+    # Primary backend, then the fallback if one is configured
+    @staticmethod
+    def chain() -> list:
+        config = data_source.config()
+        chain = [(BACKENDS[config.get("backend", DEFAULT_BACKEND)], config)]
+        if config.get("fallback_backend"):
+            chain.append((BACKENDS[config["fallback_backend"]], {"path": config.get("fallback_path")}))
+        return chain
+
+    # Appended-row ingest reads row ranges, which only the sheet supports
+    @staticmethod
+    def supports_incremental() -> bool:
+        return data_source.backend_name() == "sheets"
+
+    # Revision of the primary only - while it is down the caches keep serving what they hold
+    @staticmethod
+    def revision() -> str:
+        backend, config = data_source.chain()[0]
+        return backend.revision(config)
+
+    # Worksheet name -> raw frame
+    @staticmethod
+    def read_worksheets(worksheet_names: list[str]) -> dict:
+        frames = data_source.first_available(
+            lambda backend, config: backend.read_worksheets(config, worksheet_names),
+            on_fallback=data_source.mark_fallback)
+        data_source.refresh_replica(frames)
+        return frames
+
+    # Header and raw rows from start_row down. Only the sheet reads row ranges
+    # (supports_incremental), so there is no fallback; the replica gets the rows too
+    @staticmethod
+    def read_rows(worksheet_name: str, start_row: int) -> tuple[list, list]:
+        backend, config = data_source.chain()[0]
+        header, rows = backend.read_rows(config, worksheet_name, start_row)
+        data_source.refresh_replica_rows(worksheet_name, header, rows, start_row)
+        return header, rows
+
+    # Fallback frames can be older than the primary's revision - nothing may be cached
+    # under that revision from them
+    @staticmethod
+    def mark_fallback(frames: dict) -> dict:
+        for df in frames.values():
+            df.attrs["source"] = "fallback"
+        return frames
+
+    @staticmethod
+    def is_fallback(df: pd.DataFrame) -> bool:
+        return df.attrs.get("source") == "fallback"
+
+    # A local fallback is kept up to date with every successful Sheets read
+    @staticmethod
+    def refresh_replica(frames: dict):
+        config = data_source.config()
+        if (config.get("fallback_backend") != "local" or data_source.backend_name() != "sheets"
+                or any(df.attrs.get("source") != "sheets" for df in frames.values())):
+            return
+        try:
+            local_backend.write_worksheets({"path": config["fallback_path"]}, frames)
+        except OSError:
+            pass  # a stale replica is still better than none
+
+    # ... and with the rows appended to a worksheet between full reads
+    @staticmethod
+    def refresh_replica_rows(worksheet_name: str, header: list, rows: list, start_row: int):
+        config = data_source.config()
+        if config.get("fallback_backend") != "local" or data_source.backend_name() != "sheets" or not rows:
+            return
+        try:
+            local_backend.append_rows({"path": config["fallback_path"]}, worksheet_name, header, rows, start_row)
+        except OSError:
+            pass
+
+    # Serve from the fallback while the primary backend is failing. A fallback result
+    # goes through on_fallback
+    @staticmethod
+    def first_available(call, on_fallback=None):
+        chain = data_source.chain()
+        for i, (backend, config) in enumerate(chain):
+            try:
+                result = call(backend, config)
+            except Exception:
+                if i == len(chain) - 1:
+                    raise
+                continue
+            return result if i == 0 or on_fallback is None else on_fallback(result)
@@ -0,0 +1,108 @@
+import time
+import uuid
+import threading
+import streamlit as st
+from data_source import data_source
+
+
+# Seconds a dimension table is served without asking the source whether it changed
+DIMENSION_TTLS = {
+    "CMR Data": 6 * 3600,
+    "Group Data": 6 * 3600,
+    "MOU Data": 6 * 3600,
+}
+DEFAULT_TTL = 3600
+
+class dimension_cache():
+
+    # Process-wide store shared by all sessions
+    @staticmethod
+    @st.cache_resource
+    def get_store():
+        return {
+            "entries": {},      # name -> {"data", "revision", "checked_at"}
+            "locks": {},        # name -> lock, so a table is loaded once at a time
+            "stats": {},        # name -> hit / miss / revalidated counters
+            "lock": threading.Lock(),
+        }
+
+    @staticmethod
+    def current_revision():
+        return data_source.revision()
+
+    # Cached table, reloaded only when its TTL ran out and the source revision moved.
+    # Given a revision, the TTL is skipped - the table is the one read at that revision
+    @staticmethod
+    def get(name: str, loader, revision=None):
+        store = dimension_cache.get_store()
+        with store["lock"]:
+            name_lock = store["locks"].setdefault(name, threading.Lock())
+            stats = store["stats"].setdefault(name, {"hits": 0, "misses": 0, "revalidated": 0})
+
+        with name_lock:
+            entry = store["entries"].get(name)
+            ttl = DIMENSION_TTLS.get(name, DEFAULT_TTL)
+
+            if revision is not None:
+                if entry is not None and entry["revision"] == revision:
+                    entry["checked_at"] = time.time()
+                    stats["hits"] += 1
+                    return entry["data"].copy()
+            elif entry is not None and time.time() - entry["checked_at"] < ttl:
+                stats["hits"] += 1
+                return entry["data"].copy()
+
+            if revision is None and entry is not None:
+                try:
+                    revision = dimension_cache.current_revision()
+                except Exception:
+                    # Source unreachable - keep serving what we have
+                    revision = entry["revision"]
+                if revision is not None and revision == entry["revision"]:
+                    entry["checked_at"] = time.time()
+                    stats["revalidated"] += 1
+                    stats["hits"] += 1
+                    return entry["data"].copy()
+
+            stats["misses"] += 1
+            if revision is None:
+                try:
+                    revision = dimension_cache.current_revision()
+                except Exception:
+                    revision = None
+            data = loader()
+            # Identifies this load to the caches built on top of the table
+            data.attrs["data_version"] = uuid.uuid4().hex
+            if data_source.is_fallback(data):
+                # Replica table - not held under the primary's revision, and retried on the next get
+                store["entries"][name] = {"data": data, "revision": None, "checked_at": 0}
+            else:
+                store["entries"][name] = {"data": data, "revision": revision, "checked_at": time.time()}
+            return data.copy()
+
+    # Table has to be fetched (or at least revalidated) on the next get - with a revision,
+    # on the next get at that revision
+    @staticmethod
+    def needs_load(name: str, revision=None) -> bool:
+        entry = dimension_cache.get_store()["entries"].get(name)
+        if entry is None or (revision is not None and entry["revision"] != revision):
+            return True
+        return time.time() - entry["checked_at"] >= DIMENSION_TTLS.get(name, DEFAULT_TTL)
+
+    # Invalidation hook - drop one, several or all tables
+    @staticmethod
+    def invalidate(names=None):
+        store = dimension_cache.get_store()
+        with store["lock"]:
+            if names is None:
+                store["entries"].clear()
+            else:
+                for name in ([names] if isinstance(names, str) else names):
+                    store["entries"].pop(name, None)
+
+    # Hit / miss counters per table, for profiling
+    @staticmethod
+    def stats() -> dict:
+        store = dimension_cache.get_store()
+        with store["lock"]:
+            return {name: dict(counts) for name, counts in store["stats"].items()}
@@ -0,0 +1,165 @@
+import os
+import json
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+import pandas as pd
+import streamlit as st
+from discount_calc import discount
+
+
+FISCAL_START = 4  # April
+CACHE_DIR = os.path.join(".cache", "discount_results")
+# Results are evicted least recently used first once the folder passes this size
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+# Most recent results also kept in memory, in front of the disk
+MEMORY_ENTRIES = 8
+# Session frames apply_discount reads besides the month's lines, and the sales columns
+# the annual and non-zero-average pivots take from the rest of the fiscal year
+CONTEXT_FRAMES = ["CMR Data", "MOU Data"]
+CONTEXT_COLUMNS = ["Year", "Month", "Quantity", "Sold-to Group", "Material Family"]
+# Part of every result key - bump it with any change to how discount_calc or discount_engine
+# compute a result, so results stored by the old code are not served
+ENGINE_VERSION = 1
+
+class discount_cache():
+
+    # Context hashes per loaded sales frame and recent results, shared by all sessions
+    @staticmethod
+    @st.cache_resource
+    def get_store():
+        return {"context": {}, "recent": OrderedDict(), "lock": threading.Lock()}
+
+    # Content hash of a frame - columns, dtypes, index and values
+    @staticmethod
+    def frame_hash(df: pd.DataFrame) -> str:
+        digest = hashlib.sha256()
+        digest.update(json.dumps([[str(c) for c in df.columns], [str(d) for d in df.dtypes]]).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    # Hash of everything else a month's result depends on - the fiscal year's sales (annual
+    # and non-zero-average pivots), warehouse distances and MOUs. Kept per loaded sales frame
+    # and loaded CMR / MOU tables - each load has its own data_version
+    @staticmethod
+    def context_hash(fiscal_year, frames: dict = None) -> str:
+        sales = discount.session_frame("Sales Data", frames)
+        context = [(st.session_state if frames is None else frames).get(name) for name in CONTEXT_FRAMES]
+        versions = tuple(None if frame is None else frame.attrs.get("data_version") for frame in [sales] + context)
+        context_key = (versions, fiscal_year)
+        store = discount_cache.get_store()
+        with store["lock"]:
+            cached = store["context"].get(context_key)
+        if cached is not None and None not in versions:
+            return cached
+
+        digest = hashlib.sha256()
+        digest.update(discount_cache.frame_hash(sales.loc[sales["Fiscal Year"] == fiscal_year, CONTEXT_COLUMNS]).encode())
+        for frame in context:
+            digest.update(b"-" if frame is None else discount_cache.frame_hash(frame).encode())
+        with store["lock"]:
+            # Hashes of earlier loads are never asked for again
+            store["context"] = {k: v for k, v in store["context"].items() if k[0] == versions}
+            store["context"][context_key] = digest.hexdigest()
+        return digest.hexdigest()
+
+    # Hash of a month's lines - their values, not just which rows they are, as callers may
+    # pass lines they edited. A month is a small share of the data, hashed in milliseconds
+    @staticmethod
+    def slice_hash(filtered_df: pd.DataFrame) -> str:
+        return discount_cache.frame_hash(filtered_df)
+
+    # Content address of one apply_discount call
+    @staticmethod
+    def result_key(filtered_df: pd.DataFrame, monthly_discounts: dict, select_year, select_month,
+                   frames: dict = None) -> str:
+        fiscal_year = select_year if select_month >= FISCAL_START else select_year - 1
+        digest = hashlib.sha256()
+        digest.update(str(ENGINE_VERSION).encode())
+        digest.update(discount_cache.slice_hash(filtered_df).encode())
+        digest.update(json.dumps(monthly_discounts, sort_keys=True, default=str).encode())
+        digest.update(json.dumps([int(select_year), int(select_month)]).encode())
+        digest.update(discount_cache.context_hash(fiscal_year, frames).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def path(key: str) -> str:
+        return os.path.join(CACHE_DIR, f"{key}.pkl")
+
+    # Stored result, or None. A hit refreshes the file's time for LRU eviction
+    @staticmethod
+    def load(key: str) -> pd.DataFrame:
+        path = discount_cache.path(key)
+        try:
+            df = pd.read_pickle(path)
+            os.utime(path)
+            return df
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Half-written or unreadable entry - recomputed and rewritten
+            discount_cache.remove(path)
+            return None
+
+    # Write to a temp file first so readers never see half a result
+    @staticmethod
+    def save(key: str, df: pd.DataFrame):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = os.path.join(CACHE_DIR, f"{key}.{uuid.uuid4().hex}.tmp")
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, discount_cache.path(key))
+        discount_cache.evict()
+
+    # Oldest-used results first, until the folder is under the size cap
+    @staticmethod
+    def evict(max_bytes: int = None):
+        max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+        entries = []
+        with os.scandir(CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith(".pkl"):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            discount_cache.remove(path)
+            total -= size
+
+    @staticmethod
+    def remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    # discount.apply_discount, served from the cache when this exact month, discount set
+    # and context were evaluated before - by any session or an earlier run. Callers get
+    # their own copy. frames stand in for the session frames
+    @staticmethod
+    def apply_discount(filtered_df: pd.DataFrame, monthly_discounts: dict, select_year, select_month,
+                       frames: dict = None, cache_version=None) -> pd.DataFrame:
+        key = discount_cache.result_key(filtered_df, monthly_discounts, select_year, select_month, frames)
+        store = discount_cache.get_store()
+        with store["lock"]:
+            df = store["recent"].get(key)
+            if df is not None:
+                store["recent"].move_to_end(key)
+                return df.copy()
+
+        df = discount_cache.load(key)
+        if df is None:
+            df = discount.apply_discount(filtered_df, monthly_discounts, select_year, select_month,
+                                         frames=frames, cache_version=cache_version)
+            discount_cache.save(key, df)
+        with store["lock"]:
+            store["recent"][key] = df
+            while len(store["recent"]) > MEMORY_ENTRIES:
+                store["recent"].popitem(last=False)
+        return df.copy()
@@ -9,10 +9,25 @@ import pandas as pd
 from calendar import monthrange
 import numpy as np
 import utilities
+from sales_query import sales_query
+from discount_engine import discount_engine
+from discount_rules import discount_rules, discount_rule
+from sales_history import sales_history
 
 
 FISCAL_START = 4  # April
 
+# Discount types in the order apply_discount applies them
+DISCOUNT_TYPES = [
+    "MOU Discount", "Freight Discount", "Early Bird", "Price Protection",
+    "X-Y Scheme", "Hidden Discount", "Quantity Discount", "Annual Quantity Discount",
+]
+# Types whose rate comes from customer-group slabs, kept in a column of the same name
+SLAB_TYPES = ["X-Y Scheme", "Hidden Discount", "Quantity Discount", "Annual Quantity Discount"]
+# Per-line rate column of the flat-rate types
+RATE_COLUMNS = {"Early Bird": "Early Bird Discount", "Price Protection": "Price Protection"}
+TOTAL_COLUMNS = ["Month Credit Note", "Annual Credit Note", "Month Discount", "Net Discount"]
+
 class discount():
 
     # Connect to Google drive for JSON
@@ -43,6 +58,12 @@ class discount():
         fh.seek(0)
         return json.load(fh)
     
+    # A session frame - from frames when the caller hands them over (worker processes),
+    # else from st.session_state
+    @staticmethod
+    def session_frame(name: str, frames: dict = None) -> pd.DataFrame:
+        return (st.session_state if frames is None else frames)[name]
+
     # Append existing JSON to new discount entry
     @staticmethod
     def append_discount(existing_json: dict, discount_payload: dict):
@@ -88,8 +109,16 @@ class discount():
         ).execute()
 
     # Applying Discount
+    # Every applicable record is matched to its billing lines in one interval join, then each
+    # discount type adds its rates with a few column operations - in record order, so the
+    # result is the same as applying the records one at a time.
+    # rows (positions) limits the evaluation to those lines - group totals are still taken
+    # over all of filtered_df - and only they are returned; memo carries aggregates over
+    # from an earlier evaluation of the same lines. frames stand in for the session frames;
+    # cache_version is the one monthly_discounts' file was read with
     @staticmethod
-    def apply_discount(filtered_df: pd.DataFrame, monthly_discounts: dict, select_year, select_month):
+    def apply_discount(filtered_df: pd.DataFrame, monthly_discounts: dict, select_year, select_month,
+                       memo: dict = None, rows: np.ndarray = None, frames: dict = None, cache_version=None):
 
         df = filtered_df.copy()
         df["Month Credit Note"] = 0.0
@@ -97,75 +126,8 @@ class discount():
         df["Month Discount"] = 0.0
         df["Net Discount"] = 0.0
 
-        def apply_mask (df,material_groups,disc_start,disc_end):
-            mask = (
-                    df["Material Group"].isin(material_groups) &
-                    (df["Billing Date"] >= disc_start) &
-                    (df["Billing Date"] <= disc_end)
-                )
-            return mask
-
-        # if "Cash Discount" in monthly_discounts:
-          
-        #     discounts = monthly_discounts["Cash Discount"]
-        #     for disc in discounts:
-        #         discount_amount = disc.get("discount_amount", 0.0)
-        #         material_groups = disc.get("material_groups", [])
-
-        #         # Normalize material groups (safety)
-        #         if isinstance(material_groups, str):
-        #             material_groups = [material_groups]
-
-        #         # Parse discount validity dates
-        #         disc_start = pd.to_datetime(disc["start_date"])
-        #         disc_end = pd.to_datetime(disc["end_date"])
-
-        #         # Build combined eligibility mask
-        #         mask = (
-        #             df["Material Group"].isin(material_groups) &
-        #             (df["Billing Date"] >= disc_start) &
-        #             (df["Billing Date"] <= disc_end)
-        #         )
-        #         df.loc[mask, "Cash Discount"] = (
-        #             discount_amount
-        #         )
-        #         df.loc[mask, "Cash Discount Amount"] = (
-        #             df.loc[mask, "Quantity"] * discount_amount
-        #         )
-        #         df["Total Credit Note"] += df["Cash Discount Amount"]
-        #         df["Total Discount"] += df["Cash Discount Amount"]
-
-        if "MOU Discount" in monthly_discounts:
-            
-            discounts = monthly_discounts["MOU Discount"]
-            for disc in discounts:
-                month_discount_amount = disc.get("monthly_component", 0.0)
-                annual_discount_amount = disc.get("annual_component", 0.0)
-                material_groups = disc.get("material_groups", [])
-
-                # Normalize material groups (safety)
-                if isinstance(material_groups, str):
-                    material_groups = [material_groups]
-
-                disc_start = pd.to_datetime(disc["start_date"])
-                disc_end = pd.to_datetime(disc["end_date"])
-
-                # Build combined eligibility mask
-                mask = apply_mask (df,material_groups,disc_start,disc_end)
-
-                df.loc[mask, "Month MOU Discount"] = (month_discount_amount)
-
-                df.loc[mask, "Annual MOU Discount"] = (annual_discount_amount)
-
-                df.loc[mask,"Month Credit Note"] += df.loc[mask,"Month MOU Discount"]*df.loc[mask, "Quantity"]
-                df.loc[mask,"Month Discount"] += df.loc[mask,"Month MOU Discount"]
-                df.loc[mask,"Net Discount"] += df.loc[mask,"Month MOU Discount"] + df.loc[mask,"Annual MOU Discount"]
-                df.loc[mask,"Annual Credit Note"] += df.loc[mask,"Annual MOU Discount"]*df.loc[mask, "Quantity"]
-                
         if "Freight Discount" in monthly_discounts:
-            
-            discounts = monthly_discounts["Freight Discount"]
-            cmr_df = st.session_state["CMR Data"]
+            cmr_df = discount.session_frame("CMR Data", frames)
             # Merge distance into sales
             df = df.merge(
                 cmr_df[["Ship-to Party", "Warehouse Distance"]],
@@ -176,353 +138,201 @@ class discount():
             if df["Warehouse Distance"].isna().any():
                 missing = df[df["Warehouse Distance"].isna()]["Ship-to Party"].unique()
                 raise ValueError(f"Missing distance for Ship-to Party: {missing}")
-            
-            for disc in discounts:
-                less_dist_value = disc.get("less_dist_value", 0.0)
-                high_dist_value = disc.get("high_dist_value", 0.0)
-                material_groups = disc.get("material_groups", [])
-
-                # Normalize material groups (safety)
-                if isinstance(material_groups, str):
-                    material_groups = [material_groups]
 
-                disc_start = pd.to_datetime(disc["start_date"])
-                disc_end = pd.to_datetime(disc["end_date"])
+        # Compiled records of every type, in the order the types are applied
+        compiled = discount_rules.compile(monthly_discounts, cache_version)
+        rules, positions = discount_engine.match(df, [
+            discount_rule
+            for discount_type in DISCOUNT_TYPES
+            for discount_rule in compiled.get(discount_type, ())
+        ])
+        if rows is not None:
+            in_rows = np.isin(positions, rows)
+            rules, positions = rules[in_rows], positions[in_rows]
+        quantity = df["Quantity"].to_numpy(dtype=float)
+
+        # (positions, amounts) added to each total column, in record order
+        additions = {col: [] for col in TOTAL_COLUMNS}
+        # Group pivots shared by the records of this call
+        if memo is None:
+            memo = discount_engine.new_memo()
+
+        first = 0
+        for discount_type in DISCOUNT_TYPES:
+            if discount_type not in monthly_discounts:
+                continue
+            type_rules = compiled[discount_type]
+            in_type = (rules >= first) & (rules < first + len(type_rules))
+            rule, pos = rules[in_type] - first, positions[in_type]
+            first += len(type_rules)
+
+            def amounts(field):
+                return np.array([getattr(r, field) for r in type_rules], dtype=float)[rule]
+
+            def add(col, values):
+                additions[col].append((pos, values))
+
+            def set_rate(col, values):
+                base = (df[col].to_numpy(dtype=float, copy=True) if col in df.columns
+                        else np.full(len(df), np.nan))
+                df[col] = discount_engine.last_value(base, pos, values)
+
+            def add_rate(col, values):
+                base = df[col].to_numpy(dtype=float, copy=True)
+                df[col], running = discount_engine.running_sum(base, pos, values)
+                return running
+
+            if discount_type in SLAB_TYPES:
+                for col in [discount_type]:
+                    if col not in df.columns:
+                        df[col] = 0.0
+                    else:
+                        df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
+
+            if not type_rules:
+                continue
 
-                # Build combined eligibility mask
-                mask = apply_mask (df,material_groups,disc_start,disc_end)
+            if discount_type == "MOU Discount":
+                month_rate = amounts("monthly_component")
+                annual_rate = amounts("annual_component")
+                set_rate("Month MOU Discount", month_rate)
+                set_rate("Annual MOU Discount", annual_rate)
 
-                df.loc[mask, "Freight Discount"] = df.loc[mask, "Warehouse Distance"].apply(
-                    lambda d: less_dist_value if pd.notna(d) and d <= 100 else high_dist_value)
+                add("Month Credit Note", month_rate * quantity[pos])
+                add("Month Discount", month_rate)
+                add("Net Discount", month_rate + annual_rate)
+                add("Annual Credit Note", annual_rate * quantity[pos])
 
+            elif discount_type == "Freight Discount":
+                distance = df["Warehouse Distance"].to_numpy()[pos]
+                rate = np.where(distance <= 100, amounts("less_dist_value"), amounts("high_dist_value"))
                 df = df.drop("Warehouse Distance", axis=1)
+                set_rate("Freight Discount", rate)
 
-                df.loc[mask,"Month Credit Note"] += df.loc[mask,"Freight Discount"]*df.loc[mask, "Quantity"]
-                df.loc[mask,"Month Discount"] += df.loc[mask,"Freight Discount"]
-                df.loc[mask,"Net Discount"] += df.loc[mask,"Freight Discount"]
-  
-        if "Early Bird" in monthly_discounts:
-            
-            discounts = monthly_discounts["Early Bird"]
-            for disc in discounts:
-                discount_amount = disc.get("discount_amount", 0.0)
-                material_groups = disc.get("material_groups", [])
-
-                # Normalize material groups (safety)
-                if isinstance(material_groups, str):
-                    material_groups = [material_groups]
-
-                disc_start = pd.to_datetime(disc["start_date"])
-                disc_end = pd.to_datetime(disc["end_date"])
-
-                # Build combined eligibility mask
-                mask = apply_mask (df,material_groups,disc_start,disc_end)
-
-                df.loc[mask, "Early Bird Discount"] = (
-                    discount_amount
-                )
-
-                df.loc[mask,"Month Credit Note"] += df.loc[mask,"Early Bird Discount"]*df.loc[mask, "Quantity"]
-                df.loc[mask,"Month Discount"] += df.loc[mask,"Early Bird Discount"]
-                df.loc[mask,"Net Discount"] += df.loc[mask,"Early Bird Discount"]
-
-        if "Price Protection" in monthly_discounts:
-            
-            discounts = monthly_discounts["Price Protection"]
-            for disc in discounts:
-                discount_amount = disc.get("discount_amount", 0.0)
-                material_groups = disc.get("material_groups", [])
-
-                # Normalize material groups (safety)
-                if isinstance(material_groups, str):
-                    material_groups = [material_groups]
-
-                disc_start = pd.to_datetime(disc["start_date"])
-                disc_end = pd.to_datetime(disc["end_date"])
-
-                # Build combined eligibility mask
-                mask = apply_mask (df,material_groups,disc_start,disc_end)
-
-                df.loc[mask, "Price Protection"] = (discount_amount)
-
-                df.loc[mask,"Month Credit Note"] += df.loc[mask,"Price Protection"]*df.loc[mask, "Quantity"]
-                df.loc[mask,"Month Discount"] += df.loc[mask,"Price Protection"]
-                df.loc[mask,"Net Discount"] += df.loc[mask,"Price Protection"]
-
-        if "X-Y Scheme" in monthly_discounts:
-            group_df = pd.DataFrame({'X-Y Scheme': [0]})
-            discounts = monthly_discounts["X-Y Scheme"]
-
-            for col in ["X-Y Scheme"]:
-                if col not in df.columns:
-                    df[col] = 0.0
-                else:
-                    df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
-            for disc in discounts:
-                slabs = disc.get("discount_amount", [])
-                material_groups = disc.get("material_groups", [])
-                basis = disc.get("basis",[])
-                scheme_months = disc.get("scheme_months", [])
-
-                # Normalize material groups (safety)
-                if isinstance(material_groups, str):
-                    material_groups = [material_groups]
-
-                disc_start = pd.to_datetime(disc["start_date"])
-                disc_end = pd.to_datetime(disc["end_date"])
-
-                material_family = "PP" if "PP" in material_groups else "PE"
-
-                if basis == "MOU%":
-                
-                    group_df = discount.prepare_mou_group_pivot(df,select_year, select_month)
-                    group_df = group_df[
-                        group_df["Material Family"] == material_family
-                    ].copy()
-                    # --- SLAB RESOLUTION ---
-                    group_df["X-Y Scheme"] = group_df["%MOU"].apply(
-                        lambda x: discount.get_slab_amount(x, slabs)
-                    )
-               
-                elif basis== "Flat Discount":
-                    
-                     # --- GROUP-LEVEL TOTAL QUANTITY ---
-                    group_df = (
-                        df.groupby("Sold-to Group", as_index=False)["Quantity"].sum())
-                    
-                    # --- SLAB RESOLUTION ---
-                    group_df["X-Y Scheme"] = group_df["Quantity"].apply(
-                        lambda x: discount.get_slab_amount(x, slabs)
-                    )
-
-                elif basis == "Non-Zero Months Avg%":   
-                    group_df = discount.prepare_non_zero_avg_group_pivot(df,scheme_months,
-                                                select_year, select_month)
-                    group_df = group_df[
-                        group_df["Material Family"] == material_family
-                    ].copy()
-                    # --- SLAB RESOLUTION ---
-                    group_df["X-Y Scheme"] = group_df["%Non-Zero Avg"].apply(
-                        lambda x: discount.get_slab_amount(x, slabs)
-                    )
-                    
-                # Common Part
-                hidden_map = (group_df
-                        .set_index("Sold-to Group")["X-Y Scheme"]
-                        .to_dict())
-
-                mask = apply_mask (df,material_groups,disc_start,disc_end)
-
-                df.loc[mask, "X-Y Scheme"] += (
-                        df.loc[mask, "Sold-to Group"]
-                        .map(hidden_map)
-                        .fillna(0.0)
-                    )    
-
-                df.loc[mask,"Month Credit Note"] += df.loc[mask,"X-Y Scheme"]*df.loc[mask, "Quantity"]
-                df.loc[mask,"Month Discount"] += df.loc[mask,"X-Y Scheme"]
-                df.loc[mask,"Net Discount"] += df.loc[mask,"X-Y Scheme"]
-
-        if "Hidden Discount" in monthly_discounts:
-            
-            discounts = monthly_discounts["Hidden Discount"]
-
-            for col in ["Hidden Discount"]:
-                if col not in df.columns:
-                    df[col] = 0.0
-                else:
-                    df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
-            for disc in discounts:
-                slabs = disc.get("discount_amount", [])
-                material_groups = disc.get("material_groups", [])
-                basis = disc.get("basis",[])
-                scheme_months = disc.get("scheme_months", [])
-                
-
-                # Normalize material groups (safety)
-                if isinstance(material_groups, str):
-                    material_groups = [material_groups]
-
-                disc_start = pd.to_datetime(disc["start_date"])
-                disc_end = pd.to_datetime(disc["end_date"])
-
-                material_family = "PP" if "PP" in material_groups else "PE"
-
-                if basis == "MOU%":
-                
-                    group_df = discount.prepare_mou_group_pivot(df,select_year, select_month)
-                    group_df = group_df[
-                        group_df["Material Family"] == material_family
-                    ].copy()
-                    # --- SLAB RESOLUTION ---
-                    group_df["Hidden Discount"] = group_df["%MOU"].apply(
-                        lambda x: discount.get_slab_amount(x, slabs)
-                    )
-               
-                elif basis== "Flat Discount":
-                    
-                    # --- GROUP-LEVEL TOTAL QUANTITY ---
-                    # scheme months == Applicable Material Descriptions
-
-                    group_df = discount.prepare_group_pivot(df,["Sold-to Group","Material Description"])
-
-                    group_df = group_df[
-                        group_df["Material Description"].isin(scheme_months)
-                    ].copy()
-                    group_df = group_df.groupby("Sold-to Group", as_index=False)["Quantity"].sum()  
-
-                    # --- SLAB RESOLUTION ---
-                    group_df["Hidden Discount"] = group_df["Quantity"].apply(
-                        lambda x: discount.get_slab_amount(x, slabs)
-                    )
-                    
-                
-                elif basis == "Non-Zero Months Avg%":
-
-                    group_df = discount.prepare_non_zero_avg_group_pivot(df,scheme_months,
-                                                select_year, select_month)
-                    group_df = group_df[
-                        group_df["Material Family"] == material_family
-                    ].copy()
-                    # --- SLAB RESOLUTION ---
-                    group_df["Hidden Discount"] = group_df["%Non-Zero Avg"].apply(
-                        lambda x: discount.get_slab_amount(x, slabs)
-                    )
-                    
-                # Common Part
-                hidden_map = (
-                        group_df
-                        .set_index("Sold-to Group")["Hidden Discount"]
-                        .to_dict()
-                    )
-
-                mask = apply_mask (df,material_groups,disc_start,disc_end)
-
-                # Multiple Hidden Discounts may be applicable
-                df["_hidden_rule_discount"] = 0.0
-
-                df.loc[mask, "_hidden_rule_discount"] = (
-                    df.loc[mask, "Sold-to Group"]
-                    .map(hidden_map)
-                    .fillna(0.0)
-                )
-                
-                # Accumulate safely
-                df.loc[mask, "Hidden Discount"] += df.loc[mask, "_hidden_rule_discount"]
-                df.loc[mask, "Month Credit Note"] += (
-                    df.loc[mask, "_hidden_rule_discount"] * df.loc[mask, "Quantity"]
-                )
-                df.loc[mask,"Month Discount"] += df.loc[mask,"_hidden_rule_discount"]
-                df.loc[mask, "Net Discount"] += df.loc[mask, "_hidden_rule_discount"]
-
-                # Cleanup temp column
-                df.drop(columns=["_hidden_rule_discount"], inplace=True)
-        
-        if "Quantity Discount" in monthly_discounts:
-            
-            discounts = monthly_discounts["Quantity Discount"]
+                add("Month Credit Note", rate * quantity[pos])
+                add("Month Discount", rate)
+                add("Net Discount", rate)
 
-            for col in ["Quantity Discount"]:
-                if col not in df.columns:
-                    df[col] = 0.0
-                else:
-                    df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
-            for disc in discounts:
-                slabs = disc.get("discount_amount", [])
-                material_groups = disc.get("material_groups", [])
-
-                # Normalize material groups (safety)
-                if isinstance(material_groups, str):
-                    material_groups = [material_groups]
-
-                disc_start = pd.to_datetime(disc["start_date"])
-                disc_end = pd.to_datetime(disc["end_date"])
-
-                material_family = "PP" if "PP" in material_groups else "PE"
-
-                # --- GROUP-LEVEL TOTAL QUANTITY ---
-                group_df = discount.prepare_group_pivot(df, ["Sold-to Group", "Material Family"])
-                
-                # --- SLAB RESOLUTION ---
-                group_df["Quantity Discount"] = group_df["Quantity"].apply(
-                    lambda x: discount.get_slab_amount(x, slabs)
-                )
-
-                # Common Part
-                hidden_map = (
-                        group_df
-                        .set_index(["Sold-to Group", "Material Family"])["Quantity Discount"]
-                        .to_dict()
-                    )
-
-                mask = apply_mask (df,material_groups,disc_start,disc_end)
-
-                df.loc[mask, "Quantity Discount"] += (
-                        df.loc[mask]
-                        .apply(
-                            lambda r: hidden_map.get(
-                                (r["Sold-to Group"], r["Material Family"]),
-                                0.0
-                            ),
-                            axis=1
-                        ))
-                df.loc[mask,"Month Credit Note"] += df.loc[mask,"Quantity Discount"]*df.loc[mask, "Quantity"]
-                df.loc[mask,"Month Discount"] += df.loc[mask,"Quantity Discount"]
-                df.loc[mask,"Net Discount"] += df.loc[mask,"Quantity Discount"]
-
-        if "Annual Quantity Discount" in monthly_discounts:
-            
-            discounts = monthly_discounts["Annual Quantity Discount"]
-
-            for col in ["Annual Quantity Discount"]:
-                if col not in df.columns:
-                    df[col] = 0.0
+            elif discount_type in ["Early Bird", "Price Protection"]:
+                rate = amounts("amount")
+                set_rate(RATE_COLUMNS[discount_type], rate)
+
+                add("Month Credit Note", rate * quantity[pos])
+                add("Month Discount", rate)
+                add("Net Discount", rate)
+
+            else:
+                # Slab rate of every customer group, per record
+                rate_maps = [
+                    discount.slab_rate_map(df, discount_rule, select_year, select_month, memo, frames)
+                    for discount_rule in type_rules
+                ]
+
+                if discount_type in ["X-Y Scheme", "Hidden Discount"]:
+                    rate = discount_engine.lookup(df, ["Sold-to Group"], rate_maps, rule, pos, np.nan)
+                    rate = np.where(np.isnan(rate), 0.0, rate)
                 else:
-                    df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
-            for disc in discounts:
-                slabs = disc.get("discount_amount", [])
-                material_groups = disc.get("material_groups", [])
-
-                # Normalize material groups (safety)
-                if isinstance(material_groups, str):
-                    material_groups = [material_groups]
-
-                disc_start = pd.to_datetime(disc["start_date"])
-                disc_end = pd.to_datetime(disc["end_date"])
-
-                material_family = "PP" if "PP" in material_groups else "PE"
-
-                # --- GROUP-LEVEL TOTAL QUANTITY ---
-                group_df = discount.prepare_annual_quantity_pivot(df, select_year, select_month)
-
-                # --- SLAB RESOLUTION ---
-                group_df["Annual Quantity Discount"] = group_df["Annual Expected Quantity"].apply(
-                    lambda x: discount.get_slab_amount(x, slabs)
-                )
-                
-                # Common Part
-                hidden_map = (
-                        group_df
-                        .set_index(["Sold-to Group", "Material Family"])["Annual Quantity Discount"]
-                        .to_dict()
-                    )
-                
-                mask = apply_mask (df,material_groups,disc_start,disc_end)
-
-                df.loc[mask, "Annual Quantity Discount"] += (
-                        df.loc[mask]
-                        .apply(
-                            lambda r: hidden_map.get(
-                                (r["Sold-to Group"], r["Material Family"]),
-                                0.0
-                            ),
-                            axis=1
-                        ))
-                df.loc[mask,"Annual Credit Note"] += df.loc[mask,"Annual Quantity Discount"]*df.loc[mask, "Quantity"]
-                df.loc[mask,"Net Discount"] += df.loc[mask,"Annual Quantity Discount"]
+                    rate = discount_engine.lookup(df, ["Sold-to Group", "Material Family"], rate_maps, rule, pos)
+                running = add_rate(discount_type, rate)
+
+                # Hidden Discount credits each record's own rate; the others credit the
+                # column's running total
+                if discount_type == "Hidden Discount":
+                    running = rate
 
+                if discount_type == "Annual Quantity Discount":
+                    add("Annual Credit Note", running * quantity[pos])
+                else:
+                    add("Month Credit Note", running * quantity[pos])
+                    add("Month Discount", running)
+                add("Net Discount", running)
+
+        # Accumulate the totals in record order
+        for col, parts in additions.items():
+            if parts:
+                total = df[col].to_numpy(dtype=float, copy=True)
+                for pos, values in parts:
+                    np.add.at(total, pos, values)
+                df[col] = total
+
+        if rows is not None:
+            df = df.iloc[rows]
+        df.attrs["aggregate_memo"] = discount_engine.memo_stats(memo)
         return df
-    
+
+    # {Sold-to Group: rate} of one slab record - keyed by (Sold-to Group, Material Family)
+    # for Quantity and Annual Quantity Discount
+    @staticmethod
+    def slab_rate_map(df: pd.DataFrame, discount_rule: discount_rule, select_year, select_month,
+                      memo: dict = None, frames: dict = None) -> dict:
+        slab_table = (discount_rule.slab_criteria, discount_rule.slab_best)
+
+        # --- SLAB RESOLUTION ---
+        basis_values = discount.slab_basis(df, discount_rule, select_year, select_month, memo, frames)
+        return discount_engine.resolve_slabs(basis_values, slab_table).to_dict()
+
+    # Value the slabs of one record are read against, per Sold-to Group - per
+    # (Sold-to Group, Material Family) for Quantity and Annual Quantity Discount
+    @staticmethod
+    def slab_basis(df: pd.DataFrame, discount_rule: discount_rule, select_year, select_month,
+                   memo: dict = None, frames: dict = None) -> pd.Series:
+        discount_type = discount_rule.discount_type
+        basis = discount_rule.basis
+        scheme_months = discount_rule.scheme_months
+        material_family = discount_rule.material_family
+
+        if discount_type == "Quantity Discount":
+            # --- GROUP-LEVEL TOTAL QUANTITY ---
+            group_df = discount_engine.memoized(memo, df, ("group", "Sold-to Group", "Material Family"),
+                lambda: discount.prepare_group_pivot(df, ["Sold-to Group", "Material Family"]))
+            return group_df.set_index(["Sold-to Group", "Material Family"])["Quantity"]
+
+        if discount_type == "Annual Quantity Discount":
+            # --- GROUP-LEVEL TOTAL QUANTITY ---
+            group_df = discount_engine.memoized(memo, df, ("annual", select_year, select_month),
+                lambda: discount.prepare_annual_quantity_pivot(df, select_year, select_month, memo, frames))
+            return group_df.set_index(["Sold-to Group", "Material Family"])["Annual Expected Quantity"]
+
+        if basis == "MOU%":
+            group_df = discount_engine.memoized(memo, df, ("mou", select_year, select_month),
+                lambda: discount.prepare_mou_group_pivot(df, select_year, select_month, memo, frames))
+            group_df = group_df[
+                group_df["Material Family"] == material_family
+            ]
+            value_col = "%MOU"
+
+        elif basis == "Flat Discount" and discount_type == "X-Y Scheme":
+            # --- GROUP-LEVEL TOTAL QUANTITY ---
+            group_df = discount_engine.memoized(memo, df, ("group_sum", "Sold-to Group"),
+                lambda: df.groupby("Sold-to Group", as_index=False, observed=True)["Quantity"].sum())
+            value_col = "Quantity"
+
+        elif basis == "Flat Discount":
+            # --- GROUP-LEVEL TOTAL QUANTITY ---
+            # scheme months == Applicable Material Descriptions
+            group_df = discount_engine.memoized(memo, df, ("group", "Sold-to Group", "Material Description"),
+                lambda: discount.prepare_group_pivot(df, ["Sold-to Group", "Material Description"]))
+
+            group_df = group_df[
+                group_df["Material Description"].isin(scheme_months)
+            ]
+            group_df = group_df.groupby("Sold-to Group", as_index=False, observed=True)["Quantity"].sum()
+            value_col = "Quantity"
+
+        elif basis == "Non-Zero Months Avg%":
+            group_df = discount_engine.memoized(memo, df, ("non_zero", scheme_months, select_year, select_month),
+                lambda: discount.prepare_non_zero_avg_group_pivot(df, scheme_months, select_year, select_month,
+                                                                  memo, frames))
+            group_df = group_df[
+                group_df["Material Family"] == material_family
+            ]
+            value_col = "%Non-Zero Avg"
+
+        else:
+            raise ValueError(f"Unknown basis {basis} for {discount_type}")
+
+        return group_df.set_index("Sold-to Group")[value_col]
+
     # Retreive Slab Discount
     def get_slab_amount(quantity: float, slabs: list[dict]) -> float:
         """
@@ -537,27 +347,12 @@ class discount():
         return max(applicable) if applicable else 0.0
     
     # Retrieve Discounts for month
-    def filter_discounts_for_month(discount_json, selected_year, selected_month):
+    def filter_discounts_for_month(discount_json, selected_year, selected_month, cache_version=None):
         month_start = pd.Timestamp(selected_year, selected_month, 1)
         month_end = pd.Timestamp(selected_year,selected_month,monthrange(selected_year, selected_month)[1])
 
-        applicable_discounts_json = {}
-
-        for discount_type, records in discount_json.items():
-            valid_records = []
-
-            for r in records:
-                start = pd.to_datetime(r["start_date"])
-                end = pd.to_datetime(r["end_date"])
-
-                # overlap logic
-                if start <= month_end and end >= month_start:
-                    valid_records.append(r)
-
-            if valid_records:
-                applicable_discounts_json[discount_type] = valid_records
-
-        return applicable_discounts_json
+        # overlap logic on the compiled rules' parsed dates
+        return discount_rules.filter_by_period(discount_json, month_start, month_end, cache_version)
     
     # Retrieve discounts for material groups and discount types
     def filter_discounts_for_types(discount_json, material_groups = None, discount_types = None):
@@ -606,17 +401,19 @@ class discount():
         df["Quantity"] = pd.to_numeric(df["Quantity"], errors="coerce").fillna(0)
 
         for col in group_cols:
-            df[col] = df[col].fillna("UNKNOWN").astype(str)
+            df[col] = df[col].astype(object).fillna("UNKNOWN").astype(str)
 
         return (
             df.groupby(group_cols, as_index=False)
             .agg({"Quantity": "sum"})
         )
 
-    def prepare_mou_group_pivot(df: pd.DataFrame,selected_year: int,selected_month: int):
+    def prepare_mou_group_pivot(df: pd.DataFrame,selected_year: int,selected_month: int, memo: dict = None,
+                                frames: dict = None):
         # Current Month Quantity
 
-        current_qty = discount.prepare_group_pivot(df, ["Sold-to Group", "Material Family"])
+        current_qty = discount_engine.memoized(memo, df, ("group", "Sold-to Group", "Material Family"),
+            lambda: discount.prepare_group_pivot(df, ["Sold-to Group", "Material Family"]))
         current_qty = current_qty.rename(columns={"Quantity": "Current Month Qty"})
 
         # Month Boundaries
@@ -624,7 +421,7 @@ class discount():
         month_end = pd.Timestamp(selected_year,selected_month,
             monthrange(selected_year, selected_month)[1])
         # Mou Data
-        mou_df = st.session_state["MOU Data"]
+        mou_df = discount.session_frame("MOU Data", frames)
 
         # Flatten MOU DF
         mou_df = pd.melt(mou_df, id_vars=["Sold-to Party","Sold-to-Party Name","Sold-to Group",
@@ -649,43 +446,21 @@ class discount():
         return pivot
 
     def prepare_non_zero_avg_group_pivot(df: pd.DataFrame,scheme_months: list[int],
-                        selected_year: int,selected_month: int) -> pd.DataFrame:
+                        selected_year: int,selected_month: int, memo: dict = None,
+                        frames: dict = None) -> pd.DataFrame:
         
         # Determine Fiscal Year
         fiscal_year = utilities.get_fiscal_year(selected_month,selected_year)
 
-        full_df = st.session_state["Sales Data"].copy()
-        # st.write(full_df)
-
         # Current Month Quantity
 
-        current_qty = discount.prepare_group_pivot(df, ["Sold-to Group", "Material Family"])
+        current_qty = discount_engine.memoized(memo, df, ("group", "Sold-to Group", "Material Family"),
+            lambda: discount.prepare_group_pivot(df, ["Sold-to Group", "Material Family"]))
         current_qty = current_qty.rename(columns={"Quantity": "Current Month Qty"})
 
-        # 4. Build fiscal historical window
-        def map_fiscal_year(row):
-            return row["Year"] if row["Month"] >= FISCAL_START else row["Year"] - 1
-
-        full_df["Fiscal Year"] = full_df.apply(map_fiscal_year, axis=1)
-
-        history_df = full_df[
-            (full_df["Fiscal Year"] == fiscal_year) &
-            (full_df["Month"].isin(scheme_months))
-        ]
-
-        # Monthly Quantity Aggregation
-        monthly_qty = discount.prepare_group_pivot(history_df,["Sold-to Group", "Material Family", "Month"])
-
-        # Non-Zero Month Average
-        non_zero_avg = (
-            monthly_qty[monthly_qty["Quantity"] > 0]
-            .groupby(
-                ["Sold-to Group", "Material Family"],
-                as_index=False
-            )["Quantity"]
-            .mean()
-            .rename(columns={"Quantity": "Non-Zero Avg Qty"})
-        )
+        # Non-Zero Month Average - from the monthly history kept per data refresh
+        non_zero_avg = sales_history.non_zero_average(discount.session_frame("Sales Data", frames),
+                                                      fiscal_year, scheme_months)
 
         # Merge & Compute %
         pivot = current_qty.merge(non_zero_avg,
@@ -700,10 +475,12 @@ class discount():
 
         return pivot
 
-    def prepare_annual_quantity_pivot(df, selected_year: int,selected_month: int):
-        mou_df = discount.prepare_mou_group_pivot(df,selected_year,selected_month)
+    def prepare_annual_quantity_pivot(df, selected_year: int,selected_month: int, memo: dict = None,
+                                      frames: dict = None):
+        mou_df = discount_engine.memoized(memo, df, ("mou", selected_year, selected_month),
+            lambda: discount.prepare_mou_group_pivot(df, selected_year, selected_month, memo, frames))
         fiscal_year = utilities.get_fiscal_year(selected_month,selected_year)
-        fiscal_df = st.session_state["Sales Data"].copy()
+        fiscal_df = discount.session_frame("Sales Data", frames).copy()
         fiscal_df = fiscal_df[fiscal_df["Fiscal Year"] == fiscal_year]
 
         fiscal_df = discount.prepare_group_pivot(fiscal_df, ["Sold-to Group", "Material Family"])
@@ -725,52 +502,61 @@ class discount():
 
         return pivot
     
-    def build_sales_mou_summary(mtd_df: pd.DataFrame,mou_df: pd.DataFrame, non_zero_pivot: pd.DataFrame) -> pd.DataFrame:
-        df = mtd_df.copy()
-        # 1. Ensure correct dtypes
+    # Detail columns "Family | Group | Description" and family totals per index row, from a
+    # quantity aggregate at that grain - one row per (index, family, group, description),
+    # sorted by those keys as groupby sorts them
+    def pivot_sales_detail(sales_agg: pd.DataFrame, index_list) -> pd.DataFrame:
+        detail = ["Material Family", "Material Group", "Material Description"]
+        quantity = sales_agg["Quantity"].to_numpy(dtype=float)
+
+        # Rows come in sorted order, so first appearance is the pivot's row order
+        row_codes, _ = pd.factorize(pd.MultiIndex.from_frame(sales_agg[index_list]))
+        first_rows = np.unique(row_codes, return_index=True)[1]
+
+        # Detail columns sorted the way pivot_table sorts them
+        col_keys = sales_agg[detail].drop_duplicates().sort_values(detail, kind="stable")
+        col_codes = pd.MultiIndex.from_frame(col_keys).get_indexer(pd.MultiIndex.from_frame(sales_agg[detail]))
+        matrix = np.zeros((len(first_rows), len(col_keys)))
+        matrix[row_codes, col_codes] = quantity
+
+        # FAMILY TOTALS (PP / PE) - summed in the aggregate's order, as a groupby would
+        families = col_keys["Material Family"].drop_duplicates()
+        family_codes = pd.Index(families).get_indexer(sales_agg["Material Family"])
+        family_sums = pd.Series(quantity).groupby([row_codes, family_codes]).sum()
+        totals = np.zeros((len(first_rows), len(families)))
+        totals[family_sums.index.get_level_values(0), family_sums.index.get_level_values(1)] = family_sums.to_numpy()
+
+        names = {"PP": "Total PP Qty", "PE": "Total PE Qty"}
+        return pd.concat([
+            sales_agg[index_list].iloc[first_rows].reset_index(drop=True),
+            pd.DataFrame(matrix, columns=[f"{fam} | {grp} | {desc}" for fam, grp, desc in col_keys.itertuples(index=False)]),
+            pd.DataFrame(totals, columns=[names.get(fam, fam) for fam in families]),
+        ], axis=1)
 
-        df["Quantity"] = pd.to_numeric(df["Quantity"], errors="coerce").fillna(0.0)
+    def build_sales_mou_summary(mtd_df: pd.DataFrame,mou_df: pd.DataFrame, non_zero_pivot: pd.DataFrame) -> pd.DataFrame:
+        keys = ["Regional Office","Sold-to Group","Material Family","Material Group","Material Description"]
+
+        # 1. SALES AGGREGATION - one pass over the raw keys; only the aggregate's keys
+        # are turned into text
+        quantity = pd.to_numeric(mtd_df["Quantity"], errors="coerce").fillna(0.0)
+        sales_agg = (quantity.groupby([mtd_df[col] for col in keys], observed=True, dropna=False)
+                     .sum().rename("Quantity").reset_index())
+        for col in keys:
+            sales_agg[col] = sales_agg[col].astype(str)
+        if sales_agg.duplicated(keys).any():
+            # Distinct keys with the same text
+            sales_agg = sales_agg.groupby(keys, as_index=False)["Quantity"].sum()
+        sales_agg = sales_agg.sort_values(keys, kind="stable").reset_index(drop=True)
+
+        mou_df = mou_df.copy()
         mou_df["MOU Qty"] = pd.to_numeric(mou_df["MOU Qty"], errors="coerce").fillna(0.0)
-
-        for col in ["Sold-to Group", "Regional Office", "Material Family",
-                    "Material Group", "Material Description"]:
-            df[col] = df[col].astype(str)
-
         mou_df["Sold-to Group"] = mou_df["Sold-to Group"].astype(str)
         mou_df["Material Family"] = mou_df["Material Family"].astype(str)
 
-        # 2. SALES AGGREGATION
-        sales_agg = (
-            df.groupby(["Regional Office","Sold-to Group","Material Family",
-                        "Material Group","Material Description",],as_index=False)["Quantity"].sum())
-
-        # 3. FAMILY TOTALS (PP / PE)
-
-        family_totals = (sales_agg.groupby(["Regional Office", "Sold-to Group", "Material Family"],
-                as_index=False)["Quantity"].sum())
-
-        family_totals = family_totals.pivot(
-                                        index=["Regional Office", "Sold-to Group"],
-                                        columns="Material Family",
-                                        values="Quantity").fillna(0.0)
-
-        family_totals = family_totals.rename(columns={"PP": "Total PP Qty","PE": "Total PE Qty"}).reset_index()
+        # 2. DETAIL PIVOT AND FAMILY TOTALS, reshaped from the aggregate
+        sales_pivot = discount.pivot_sales_detail(sales_agg, ["Regional Office", "Sold-to Group"])
 
-        # 4. PIVOT SALES (DETAIL LEVEL)
-
-        sales_pivot = sales_agg.pivot_table(
-                                index=["Regional Office", "Sold-to Group"],
-                                columns=["Material Family", "Material Group", "Material Description"],
-                                values="Quantity",
-                                aggfunc="sum",
-                                fill_value=0.0)
-
-        # Flatten columns
-        sales_pivot.columns = [f"{fam} | {grp} | {desc}"
-            for fam, grp, desc in sales_pivot.columns]
-        sales_pivot = sales_pivot.reset_index()
-
-        # 5. MOU AGGREGATION (ONCE)
+        # 3. MOU AGGREGATION (ONCE)
 
         mou_agg = (mou_df.groupby(["Sold-to Group", "Material Family"],
                             as_index=False)["MOU Qty"]
@@ -784,11 +570,9 @@ class discount():
 
         mou_pivot = mou_pivot.rename(columns={"PP": "MOU PP Qty","PE": "MOU PE Qty"}).reset_index()
 
-        # 6. MERGE EVERYTHING
+        # 4. MERGE EVERYTHING
 
-        final_df = (sales_pivot
-            .merge(family_totals, on=["Regional Office", "Sold-to Group"], how="left")
-            .merge(mou_pivot, on="Sold-to Group", how="left"))
+        final_df = sales_pivot.merge(mou_pivot, on="Sold-to Group", how="left")
 
         for col in ["MOU PP Qty", "MOU PE Qty"]:
             if col not in final_df:
@@ -796,7 +580,7 @@ class discount():
             else:
                 final_df[col] = final_df[col].fillna(0.0)
 
-        # 7. % OF MOU
+        # 5. % OF MOU
 
         final_df["%PP vs MOU"] = np.where(
             final_df["MOU PP Qty"] > 0,
@@ -807,7 +591,7 @@ class discount():
             (final_df["Total PE Qty"] / final_df["MOU PE Qty"] * 100).round(2),0.0)
         
         # -----------------------------
-        # 7. NON-ZERO AVG (FAMILY LEVEL)
+        # 6. NON-ZERO AVG (FAMILY LEVEL)
         # -----------------------------
         nz = non_zero_pivot.copy()
 
@@ -873,7 +657,7 @@ class discount():
                 final_df[col] = final_df[col].fillna(0.0)
 
 
-        # 8. Final column order
+        # 7. Final column order
 
         fixed_cols = [
             "Regional Office",
@@ -898,42 +682,11 @@ class discount():
     
     def build_sales_summary(df: pd.DataFrame, index_list)-> pd.DataFrame:
         full_list = index_list + ["Material Family", "Material Group", "Material Description"]
-        agg_list = index_list + ["Material Family"]
-        # SALES AGGREGATION
-        sales_agg = (
-                df.groupby(full_list,as_index=False)["Quantity"].sum())
-
-        # FAMILY TOTALS (PP / PE)
-
-        family_totals = (sales_agg.groupby(agg_list,
-                as_index=False)["Quantity"].sum())
-
-        family_totals = family_totals.pivot(
-                                        index=index_list,
-                                        columns="Material Family",
-                                        values="Quantity").fillna(0.0)
+        # SALES AGGREGATION - pushed down to DuckDB; the detail pivot and family totals
+        # are reshaped from it
+        sales_agg = sales_query.sum_by(df, full_list)
+        sales_pivot = discount.pivot_sales_detail(sales_agg, index_list)
 
-        family_totals = family_totals.rename(columns={"PP": "Total PP Qty","PE": "Total PE Qty"}).reset_index()
-
-        # PIVOT SALES (DETAIL LEVEL)
-
-        sales_pivot = sales_agg.pivot_table(
-                                index=index_list,
-                                columns=["Material Family", "Material Group", "Material Description"],
-                                values="Quantity",
-                                aggfunc="sum",
-                                fill_value=0.0)
-
-        # Flatten columns
-        sales_pivot.columns = [f"{fam} | {grp} | {desc}"
-            for fam, grp, desc in sales_pivot.columns]
-        sales_pivot = sales_pivot.reset_index()
-
-        # 6. MERGE EVERYTHING
-
-        sales_pivot = (sales_pivot
-            .merge(family_totals, on=index_list, how="left"))
-        
         if ("Month Name" in sales_pivot.columns):
             # Create a mapping for sorting
             month_map = {month: i for i, month in enumerate(utilities.month_order)}
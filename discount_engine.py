@@ -0,0 +1,147 @@
+import numpy as np
+import pandas as pd
+
+
+# Billing Date of a missing date once viewed as int64 nanoseconds
+NAT = np.iinfo(np.int64).min
+
+class discount_engine():
+
+    # One row per (rule, material group) - the intervals billing lines are joined against
+    @staticmethod
+    def interval_table(rules: list, group_codes: dict) -> pd.DataFrame:
+        rows = []
+        for index, rule in enumerate(rules):
+            if rule.start_ns is None:
+                continue
+            codes = dict.fromkeys(group_codes[g] for g in rule.material_groups if g in group_codes)
+            rows.extend((index, code, rule.start_ns, rule.end_ns) for code in codes)
+        return pd.DataFrame(rows, columns=["rule", "group", "start", "end"], dtype="int64")
+
+    # Billing lines matched by every compiled rule in a single interval join.
+    # Returns (rule index, row position) pairs ordered by rule
+    @staticmethod
+    def match(df: pd.DataFrame, rules: list) -> tuple[np.ndarray, np.ndarray]:
+        codes, groups = pd.factorize(df["Material Group"])
+        dates = df["Billing Date"].to_numpy(dtype="datetime64[ns]").view("int64")
+        lines = np.flatnonzero((codes >= 0) & (dates != NAT))
+
+        intervals = discount_engine.interval_table(rules, {g: i for i, g in enumerate(groups)})
+        if intervals.empty or not len(lines):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+        # Lines sorted by (material group, billing date) - every interval is one contiguous run
+        stamps = np.unique(dates[lines])
+        keys = codes[lines].astype(np.int64) * len(stamps) + np.searchsorted(stamps, dates[lines])
+        order = np.argsort(keys, kind="stable")
+        keys, lines = keys[order], lines[order]
+
+        base = intervals["group"].to_numpy() * len(stamps)
+        lo = np.searchsorted(keys, base + np.searchsorted(stamps, intervals["start"].to_numpy(), "left"))
+        hi = np.searchsorted(keys, base + np.searchsorted(stamps, intervals["end"].to_numpy(), "right"))
+        lengths = np.maximum(hi - lo, 0)
+
+        # Expand each run to its row positions
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return np.repeat(intervals["rule"].to_numpy(), lengths), lines[np.repeat(lo, lengths) + offsets]
+
+    # Integer code per row for the key columns, and the key (value or tuple) behind each code
+    @staticmethod
+    def key_codes(df: pd.DataFrame, key_columns: list[str]) -> tuple[np.ndarray, list]:
+        factorized = [pd.factorize(df[col], use_na_sentinel=False) for col in key_columns]
+        combined = np.zeros(len(df), dtype=np.int64)
+        for codes, uniques in factorized:
+            combined = combined * len(uniques) + codes
+        codes, uniques = pd.factorize(combined)
+
+        keys = []
+        for code in uniques:
+            parts = []
+            for _, values in reversed(factorized):
+                code, part = divmod(code, len(values))
+                parts.append(values[part])
+            parts.reverse()
+            keys.append(parts[0] if len(parts) == 1 else tuple(parts))
+        return codes, keys
+
+    # Rate of each matched line from its record's {key: rate} map
+    @staticmethod
+    def lookup(df: pd.DataFrame, key_columns: list[str], rate_maps: list[dict],
+               rules: np.ndarray, positions: np.ndarray, default=0.0) -> np.ndarray:
+        codes, keys = discount_engine.key_codes(df, key_columns)
+        table = np.array([[rate_map.get(key, default) for key in keys] for rate_map in rate_maps],
+                         dtype=float).reshape(len(rate_maps), len(keys))
+        return table[rules, codes[positions]]
+
+    # Column after its records set it - where records overlap, the later one wins
+    @staticmethod
+    def last_value(base: np.ndarray, positions: np.ndarray, values: np.ndarray) -> np.ndarray:
+        column = base.copy()
+        _, last = np.unique(positions[::-1], return_index=True)
+        keep = len(positions) - 1 - last
+        column[positions[keep]] = values[keep]
+        return column
+
+    # Column after its records add to it, and its value right after each match -
+    # added up record by record, as the per-record loop did
+    @staticmethod
+    def running_sum(base: np.ndarray, positions: np.ndarray, values: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        column = base.copy()
+        running = np.empty(len(values))
+        level = pd.Series(positions).groupby(positions).cumcount().to_numpy()
+        for n in range(level.max() + 1 if len(level) else 0):
+            at = level == n
+            column[positions[at]] += values[at]
+            running[at] = column[positions[at]]
+        return column, running
+
+    # Slabs as sorted criteria and the best amount reachable at each of them
+    @staticmethod
+    def compile_slabs(slabs: list[dict]) -> tuple[np.ndarray, np.ndarray]:
+        criteria = np.array([s["criteria"] for s in slabs], dtype=float)
+        amounts = np.array([s["amount"] for s in slabs], dtype=float)
+        order = np.argsort(criteria, kind="stable")
+        return criteria[order], np.maximum.accumulate(amounts[order])
+
+    # Slab amount for a whole column - the highest amount among the slabs whose
+    # criteria the value reaches, 0.0 when it reaches none (as get_slab_amount)
+    @staticmethod
+    def resolve_slabs(values: pd.Series, slab_table: tuple[np.ndarray, np.ndarray]) -> pd.Series:
+        criteria, best = slab_table
+        x = values.to_numpy(dtype=float)
+        reached = np.searchsorted(criteria, x, side="right")
+        amounts = np.where(reached > 0, np.append(0.0, best)[reached], 0.0)
+        return pd.Series(np.where(np.isnan(x), 0.0, amounts), index=values.index)
+
+    # Per-evaluation memo of aggregates, so every distinct pivot is built once per call.
+    # per_frame=False keys aggregates without the frame - for a memo kept across
+    # evaluations of the same month's lines
+    @staticmethod
+    def new_memo(per_frame: bool = True) -> dict:
+        return {
+            "per_frame": per_frame,
+            "entries": {},      # (frame id, aggregate, *keys) -> frame
+            "frames": {},       # frame id -> frame, kept alive so ids are not reused
+            "stats": {},        # aggregate -> hit / miss counters
+        }
+
+    # Aggregate of df under key, computed on first use. Callers get their own copy
+    @staticmethod
+    def memoized(memo: dict, df: pd.DataFrame, key: tuple, compute):
+        if memo is None:
+            return compute()
+        stats = memo["stats"].setdefault(key[0], {"hits": 0, "misses": 0})
+        full_key = (id(df),) + key if memo["per_frame"] else key
+        if full_key in memo["entries"]:
+            stats["hits"] += 1
+        else:
+            stats["misses"] += 1
+            if memo["per_frame"]:
+                memo["frames"][id(df)] = df
+            memo["entries"][full_key] = compute()
+        return memo["entries"][full_key].copy()
+
+    # Hit / miss counters per aggregate, for profiling
+    @staticmethod
+    def memo_stats(memo: dict) -> dict:
+        return {name: dict(counts) for name, counts in memo["stats"].items()}
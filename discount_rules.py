@@ -0,0 +1,221 @@
+import json
+import threading
+from typing import Any, Optional
+import numpy as np
+import pandas as pd
+import streamlit as st
+from pydantic import ConfigDict
+from pydantic.dataclasses import dataclass
+from discount_engine import discount_engine
+
+
+# Compiled discount files kept per process (a file is a few hundred records)
+MAX_COMPILED = 32
+# Period cuts of loaded files kept per process - a couple of years of months per file
+MAX_PERIODS = 256
+
+# One discount record, parsed and checked once. Dates are kept as Timestamps and
+# nanoseconds, material groups as a tuple, slabs as sorted criteria / best-amount arrays
+@dataclass(frozen=True, slots=True, config=ConfigDict(arbitrary_types_allowed=True))
+class discount_rule:
+    discount_type: str
+    position: int                       # index of the record in its type's list
+    start: Optional[pd.Timestamp]
+    end: Optional[pd.Timestamp]
+    start_ns: Optional[int]
+    end_ns: Optional[int]
+    material_groups: tuple[str, ...]
+    material_family: str
+    amount: Optional[float]             # flat discount_amount (None for slab types)
+    monthly_component: Optional[float]
+    annual_component: Optional[float]
+    less_dist_value: Optional[float]
+    high_dist_value: Optional[float]
+    basis: Optional[str]
+    scheme_months: tuple[Any, ...]
+    slab_criteria: np.ndarray
+    slab_best: np.ndarray
+
+class discount_rules():
+
+    # Process-wide compiled files and their interval indexes, keyed by content - and by the
+    # JSON object and its cache_version, so repeat calls on one loaded file skip the fingerprint.
+    # periods holds filter_by_period's cuts of a loaded file, so a month's subset is one object too
+    @staticmethod
+    @st.cache_resource
+    def get_store():
+        return {"compiled": {}, "objects": {}, "periods": {}, "lock": threading.Lock()}
+
+    # (rules, interval index) of a discount JSON - built once per distinct content, so a
+    # saved change to the file (a new cache_version) gets a fresh index. cache_version is
+    # the one the JSON was read with; without it the content is fingerprinted on every call.
+    # A JSON passed with a cache_version must not be edited in place - edit a copy and save it
+    @staticmethod
+    def load(discount_json: dict, cache_version=None) -> tuple[dict, dict]:
+        store = discount_rules.get_store()
+        object_key = (id(discount_json), cache_version)
+        if cache_version is not None:
+            with store["lock"]:
+                held, loaded = store["objects"].get(object_key, (None, None))
+            # The entry holds its JSON, so a matching id is never a reused one
+            if held is discount_json:
+                return loaded
+
+        fingerprint = json.dumps(discount_json, sort_keys=True, default=str)
+        with store["lock"]:
+            loaded = store["compiled"].get(fingerprint)
+        if loaded is not None:
+            discount_rules.remember_object(object_key, discount_json, loaded)
+            return loaded
+
+        compiled = {
+            discount_type: tuple(discount_rules.compile_record(discount_type, position, record)
+                                 for position, record in enumerate(records))
+            for discount_type, records in discount_json.items()
+        }
+        loaded = (compiled, discount_rules.build_index(compiled))
+        with store["lock"]:
+            if len(store["compiled"]) >= MAX_COMPILED:
+                store["compiled"].pop(next(iter(store["compiled"])))
+            store["compiled"][fingerprint] = loaded
+        discount_rules.remember_object(object_key, discount_json, loaded)
+        return loaded
+
+    @staticmethod
+    def remember_object(object_key: tuple, discount_json: dict, loaded: tuple):
+        if object_key[1] is None:
+            return
+        store = discount_rules.get_store()
+        with store["lock"]:
+            if object_key not in store["objects"] and len(store["objects"]) >= MAX_COMPILED:
+                store["objects"].pop(next(iter(store["objects"])))
+            store["objects"][object_key] = (discount_json, loaded)
+
+    # {discount type: (rule, ...)} for a discount JSON
+    @staticmethod
+    def compile(discount_json: dict, cache_version=None) -> dict:
+        return discount_rules.load(discount_json, cache_version)[0]
+
+    # Per (discount type, material group) - and (discount type, None) for every record of
+    # the type - the member positions and the dated rules sorted by start
+    @staticmethod
+    def build_index(compiled: dict) -> dict:
+        index = {}
+        for discount_type, rules in compiled.items():
+            members = {None: list(rules)}
+            for rule in rules:
+                for group in dict.fromkeys(rule.material_groups):
+                    members.setdefault(group, []).append(rule)
+
+            for group, group_rules in members.items():
+                dated = sorted((r for r in group_rules if r.start_ns is not None), key=lambda r: r.start_ns)
+                starts = np.array([r.start_ns for r in dated], dtype=np.int64)
+                ends = np.array([r.end_ns for r in dated], dtype=np.int64)
+                index[(discount_type, group)] = {
+                    "positions": np.array([r.position for r in group_rules], dtype=np.int64),
+                    "starts": starts,
+                    "ends": ends,
+                    "dated": np.array([r.position for r in dated], dtype=np.int64),
+                    # longest record - no record starting earlier than start - this can still be live
+                    "max_length": int(np.maximum(ends - starts, 0).max()) if len(dated) else 0,
+                }
+        return index
+
+    # {discount type: positions} of the records live on at least one day of [start, end], in
+    # file order. Only the records starting in [start - longest record, end] are checked -
+    # two binary searches and the hits. start / end of None leave the period open, and keep
+    # undated records too
+    @staticmethod
+    def overlapping(discount_json: dict, start=None, end=None,
+                    discount_types: list = None, material_groups: list = None, cache_version=None) -> dict:
+        _, index = discount_rules.load(discount_json, cache_version)
+        types = discount_json.keys() if discount_types is None else discount_types
+        groups = [None] if material_groups is None else list(dict.fromkeys(material_groups))
+
+        result = {}
+        for discount_type in types:
+            hits = []
+            for group in groups:
+                entry = index.get((discount_type, group))
+                if entry is None:
+                    continue
+                if start is None and end is None:
+                    hits.append(entry["positions"])
+                    continue
+
+                starts, ends = entry["starts"], entry["ends"]
+                lo = 0 if start is None else np.searchsorted(starts, pd.Timestamp(start).value - entry["max_length"])
+                hi = len(starts) if end is None else np.searchsorted(starts, pd.Timestamp(end).value, side="right")
+                live = np.ones(hi - lo, dtype=bool) if start is None else ends[lo:hi] >= pd.Timestamp(start).value
+                hits.append(entry["dated"][lo:hi][live])
+
+            positions = np.unique(np.concatenate(hits)) if hits else np.empty(0, dtype=np.int64)
+            if len(positions):
+                result[discount_type] = positions.tolist()
+        return result
+
+    @staticmethod
+    def compile_record(discount_type: str, position: int, record: dict) -> discount_rule:
+        material_groups = record.get("material_groups") or []
+
+        # Normalize material groups (safety)
+        if isinstance(material_groups, str):
+            material_groups = [material_groups]
+
+        start = discount_rules.parse_date(record.get("start_date"))
+        end = discount_rules.parse_date(record.get("end_date"))
+
+        amount = record.get("discount_amount", 0.0)
+        slab_criteria, slab_best = discount_engine.compile_slabs(amount if isinstance(amount, list) else [])
+        slab_criteria.flags.writeable = slab_best.flags.writeable = False
+
+        return discount_rule(
+            discount_type=discount_type,
+            position=position,
+            start=start,
+            end=end,
+            start_ns=None if start is None or end is None else start.value,
+            end_ns=None if start is None or end is None else end.value,
+            material_groups=tuple(material_groups),
+            material_family="PP" if "PP" in material_groups else "PE",
+            amount=None if isinstance(amount, list) else amount,
+            monthly_component=record.get("monthly_component", 0.0),
+            annual_component=record.get("annual_component", 0.0),
+            less_dist_value=record.get("less_dist_value", 0.0),
+            high_dist_value=record.get("high_dist_value", 0.0),
+            basis=record.get("basis") or None,
+            scheme_months=tuple(record.get("scheme_months") or []),
+            slab_criteria=slab_criteria,
+            slab_best=slab_best,
+        )
+
+    # Same parsing as pd.to_datetime; missing dates become None
+    @staticmethod
+    def parse_date(value) -> Optional[pd.Timestamp]:
+        parsed = pd.to_datetime(value) if value is not None else pd.NaT
+        return None if pd.isna(parsed) else parsed
+
+    # Records of discount_json live in [start, end], in the JSON's shape. With a cache_version
+    # the same loaded file and period give back the same (shared, read-only) dict, so compiling
+    # it with that cache_version is an identity lookup as well
+    @staticmethod
+    def filter_by_period(discount_json: dict, start: pd.Timestamp, end: pd.Timestamp, cache_version=None) -> dict:
+        store = discount_rules.get_store()
+        period_key = (id(discount_json), cache_version, pd.Timestamp(start), pd.Timestamp(end))
+        if cache_version is not None:
+            with store["lock"]:
+                held, period = store["periods"].get(period_key, (None, None))
+            if held is discount_json:
+                return period
+
+        period = {
+            discount_type: [discount_json[discount_type][position] for position in positions]
+            for discount_type, positions in discount_rules.overlapping(
+                discount_json, start, end, cache_version=cache_version).items()
+        }
+        if cache_version is not None:
+            with store["lock"]:
+                if period_key not in store["periods"] and len(store["periods"]) >= MAX_PERIODS:
+                    store["periods"].pop(next(iter(store["periods"])))
+                store["periods"][period_key] = (discount_json, period)
+        return period
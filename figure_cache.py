@@ -0,0 +1,99 @@
+import json
+import hashlib
+import inspect
+import threading
+from collections import OrderedDict
+from functools import wraps
+import pandas as pd
+import plotly.io as pio
+import streamlit as st
+from filter_index import filter_index
+
+
+# Serialized figures are evicted least recently used first once they pass this size
+MAX_FIGURE_BYTES = 64 * 1024 * 1024
+
+class figure_cache():
+
+    # Figure JSON by key, shared by all sessions
+    @staticmethod
+    @st.cache_resource
+    def get_store():
+        return {"figures": OrderedDict(), "bytes": 0, "lock": threading.Lock()}
+
+    # Hash of the rows a chart reads. Rows filter_index can name - a loaded frame's data
+    # version and the mask that picked them - are keyed by that name and the columns' dtypes,
+    # without reading them. Any other frame falls back to hashing the values of its columns
+    # in row order (so any selection that leaves the same rows gives the same hash)
+    @staticmethod
+    def frame_hash(df: pd.DataFrame, columns: list) -> str:
+        selection = filter_index.selection(df)
+        digest = hashlib.sha256()
+        digest.update(json.dumps([df.attrs.get("data_version"), selection, columns,
+                                  [repr(df[col].dtype) for col in columns]], default=str).encode())
+        if selection is None:
+            digest.update(pd.util.hash_pandas_object(df[columns], index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    # Key of one chart - helper, its parameters and the rows it is drawn from. Columns are
+    # the parameters naming columns of df, plus any the helper always reads
+    @staticmethod
+    def figure_key(name: str, df: pd.DataFrame, params: dict, columns: list) -> str:
+        named = []
+        for value in params.values():
+            named += value if isinstance(value, (list, tuple)) else [value]
+        columns = list(dict.fromkeys(col for col in named + columns if isinstance(col, str) and col in df.columns))
+
+        digest = hashlib.sha256()
+        digest.update(json.dumps([name, params], sort_keys=True, default=str).encode())
+        digest.update(figure_cache.frame_hash(df, columns).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def load(key: str):
+        store = figure_cache.get_store()
+        with store["lock"]:
+            payload = store["figures"].get(key)
+            if payload is None:
+                return None
+            store["figures"].move_to_end(key)
+        return pio.from_json(payload)
+
+    @staticmethod
+    def save(key: str, payload: str, max_bytes: int = None):
+        max_bytes = MAX_FIGURE_BYTES if max_bytes is None else max_bytes
+        if len(payload) > max_bytes:
+            return
+        store = figure_cache.get_store()
+        with store["lock"]:
+            previous = store["figures"].pop(key, None)
+            store["bytes"] -= 0 if previous is None else len(previous)
+            store["figures"][key] = payload
+            store["bytes"] += len(payload)
+            while store["bytes"] > max_bytes:
+                _, evicted = store["figures"].popitem(last=False)
+                store["bytes"] -= len(evicted)
+
+    # Decorator for chart helpers taking the frame first. A repeat call on the same rows and
+    # parameters - from any session - rebuilds the figure from its stored JSON, skipping the
+    # aggregation and Plotly Express. Callers get their own figure and may update it
+    @staticmethod
+    def cached(columns: list = None):
+        def decorate(draw):
+            signature = inspect.signature(draw)
+
+            @wraps(draw)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                params = dict(bound.arguments)
+                df = params.pop(next(iter(signature.parameters)))
+
+                key = figure_cache.figure_key(draw.__name__, df, params, columns or [])
+                fig = figure_cache.load(key)
+                if fig is None:
+                    fig = draw(*args, **kwargs)
+                    figure_cache.save(key, fig.to_json())
+                return fig
+            return wrapper
+        return decorate
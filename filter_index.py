@@ -0,0 +1,115 @@
+import hashlib
+import threading
+import weakref
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+
+# Loaded frames whose index is kept for the data version, shared by all sessions
+SESSION_FRAMES = ["Sales Cube", "Sales Data"]
+
+class filter_index():
+
+    # Cascading filters on row masks. Each column is coded once - an integer code per row
+    # and its values in first-appearance order, the order Series.unique lists them - so
+    # option lists and selections are array lookups, and only the final rows are copied
+
+    # source - (data version, frame name) of a shared index over a loaded session frame
+    @staticmethod
+    def build(df: pd.DataFrame, source: tuple = None) -> dict:
+        return {"df": df, "columns": {}, "lock": threading.Lock(), "source": source}
+
+    @staticmethod
+    @st.cache_resource(max_entries=4)
+    def get_cached(data_version: str, frame_name: str, _df: pd.DataFrame) -> dict:
+        return filter_index.build(_df, (data_version, frame_name))
+
+    # {id(frame): (weak reference, selection)} of the frames rows returned from shared
+    # indexes. The reference is checked on lookup, so a reused id never matches
+    @staticmethod
+    @st.cache_resource
+    def get_selections() -> dict:
+        return {}
+
+    # Index of df - the shared one when df is a loaded session frame, else its own
+    @staticmethod
+    def get(df: pd.DataFrame) -> dict:
+        version = df.attrs.get("data_version")
+        for name in SESSION_FRAMES:
+            if version is not None and st.session_state.get(name) is df:
+                return filter_index.get_cached(version, name, df)
+        return filter_index.build(df)
+
+    # Codes and values of a column, coded on first use
+    @staticmethod
+    def column(index: dict, col: str) -> tuple[np.ndarray, pd.Index]:
+        with index["lock"]:
+            coded = index["columns"].get(col)
+            if coded is None:
+                codes, values = pd.factorize(index["df"][col], use_na_sentinel=False)
+                coded = index["columns"][col] = (codes.astype(np.min_scalar_type(len(values))), values)
+        return coded
+
+    @staticmethod
+    def all_rows(index: dict) -> np.ndarray:
+        return np.ones(len(index["df"]), dtype=bool)
+
+    # Values of col in the rows mask keeps (all rows when None), in first-appearance order
+    @staticmethod
+    def options(index: dict, col: str, mask: np.ndarray = None) -> pd.Index:
+        codes, values = filter_index.column(index, col)
+        return values.take(pd.unique(codes if mask is None else codes[mask]))
+
+    # mask narrowed to rows whose col is one of selected
+    @staticmethod
+    def narrow(index: dict, col: str, selected, mask: np.ndarray = None) -> np.ndarray:
+        codes, values = filter_index.column(index, col)
+        positions = values.get_indexer(list(selected))
+        lookup = np.zeros(len(values), dtype=bool)
+        lookup[positions[positions >= 0]] = True
+        rows = lookup[codes]
+        return rows if mask is None else mask & rows
+
+    # mask narrowed to rows dated from start to end, both days included
+    @staticmethod
+    def date_range(index: dict, col: str, start, end, mask: np.ndarray = None) -> np.ndarray:
+        dates = index["df"][col].to_numpy(dtype="datetime64[ns]")
+        rows = (dates >= np.datetime64(start, "D")) & (dates < np.datetime64(end, "D") + np.timedelta64(1, "D"))
+        return rows if mask is None else mask & rows
+
+    # st.multiselect over the values left in col. Nothing picked keeps them all
+    @staticmethod
+    def multiselect(label: str, index: dict, col: str, mask: np.ndarray = None, **kwargs) -> np.ndarray:
+        selected = st.multiselect(label, filter_index.options(index, col, mask), **kwargs)
+        if not selected:
+            return filter_index.all_rows(index) if mask is None else mask
+        return filter_index.narrow(index, col, selected, mask)
+
+    # Rows of the indexed frame mask keeps - the one copy a cascade makes. Rows of a loaded
+    # session frame remember their selection (see selection)
+    @staticmethod
+    def rows(index: dict, mask: np.ndarray) -> pd.DataFrame:
+        rows = index["df"][mask]
+        if index["source"] is not None:
+            digest = hashlib.sha256(np.packbits(mask).tobytes())
+            digest.update(str(len(mask)).encode())
+            selections = filter_index.get_selections()
+            key = id(rows)
+            selections[key] = (weakref.ref(rows, lambda _, key=key: selections.pop(key, None)),
+                               index["source"] + (digest.hexdigest(),))
+        return rows
+
+    # Names the rows of df without reading them - (data version, frame name, mask digest) for
+    # rows picked from a loaded session frame, (data version, frame name, None) for the frame
+    # itself. None for any other frame, derived ones included
+    @staticmethod
+    def selection(df: pd.DataFrame) -> tuple:
+        version = df.attrs.get("data_version")
+        if version is None:
+            return None
+        for name in SESSION_FRAMES:
+            if st.session_state.get(name) is df:
+                return (version, name, None)
+        ref, selection = filter_index.get_selections().get(id(df), (None, None))
+        return selection if ref is not None and ref() is df else None
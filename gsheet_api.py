@@ -0,0 +1,109 @@
+import re
+import streamlit as st
+import pandas as pd
+from pandas.io.parsers import TextParser
+from google.oauth2 import service_account
+from google.auth.transport.requests import AuthorizedSession
+from requests.adapters import HTTPAdapter
+
+
+SCOPES = [
+    "https://www.googleapis.com/auth/spreadsheets.readonly",
+    "https://www.googleapis.com/auth/drive.readonly",
+]
+DRIVE_FILE_URL = "https://www.googleapis.com/drive/v3/files/{file_id}"
+VALUES_BATCH_URL = "https://sheets.googleapis.com/v4/spreadsheets/{spreadsheet_id}/values:batchGet"
+
+class gsheet_api():
+
+    # One authorised HTTP session per process, reused by every call
+    @staticmethod
+    @st.cache_resource
+    def get_session():
+        creds = service_account.Credentials.from_service_account_info(
+            st.secrets["connections"]["gsheets"],
+            scopes=SCOPES
+        )
+        session = AuthorizedSession(creds)
+        # Keep-alive connections shared by the loader threads
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        session.mount("https://", adapter)
+        return session
+
+    # Spreadsheet ID from the full Google Sheets URL
+    @staticmethod
+    def spreadsheet_id(spreadsheet_url: str) -> str:
+        match = re.search(r"/spreadsheets/d/([a-zA-Z0-9-_]+)", spreadsheet_url)
+        return match.group(1) if match else spreadsheet_url
+
+    # Drive revision of the spreadsheet - changes on every edit of any worksheet
+    @staticmethod
+    def source_revision(spreadsheet_url: str) -> str:
+        session = gsheet_api.get_session()
+        response = session.get(
+            DRIVE_FILE_URL.format(file_id=gsheet_api.spreadsheet_id(spreadsheet_url)),
+            params={"fields": "version,modifiedTime", "supportsAllDrives": "true"},
+            timeout=30
+        )
+        response.raise_for_status()
+        meta = response.json()
+        return f"{meta['version']}@{meta['modifiedTime']}"
+
+    # A1 range of a worksheet, optionally limited to a block of rows
+    @staticmethod
+    def worksheet_range(worksheet_name: str, start_row: int = 1, end_row: int = None) -> str:
+        title = "'" + worksheet_name.replace("'", "''") + "'"
+        if start_row == 1 and end_row is None:
+            return title
+        return f"{title}!A{start_row}:ZZZ{end_row if end_row is not None else ''}"
+
+    # Raw cell values of several ranges in one request. Numbers come unformatted; dates and
+    # times as the sheet displays them (FORMATTED_STRING), not as serial numbers
+    @staticmethod
+    def batch_get_values(spreadsheet_url: str, ranges: list[str]) -> list[list[list]]:
+        session = gsheet_api.get_session()
+        response = session.get(
+            VALUES_BATCH_URL.format(spreadsheet_id=gsheet_api.spreadsheet_id(spreadsheet_url)),
+            params={
+                "ranges": ranges,
+                "majorDimension": "ROWS",
+                "valueRenderOption": "UNFORMATTED_VALUE",
+                "dateTimeRenderOption": "FORMATTED_STRING",
+            },
+            timeout=300
+        )
+        response.raise_for_status()
+        return [value_range.get("values", []) for value_range in response.json().get("valueRanges", [])]
+
+    # Parse header + rows exactly like gspread_dataframe.get_as_dataframe
+    @staticmethod
+    def values_to_frame(header: list, rows: list[list]) -> pd.DataFrame:
+        # Empty worksheet, or a header and no rows - nothing for the parser to read
+        if not rows:
+            return pd.DataFrame(columns=header)
+
+        width = max([len(header)] + [len(r) for r in rows])
+        table = [list(r) + [""] * (width - len(r)) for r in [header] + rows]
+        df = TextParser(table).read()
+
+        # Drop blank rows and blank unnamed columns
+        df = df.dropna(how="all", axis=0)
+        empty_unnamed = [
+            col for col in df.columns
+            if str(col).startswith("Unnamed") and df[col].isna().all()
+        ]
+        return df.drop(columns=empty_unnamed)
+
+    # Whole worksheets as typed frames, all in one request
+    @staticmethod
+    def batch_get_frames(spreadsheet_url: str, worksheet_names: list[str]) -> dict[str, pd.DataFrame]:
+        ranges = [gsheet_api.worksheet_range(name) for name in worksheet_names]
+        frames = {}
+        for name, values in zip(worksheet_names, gsheet_api.batch_get_values(spreadsheet_url, ranges)):
+            header, rows = (values[0], values[1:]) if values else ([], [])
+            df = gsheet_api.values_to_frame(header, rows)
+            # Sheet layout, for incremental reads of the same worksheet
+            df.attrs["header"] = header
+            df.attrs["sheet_rows"] = len(values)
+            frames[name] = df
+        return frames
@@ -4,11 +4,20 @@ import pandas as pd
 import numpy as np
 import utilities
 from discount_calc import discount
+from sales_query import sales_query
+from sales_cube import sales_cube
+from filter_index import filter_index
 
 
 
 df = st.session_state["Sales Data"]
-last_date = df['Billing Date'].drop_duplicates().nlargest(1)
+# Year and month charts and tiles read the pre-aggregated (monthly) cube, not the billing lines
+cube = st.session_state["Sales Cube"]
+# Period and Day Wise Sales filters are row masks of the shared filter indexes - the cube's
+# for months, the billing lines' for days
+index = filter_index.get(cube)
+day_index = filter_index.get(df)
+last_date = pd.Series(filter_index.column(day_index, "Billing Date")[1]).nlargest(1)
 formatted_date = last_date.iloc[0].strftime('%d-%b-%Y')
 utilities.apply_common_styles(f"Sales Summary - {formatted_date}")
 
@@ -16,515 +25,346 @@ utilities.apply_common_styles(f"Sales Summary - {formatted_date}")
 month_order = utilities.month_order
 df['Month Name'] = pd.Categorical(df['Month Name'], categories=month_order, ordered=True)
 
-tab_daily, tab_month, tab_year = st.tabs(["Daily", "Month-To-Date", "Year-To-Date"])
-
 # Last Data Available
 display_year, display_fy, display_month, display_month_no = utilities.latest_data(df)
 
-with tab_year:
-    yr_tab_summary, yr_tab_region, yr_tab_state, yr_tab_day = st.tabs(["Summary", "Regional Office", "State","Day Wise Sales"])
-    ytd_df = df[df["Fiscal Year"]==display_fy]
+# Views are picked with radios rather than st.tabs - tabs build every chart
+# of every tab on each run, a picked view builds only its own. Each period is a fragment,
+# so its widgets rerun that period alone, and the sales tables are a fragment of their own
+PERIODS = ["Daily", "Month-To-Date", "Year-To-Date"]
+VIEWS = ["Summary", "Regional Office", "State", "Day Wise Sales"]
+
+def select_view(key):
+    return st.radio("View", VIEWS, horizontal=True, key=key, label_visibility="collapsed")
+
+# Total and per Material Group tiles, from the cube unless the filters need billing dates
+def render_metrics(filters, source=cube):
+    total_quantity_sum = sales_query.total(source, filters)/1000
+    sum_by_group = sales_query.sum_by(source, ['Material Group'], filters)
+    cols = st.columns(len(sum_by_group)+1)
+
+    with cols[0]:
+        # Display Total Quantity
+        st.metric(label="Total Quantity (KT)", value=f"{total_quantity_sum:,.2f}")
+
+    for index, row in sum_by_group.iterrows():
+        with cols[index+1]:
+            # Format the value nicely with commas and zero decimal places
+            value_display = f"{row['Quantity']:,.0f}"
+
+            st.metric(
+                label=f"{row['Material Group']} (MT)",
+                value=value_display
+            )
+
+# Overall Charts
+def render_overview(period_df, prefix):
+    with st.container(border=True):
+        col1, col2, col3= st.columns(3, gap="small")
+        with col1:
+            fig = utilities.draw_pie(period_df, values='Quantity',names = 'Material Family', title="Material Family")
+            utilities.plotly_chart(fig, width='stretch',key=f"{prefix}1")
+        with col2:
+            fig = utilities.draw_pie(period_df, values='Quantity',names = 'Material Description', title="Material Description")
+            utilities.plotly_chart(fig, width='stretch',key=f"{prefix}2")
+        with col3:
+            fig = utilities.draw_sunburst(period_df,
+                            path=['Regional Office', 'Material Family','Material Group','Material Description'],
+                            values='Quantity',
+                            title='Sales Distribution',
+                            )
+            utilities.plotly_chart(fig, width='stretch',key=f"{prefix}3")
+
+# Billing lines behind a slice - cube slices are looked up, daily slices already are lines
+def billing_lines(slice_df):
+    return slice_df if "Billing Date" in slice_df.columns else sales_cube.matching_rows(df, slice_df)
+
+# Daily billing histogram coloured by the picked dimension
+def render_day_histogram(filtered_df, color, key):
+    fig = utilities.draw_histogram_bar(filtered_df, x=['Billing Date'], y='Quantity',
+                color=color)
+    # Improve axis readability - ticks follow the chart's date bins
+    fig.update_xaxes(title="Date")
+    fig.update_yaxes(title="Quantity")
+    utilities.plotly_chart(fig, width='stretch',key=key)
+
+# Sales Tables - built only when toggled on, and toggling reruns the tables alone
+@st.fragment
+def render_sales_tables(table_df, detail_df, prefix, sales_key, detail_key):
+    with st.container(border=True):
+        col1, col2 = st.columns(2)
+        with col1:
+            is_on_sales = st.toggle("Customer Sales Table", key=f"{prefix}_pivot")
+        with col2:
+            is_on_detail = st.toggle("Detailed Sales Table", key=f"{prefix}_detail")
+
+        if is_on_sales:
+            st.markdown("#### Customer Sales Table")
+            # Customer groups are not part of the cube
+            table_df = billing_lines(table_df)
+            # Previous Month
+            fiscal_order = list(range(utilities.FISCAL_START, 13)) + list(range(1, utilities.FISCAL_START))
+            idx = fiscal_order.index(display_month_no)
+            scheme_months = fiscal_order[:idx]
+            # Get Non-Zero Data
+            non_zero_pivot = discount.prepare_non_zero_avg_group_pivot(table_df,scheme_months,display_year,display_month_no).fillna(0)
+            # MOU Data
+            mou_sales_pivot = discount.prepare_mou_group_pivot(table_df,display_year,display_month_no).fillna(0)
+            # Merge Sale, Non-Zero and MOU
+            sales_pivot = discount.build_sales_mou_summary(table_df,mou_sales_pivot,non_zero_pivot)
+            utilities.render_excel_pivot(sales_pivot,sales_key)
+
+        if is_on_detail:
+            st.markdown("#### Detailed Sales Table")
+            utilities.render_excel_pivot(billing_lines(detail_df),detail_key)
+
+@st.fragment
+def year_dashboard():
+    view = select_view("ytd_view")
+    ytd_mask = filter_index.narrow(index, "Fiscal Year", [display_fy])
+    ytd_df = filter_index.rows(index, ytd_mask)
+    # Tables follow the Day Wise Sales filters while that view is open
+    filtered_ytd_df = ytd_df
 
     with st.container(border=True):
-        with yr_tab_summary:
+        if view == "Summary":
             # Metrics
-            total_quantity_sum = ytd_df['Quantity'].sum()/1000
-            sum_by_group = ytd_df.groupby('Material Group')['Quantity'].sum().reset_index()
-            cols = st.columns(len(sum_by_group)+1)
-
-            with cols[0]:
-                # Display Total Quantity
-                st.metric(label="Total Quantity (KT)", value=f"{total_quantity_sum:,.2f}") 
-
-            for index, row in sum_by_group.iterrows():
-                with cols[index+1]:
-                    # Format the value nicely with commas and zero decimal places
-                    value_display = f"{row['Quantity']:,.0f}"
-                    
-                    st.metric(
-                        label=f"{row['Material Group']} (MT)", 
-                        value=value_display
-                    )
-
-            # Overall Charts
-            with st.container(border=True):
-                col1, col2, col3= st.columns(3, gap="small")
-                with col1:
-                    fig = utilities.draw_pie(ytd_df, values='Quantity',names = 'Material Family', title="Material Family")
-                    st.plotly_chart(fig, width='stretch',key="ytd1")
-                with col2:
-                    fig = utilities.draw_pie(ytd_df, values='Quantity',names = 'Material Description', title="Material Description")
-                    st.plotly_chart(fig, width='stretch',key="ytd2")
-                with col3:
-                    fig = utilities.draw_sunburst(ytd_df, 
-                                    path=['Regional Office', 'Material Family','Material Group','Material Description'], 
-                                    values='Quantity',
-                                    title='Sales Distribution',
-                                    )
-                    st.plotly_chart(fig, width='stretch',key="ytd3")
-        
-        with yr_tab_region:
+            render_metrics({"Fiscal Year": display_fy})
+            render_overview(ytd_df, "ytd")
+
+        elif view == "Regional Office":
             with st.container(border=True):
                 # Regional
                 col1, col2, col3 = st.columns([2,2,3], gap="small")
                 with col1:
                     fig = utilities.draw_pie(ytd_df, values='Quantity',names = 'Regional Office', title="Region Volumes")
-                    st.plotly_chart(fig, width='stretch',key="ytd4")
+                    utilities.plotly_chart(fig, width='stretch',key="ytd4")
 
                 with col2:
                     fig = utilities.draw_histogram_bar(ytd_df, x=['Regional Office'], y='Quantity',
                             color='Material Family')
-                    st.plotly_chart(fig,key="ytd5")
+                    utilities.plotly_chart(fig,key="ytd5")
 
                 with col3:
                     fig = utilities.draw_histogram_bar(ytd_df, x=['Regional Office'], y='Quantity',
                             color='Material Group')
-                    st.plotly_chart(fig,key="ytd6")
+                    utilities.plotly_chart(fig,key="ytd6")
 
-        with yr_tab_state:
+        elif view == "State":
             with st.container(border=True):
                 col1, col2, col3 = st.columns([1,2, 2], gap="small")
                 with col1:
                     fig = utilities.draw_pie(ytd_df, values='Quantity',names = 'Plant Reg State', title="Plant Volumes")
-                    st.plotly_chart(fig, width='stretch', key="ytd_5")
+                    utilities.plotly_chart(fig, width='stretch', key="ytd_5")
 
                 with col2:
                     fig = utilities.draw_histogram_bar(ytd_df, x=['Plant Reg State'], y='Quantity',
                             color='Material Family')
-                    st.plotly_chart(fig, key="ytd_6")
-                
-                with col3:  
+                    utilities.plotly_chart(fig, key="ytd_6")
+
+                with col3:
                     fig = utilities.draw_histogram_bar(ytd_df, x=['Plant Reg State'], y='Quantity',
                             color='Material Description')
-                    st.plotly_chart(fig, key="ytd_7")        
+                    utilities.plotly_chart(fig, key="ytd_7")
 
-        with yr_tab_day:
+        elif view == "Day Wise Sales":
             col1, col2, col3, col4 = st.columns([2,3,2,3], gap="small")
             with col1:
-                select_region = st.multiselect("Region", df["Regional Office"].unique(),
-                                            df["Regional Office"].unique())
-                filtered_ytd_df = ytd_df[ytd_df["Regional Office"].isin(select_region)]
+                regions = filter_index.options(index, "Regional Office")
+                select_region = st.multiselect("Region", regions, regions, key="ytd_region")
+                mask = filter_index.narrow(index, "Regional Office", select_region, ytd_mask)
             with col2:
-                select_dca = st.multiselect("DCA", filtered_ytd_df["Plant Description"].unique())
-                if not select_dca: select_dca = filtered_ytd_df["Plant Description"].unique()
-                filtered_ytd_df = filtered_ytd_df[filtered_ytd_df["Plant Description"].isin(select_dca)]
+                mask = filter_index.multiselect("DCA", index, "Plant Description", mask, key="ytd_dca")
             with col3:
-                select_matfamily = st.multiselect("Material Family", filtered_ytd_df["Material Family"].unique())
-                if not select_matfamily: select_matfamily = filtered_ytd_df["Material Family"].unique()
-                filtered_ytd_df = filtered_ytd_df[filtered_ytd_df["Material Family"].isin(select_matfamily)]
+                mask = filter_index.multiselect("Material Family", index, "Material Family", mask, key="ytd_matfamily")
             with col4:
-                select_matgroup = st.multiselect("Material Group", filtered_ytd_df["Material Group"].unique())
-                if not select_matgroup: select_matgroup = filtered_ytd_df["Material Group"].unique()
-                filtered_ytd_df = filtered_ytd_df[filtered_ytd_df["Material Group"].isin(select_matgroup)]
-        
+                mask = filter_index.multiselect("Material Group", index, "Material Group", mask, key="ytd_matgroup")
+            filtered_ytd_df = filter_index.rows(index, mask)
+
             with st.container(border=True):
-                option = st.radio("Chart Options:",("DCA", "Material Family", 
+                option = st.radio("Chart Options:",("DCA", "Material Family",
                                         "Material Group","Material Description"),
                                         horizontal=True, key="radio_yr")
                 col1, col2 = st.columns([1,2])
+                # Pie title per dimension
+                names = {"DCA": "Plant Description", "Material Family": "Material Family",
+                         "Material Group": "Material Group", "Material Description": "Material Description"}
+                titles = {"DCA": "DCA Volumes", "Material Family": "Material Category",
+                          "Material Group": "Material Group", "Material Description": "Material Description"}
 
-                if option == "DCA":
-                    # Plant Description
-                    with col1:
-                        fig = utilities.draw_pie(filtered_ytd_df, values='Quantity',names = 'Plant Description', title="DCA Volumes")
-                        st.plotly_chart(fig, width='stretch',key="ytd7")
-
-                    with col2:
-                        fig = utilities.draw_histogram_month_quantity(filtered_ytd_df, color="Plant Description", title="Monthly Quantity")
-                        st.plotly_chart(fig, width='stretch',key="ytd8")
-
-                # Material Family
-                if option == "Material Family":
-                    with col1:
-                        fig = utilities.draw_pie(filtered_ytd_df, values='Quantity',names = 'Material Family', title="Material Category")
-                        st.plotly_chart(fig, width='stretch',key="ytd9")
-
-                    with col2:
-                        fig = utilities.draw_histogram_month_quantity(filtered_ytd_df, color="Material Family", title="Monthly Quantity")
-                        st.plotly_chart(fig, width='stretch',key="ytd10")
-
-                # Material Group
-                if option == "Material Group":
-                    with col1:
-                        fig = utilities.draw_pie(filtered_ytd_df, values='Quantity',names = 'Material Group', title="Material Group")
-                        st.plotly_chart(fig, width='stretch',key="ytd11")
-
-                    with col2:
-                        fig = utilities.draw_histogram_month_quantity(filtered_ytd_df, color="Material Group", title="Monthly Quantity")
-                        st.plotly_chart(fig, width='stretch',key="ytd12")
-                
-                # Material Description
-                if option == "Material Description":
-                    with col1:
-                        fig = utilities.draw_pie(filtered_ytd_df, values='Quantity',names = 'Material Description', title="Material Description")
-                        st.plotly_chart(fig, width='stretch',key="ytd13")
-
-                    with col2:
-                        fig = utilities.draw_histogram_month_quantity(filtered_ytd_df, color="Material Description", title="Monthly Quantity")
-                        st.plotly_chart(fig, width='stretch',key="ytd14")
-    
-        with st.container(border=True):
-            # Sales Tables
-            col1, col2 = st.columns(2)
-            with col1:
-                is_on_sales = st.toggle("Customer Sales Table")
-            with col2:
-                is_on_detail = st.toggle("Detailed Sales Table")
-            
-            if is_on_sales:
-                st.markdown("#### Customer Sales Table")
-                # sales_pivot = discount.prepare_group_pivot(filtered_ytd_df,
-                #                     ["Regional Office", "Sold-to Group"])
-                # utilities.render_excel_pivot(sales_pivot,"sales_ytd")
-                 # Previous Month
-                fiscal_order = list(range(utilities.FISCAL_START, 13)) + list(range(1, utilities.FISCAL_START))
-                idx = fiscal_order.index(display_month_no)
-                scheme_months = fiscal_order[:idx]
-                # Get Non-Zero Data
-                non_zero_pivot_day = discount.prepare_non_zero_avg_group_pivot(filtered_ytd_df,scheme_months,display_year,display_month_no).fillna(0)
-                # MOU Data
-                mou_sales_pivot_day = discount.prepare_mou_group_pivot(filtered_ytd_df,display_year,display_month_no).fillna(0)
-                # Merge Sale, Non-Zero and MOU
-                mtd_sales_pivot = discount.build_sales_mou_summary(filtered_ytd_df,mou_sales_pivot_day,non_zero_pivot_day)
-                # day_sales_pivot = discount.build_sales_summary(day_df)
-                utilities.render_excel_pivot(mtd_sales_pivot,"ytd15")
-
-            if is_on_detail:
-                st.markdown("#### Detailed Sales Table")
-                utilities.render_excel_pivot(filtered_ytd_df,"details_ytd")
-
-with tab_month:
-    mon_tab_summary, mon_tab_region, mon_tab_state, mon_tab_day = st.tabs(["Summary", 
-                                                    "Regional Office", "State","Day Wise Sales"])
-    with st.container(border=True):
-        with mon_tab_summary:
-            # MTD Metrics
-            mtd_df = df[(df["Month Name"]==display_month) & (df["Year"]==display_year)]
+                with col1:
+                    fig = utilities.draw_pie(filtered_ytd_df, values='Quantity',names = names[option], title=titles[option])
+                    utilities.plotly_chart(fig, width='stretch',key="ytd7")
 
+                with col2:
+                    fig = utilities.draw_histogram_month_quantity(filtered_ytd_df, color=names[option], title="Monthly Quantity")
+                    utilities.plotly_chart(fig, width='stretch',key="ytd8")
 
-            st.markdown(f"#### Sales Month-To-Date {display_month}-{display_year}")
-            total_quantity_sum = mtd_df['Quantity'].sum()/1000
-            sum_by_group = mtd_df.groupby('Material Group')['Quantity'].sum().reset_index()
-            cols = st.columns(len(sum_by_group)+1)
+        render_sales_tables(filtered_ytd_df, filtered_ytd_df, "ytd", "ytd15", "details_ytd")
 
-            # Metrics
-            with cols[0]:
-                # Display Total Quantity
-                st.metric(label="Total Quantity (KT)", value=f"{total_quantity_sum:,.2f}") 
-
-
-            for index, row in sum_by_group.iterrows():
-                with cols[index+1]:
-                    # Format the value nicely with commas and zero decimal places
-                    value_display = f"{row['Quantity']:,.0f}"
-                    
-                    st.metric(
-                        label=f"{row['Material Group']} (MT)", 
-                        value=value_display
-                    )
-
-            # Overall Charts
-            with st.container(border=True):
-                col1, col2, col3= st.columns(3, gap="small")
-                with col1:
-                    fig = utilities.draw_pie(mtd_df, values='Quantity',names = 'Material Family', title="Material Family")
-                    st.plotly_chart(fig, width='stretch',key="mtd1")
-                with col2:
-                    fig = utilities.draw_pie(mtd_df, values='Quantity',names = 'Material Description', title="Material Description")
-                    st.plotly_chart(fig, width='stretch',key="mtd2")
-                with col3:
-                    fig = utilities.draw_sunburst(mtd_df, 
-                                    path=['Regional Office', 'Material Family','Material Group','Material Description'], 
-                                    values='Quantity',
-                                    title='Sales Distribution',
-                                    )
-                    st.plotly_chart(fig, width='stretch',key="mtd3")
+@st.fragment
+def month_dashboard():
+    view = select_view("mtd_view")
+    mtd_mask = filter_index.narrow(index, "Year", [display_year], filter_index.narrow(index, "Month Name", [display_month]))
+    mtd_df = filter_index.rows(index, mtd_mask)
+    # Detailed table follows the Day Wise Sales filters while that view is open
+    filtered_mtd_df = mtd_df
+
+    with st.container(border=True):
+        if view == "Summary":
+            # MTD Metrics
+            st.markdown(f"#### Sales Month-To-Date {display_month}-{display_year}")
+            render_metrics({"Month Name": display_month, "Year": display_year})
+            render_overview(mtd_df, "mtd")
 
         # Regional Office
-        with mon_tab_region:
+        elif view == "Regional Office":
             with st.container(border=True):
                 col1, col2, col3, col4 = st.columns([2,2,2,3], gap="small")
                 with col1:
                     fig = utilities.draw_pie(mtd_df, values='Quantity',names = 'Regional Office', title="Region Volumes")
-                    st.plotly_chart(fig, width='stretch',key="mtd_1")
+                    utilities.plotly_chart(fig, width='stretch',key="mtd_1")
 
                 with col2:
                     fig = utilities.draw_histogram_bar(mtd_df, x=['Regional Office'], y='Quantity',
                             color='Material Family')
-                    st.plotly_chart(fig,key="mtd_2")
+                    utilities.plotly_chart(fig,key="mtd_2")
 
                 with col3:
                     fig = utilities.draw_histogram_bar(mtd_df, x=['Regional Office'], y='Quantity',
                             color='Material Group')
-                    st.plotly_chart(fig,key="mtd_3")
-                
+                    utilities.plotly_chart(fig,key="mtd_3")
+
                 with col4:
                     fig = utilities.draw_histogram_bar(mtd_df, x=['Regional Office'], y='Quantity',
                             color='Material Description')
-                    st.plotly_chart(fig,key="mtd_4")
+                    utilities.plotly_chart(fig,key="mtd_4")
 
         # State
-        with mon_tab_state:
+        elif view == "State":
             with st.container(border=True):
                 col1, col2, col3 = st.columns([1,2, 2], gap="small")
                 with col1:
                     fig = utilities.draw_pie(mtd_df, values='Quantity',names = 'Plant Reg State', title="Plant Volumes")
-                    st.plotly_chart(fig, width='stretch', key="mtd_5")
+                    utilities.plotly_chart(fig, width='stretch', key="mtd_5")
 
                 with col2:
                     fig = utilities.draw_histogram_bar(mtd_df, x=['Plant Reg State'], y='Quantity',
                             color='Material Family')
-                    st.plotly_chart(fig, key="mtd_6")
-                
-                with col3:  
+                    utilities.plotly_chart(fig, key="mtd_6")
+
+                with col3:
                     fig = utilities.draw_histogram_bar(mtd_df, x=['Plant Reg State'], y='Quantity',
                             color='Material Description')
-                    st.plotly_chart(fig, key="mtd_7")
+                    utilities.plotly_chart(fig, key="mtd_7")
 
         # Daily
-        with mon_tab_day:
+        elif view == "Day Wise Sales":
             with st.container(border=True):
                 col1,col2,col3 = st.columns(3)
                 with col1:
-                    select_region = st.multiselect("Region", mtd_df["Regional Office"].unique(),
-                                                mtd_df["Regional Office"].unique(), key="mtd_8")
-                    filtered_mtd_df = mtd_df[mtd_df["Regional Office"].isin(select_region)]
+                    regions = filter_index.options(index, "Regional Office", mtd_mask)
+                    select_region = st.multiselect("Region", regions, regions, key="mtd_8")
+                    mask = filter_index.narrow(index, "Regional Office", select_region, mtd_mask)
                 with col2:
-                    select_state = st.multiselect("State", mtd_df["Plant Reg State"].unique(), key="mtd_8a")
-                    if not select_state: select_state = mtd_df["Plant Reg State"].unique()
-                    filtered_mtd_df = mtd_df[mtd_df["Plant Reg State"].isin(select_state)]
+                    mask = filter_index.multiselect("State", index, "Plant Reg State", mask, key="mtd_8a")
                 with col3:
-                    select_dca = st.multiselect("DCA", filtered_mtd_df["Plant Description"].unique(), key="mtd_9")
-                    if not select_dca: select_dca = filtered_mtd_df["Plant Description"].unique()
-                    filtered_mtd_df = filtered_mtd_df[filtered_mtd_df["Plant Description"].isin(select_dca)]
-                
-                option = st.radio("Chart Options:",("DCA", "Material Family", 
+                    mask = filter_index.multiselect("DCA", index, "Plant Description", mask, key="mtd_9")
+                filtered_mtd_df = filter_index.rows(index, mask)
+
+                option = st.radio("Chart Options:",("DCA", "Material Family",
                                         "Material Group","Material Description"),
                                         horizontal=True, key="radio_mon")
-                # DCA
-                if option == "DCA":
-                    fig = utilities.draw_histogram_bar(filtered_mtd_df, x=['Billing Date'], y='Quantity',
-                                color='Plant Description')
-                    # Improve axis readability
-                    fig.update_xaxes(dtick="D1",tickformat="%d-%b",title="Date")
-                    fig.update_yaxes(title="Quantity")
-                    st.plotly_chart(fig, width='stretch',key="mtd_10a")
-
-                # Material Family
-                if option == "Material Family":
-                    fig = utilities.draw_histogram_bar(filtered_mtd_df, x=['Billing Date'], y='Quantity',
-                                color='Material Family')
-                    # Improve axis readability
-                    fig.update_xaxes(dtick="D1",tickformat="%d-%b",title="Date")
-                    fig.update_yaxes(title="Quantity")
-                    st.plotly_chart(fig, width='stretch',key="mtd_10b")
-
-                # Material Group
-                if option == "Material Group":
-                    fig = utilities.draw_histogram_bar(filtered_mtd_df, x=['Billing Date'], y='Quantity',
-                                color='Material Group')
-                    # Improve axis readability
-                    fig.update_xaxes(dtick="D1",tickformat="%d-%b",title="Date")
-                    fig.update_yaxes(title="Quantity")
-                    st.plotly_chart(fig, width='stretch',key="mtd_10")
-
-                # Material Description
-                if option == "Material Description":
-                    fig = utilities.draw_histogram_bar(filtered_mtd_df, x=['Billing Date'], y='Quantity',
-                                color='Material Description')
-                    # Improve axis readability
-                    fig.update_xaxes(dtick="D1",tickformat="%d-%b",title="Date")
-                    fig.update_yaxes(title="Quantity")
-                    st.plotly_chart(fig, width='stretch', key="mtd_11")
-
-        # Sales Tables
-        with st.container(border=True):
-            col1, col2 = st.columns(2)
-            with col1:
-                is_on_sales = st.toggle("Customer Sales Table", key="mtd_pivot")
-            with col2:
-                is_on_detail = st.toggle("Detailed Sales Table", key="mtd_detail")
-            
-            if is_on_sales:
-                st.markdown("#### Customer Sales Table")
-                # Previous Month
-                fiscal_order = list(range(utilities.FISCAL_START, 13)) + list(range(1, utilities.FISCAL_START))
-                idx = fiscal_order.index(display_month_no)
-                scheme_months = fiscal_order[:idx]
-                # Get Non-Zero Data
-                non_zero_pivot = discount.prepare_non_zero_avg_group_pivot(mtd_df,scheme_months,display_year,display_month_no).fillna(0)
-                # MOU Data
-                mou_sales_pivot = discount.prepare_mou_group_pivot(mtd_df,display_year,display_month_no).fillna(0)
-                # Merge Sale, Non-Zero and MOU
-                mtd_sales_pivot = discount.build_sales_mou_summary(mtd_df,mou_sales_pivot,non_zero_pivot)
-                utilities.render_excel_pivot(mtd_sales_pivot,"mtd15")
-
-            if is_on_detail:
-                st.markdown("#### Detailed Sales Table")
-                utilities.render_excel_pivot(filtered_mtd_df,"mtd16")
-
-with tab_daily:
-    option_day = st.radio("Select Working Days",["Last Day","Last 2 Days","Last 3 Days","Last 7 Days"], 
-                          horizontal=True)
-    if option_day == "Last Day":
-        last_dates = df['Billing Date'].drop_duplicates().nlargest(1)
-    elif option_day == "Last 2 Days":
-        last_dates = df['Billing Date'].drop_duplicates().nlargest(2)
-    elif option_day == "Last 3 Days":
-        last_dates = df['Billing Date'].drop_duplicates().nlargest(3)
-    elif option_day == "Last 7 Days":
-        last_dates = df['Billing Date'].drop_duplicates().nlargest(7)
-    
-    day_df = df[df['Billing Date'].isin(last_dates)]
-
-    day_tab_summary, day_tab_region, day_tab_state, day_tab_day = st.tabs(["Summary", 
-                                            "Regional Office", "State","Day Wise Sales"])
-    
-    with day_tab_summary:
-        total_quantity_sum_day = day_df['Quantity'].sum()/1000 # type: ignore
-        sum_by_group_day = day_df.groupby('Material Group')['Quantity'].sum().reset_index()
-        cols_day = st.columns(len(sum_by_group_day)+1)
-
-        # Metrics
-        with cols_day[0]:
-            # Display Total Quantity
-            st.metric(label="Total Quantity (KT)", value=f"{total_quantity_sum_day:,.2f}") 
-
-        for index, row in sum_by_group_day.iterrows():
-            with cols_day[index+1]:
-                # Format the value nicely with commas and zero decimal places
-                value_display = f"{row['Quantity']:,.0f}"
-                
-                st.metric(
-                    label=f"{row['Material Group']} (MT)", 
-                    value=value_display
-                )
-        
-        # Overall Charts
-        with st.container(border=True):
-            col1, col2, col3= st.columns(3, gap="small")
-            with col1:
-                fig = utilities.draw_pie(day_df, values='Quantity',names = 'Material Family', title="Material Family")
-                st.plotly_chart(fig, width='stretch',key="day1")
-            with col2:
-                fig = utilities.draw_pie(day_df, values='Quantity',names = 'Material Description', title="Material Description")
-                st.plotly_chart(fig, width='stretch',key="day2")
-            with col3:
-                fig = utilities.draw_sunburst(day_df, 
-                                path=['Regional Office', 'Material Family','Material Group','Material Description'], 
-                                values='Quantity',
-                                title='Sales Distribution',
-                                )
-                st.plotly_chart(fig, width='stretch',key="day3")
-
-    with day_tab_region:
+                colors = {"DCA": "Plant Description", "Material Family": "Material Family",
+                          "Material Group": "Material Group", "Material Description": "Material Description"}
+                render_day_histogram(billing_lines(filtered_mtd_df), colors[option], "mtd_10")
+
+        render_sales_tables(mtd_df, filtered_mtd_df, "mtd", "mtd15", "mtd16")
+
+@st.fragment
+def daily_dashboard():
+    option_day = st.radio("Select Working Days",["Last Day","Last 2 Days","Last 3 Days","Last 7 Days"],
+                          horizontal=True, key="day_option")
+    days = {"Last Day": 1, "Last 2 Days": 2, "Last 3 Days": 3, "Last 7 Days": 7}
+    last_dates = pd.Series(filter_index.column(day_index, "Billing Date")[1]).nlargest(days[option_day])
+
+    # The last few days' billing lines - the cube holds no dates
+    day_mask = filter_index.narrow(day_index, "Billing Date", last_dates)
+    day_df = filter_index.rows(day_index, day_mask)
+    # Detailed table follows the Day Wise Sales filters while that view is open
+    filtered_day_df = day_df
+
+    view = select_view("day_view")
+
+    if view == "Summary":
+        render_metrics({"Billing Date": last_dates}, source=df)
+        render_overview(day_df, "day")
+
+    elif view == "Regional Office":
         with st.container(border=True):
             col1, col2, col3, col4 = st.columns([2,2,2,3], gap="small")
             with col1:
                 fig = utilities.draw_pie(day_df, values='Quantity',names = 'Regional Office', title="Region Volumes")
-                st.plotly_chart(fig, width='stretch',key="day4")
+                utilities.plotly_chart(fig, width='stretch',key="day4")
 
             with col2:
                 fig = utilities.draw_histogram_bar(day_df, x=['Regional Office'], y='Quantity',
                         color='Material Family')
-                st.plotly_chart(fig,key="day5")
+                utilities.plotly_chart(fig,key="day5")
 
             with col3:
                 fig = utilities.draw_histogram_bar(day_df, x=['Regional Office'], y='Quantity',
                         color='Material Group')
-                st.plotly_chart(fig,key="day6")
-            
+                utilities.plotly_chart(fig,key="day6")
+
             with col4:
                 fig = utilities.draw_histogram_bar(day_df, x=['Regional Office'], y='Quantity',
                         color='Material Description')
-                st.plotly_chart(fig,key="day7")   
+                utilities.plotly_chart(fig,key="day7")
 
-    with day_tab_state:
+    elif view == "State":
         with st.container(border=True):
             col1, col2, col3 = st.columns([2,2, 3], gap="small")
             with col1:
                 fig = utilities.draw_pie(day_df, values='Quantity',names = 'Plant Reg State', title="Plant Volumes")
-                st.plotly_chart(fig, width='stretch', key="day8")
+                utilities.plotly_chart(fig, width='stretch', key="day8")
 
             with col2:
                 fig = utilities.draw_histogram_bar(day_df, x=['Plant Reg State'], y='Quantity',
                         color='Material Family')
-                st.plotly_chart(fig, key="day9")
-            
-            with col3:  
+                utilities.plotly_chart(fig, key="day9")
+
+            with col3:
                 fig = utilities.draw_histogram_bar(day_df, x=['Plant Reg State'], y='Quantity',
                         color='Material Description')
-                st.plotly_chart(fig, key="day10")
+                utilities.plotly_chart(fig, key="day10")
 
-    with day_tab_day:
+    elif view == "Day Wise Sales":
         with st.container(border=True):
             st.markdown("#### Daily Upliftment")
             col1,col2 = st.columns(2)
             with col1:
-                select_region = st.multiselect("Region", day_df["Regional Office"].unique(), # type: ignore
-                                            day_df["Regional Office"].unique(), key="day11") # type: ignore
-                filtered_day_df = day_df[day_df["Regional Office"].isin(select_region)] # type: ignore
-                
+                regions = filter_index.options(day_index, "Regional Office", day_mask)
+                select_region = st.multiselect("Region", regions, regions, key="day11")
+                mask = filter_index.narrow(day_index, "Regional Office", select_region, day_mask)
+
             with col2:
-                select_dca = st.multiselect("DCA", filtered_day_df["Plant Description"].unique(), key="day12") # type: ignore
-                if not select_dca: select_dca= filtered_day_df["Plant Description"].unique() # type: ignore
-                filtered_day_df = filtered_day_df[filtered_day_df["Plant Description"].isin(select_dca)] # type: ignore
-            
-            option = st.radio("Chart Options:",("Material Family", 
+                mask = filter_index.multiselect("DCA", day_index, "Plant Description", mask, key="day12")
+            filtered_day_df = filter_index.rows(day_index, mask)
+
+            option = st.radio("Chart Options:",("Material Family",
                                         "Material Group","Material Description"),
                                         horizontal=True, key="radio_day")
-            
-            # Daily Material Family
-            if option == "Material Family":
-                fig = utilities.draw_histogram_bar(filtered_day_df, x=['Billing Date'], y='Quantity',
-                            color='Material Family')
-                # Improve axis readability
-                fig.update_xaxes(dtick="D1",tickformat="%d-%b",title="Date")
-                fig.update_yaxes(title="Quantity")
-                st.plotly_chart(fig, width='stretch',key="day13")
-
-            # Daily Material Group
-            if option == "Material Group":
-                fig = utilities.draw_histogram_bar(filtered_day_df, x=['Billing Date'], y='Quantity',
-                            color='Material Group')
-                # Improve axis readability
-                fig.update_xaxes(dtick="D1",tickformat="%d-%b",title="Date")
-                fig.update_yaxes(title="Quantity")
-                st.plotly_chart(fig, width='stretch',key="day13")
-
-            # Daily Material Description
-            if option == "Material Description":
-                fig = utilities.draw_histogram_bar(filtered_day_df, x=['Billing Date'], y='Quantity',
-                            color='Material Description')
-                # Improve axis readability
-                fig.update_xaxes(dtick="D1",tickformat="%d-%b",title="Date")
-                fig.update_yaxes(title="Quantity")
-                st.plotly_chart(fig, width='stretch', key="day14")
+            render_day_histogram(filtered_day_df, option, "day13")
 
-    with st.container(border=True):
-        # Sales Tables
-        col1, col2 = st.columns(2)
-        with col1:
-            is_on_sales = st.toggle("Customer Sales Table", key="day_pivot")
-        with col2:
-            is_on_detail = st.toggle("Detailed Sales Table", key="day_detail")
-        
-        if is_on_sales:
-            st.markdown("#### Customer Sales Table")
-            # Previous Month
-            fiscal_order = list(range(utilities.FISCAL_START, 13)) + list(range(1, utilities.FISCAL_START))
-            idx = fiscal_order.index(display_month_no)
-            scheme_months = fiscal_order[:idx]
-            # Get Non-Zero Data
-            non_zero_pivot_day = discount.prepare_non_zero_avg_group_pivot(day_df,scheme_months,display_year,display_month_no).fillna(0)
-            # MOU Data
-            mou_sales_pivot_day = discount.prepare_mou_group_pivot(day_df,display_year,display_month_no).fillna(0)
-            # Merge Sale, Non-Zero and MOU
-            mtd_sales_pivot = discount.build_sales_mou_summary(day_df,mou_sales_pivot_day,non_zero_pivot_day)
-            # day_sales_pivot = discount.build_sales_summary(day_df)
-            utilities.render_excel_pivot(mtd_sales_pivot,"day15")
+    render_sales_tables(day_df, filtered_day_df, "day", "day15", "day16")
 
-        if is_on_detail:
-            st.markdown("#### Detailed Sales Table")
-            utilities.render_excel_pivot(filtered_day_df,"day16")
+# Only the picked period is built
+period = st.radio("Period", PERIODS, horizontal=True, key="home_period", label_visibility="collapsed")
 
+if period == "Daily":
+    daily_dashboard()
+elif period == "Month-To-Date":
+    month_dashboard()
+else:
+    year_dashboard()
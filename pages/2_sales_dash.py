@@ -3,11 +3,13 @@ import plotly.express as px
 from sidebar import render_sidebar
 import utilities
 from discount_calc import discount
+from sales_query import sales_query
 
 utilities.apply_common_styles("Sales Dashboard")
 
 df = st.session_state["Sales Data"]
-# Sidebar
+# Sidebar - the billing date range and the customer table need billing lines, not the monthly
+# cube. The lines' filter index is shared, and charts sum them in DuckDB
 columns_to_filter = ["Billing Date","Regional Office","Plant Reg State","Plant Description",
                              "Material Family", "Material Group", "Material Description"]
 filtered_df = render_sidebar(df, columns_to_filter)
@@ -19,8 +21,8 @@ with st.container(border=True):
 
     # Metrics
     with tab_summary:
-        total_quantity_sum = filtered_df['Quantity'].sum()/1000
-        sum_by_group = filtered_df.groupby('Material Group')['Quantity'].sum().reset_index()
+        total_quantity_sum = sales_query.total(filtered_df)/1000
+        sum_by_group = sales_query.sum_by(filtered_df, ['Material Group'])
         cols = st.columns(len(sum_by_group)+1)
 
         with cols[0]:
@@ -41,51 +43,51 @@ with st.container(border=True):
         col1, col2, col3= st.columns(3, gap="small")
         with col1:
             fig = utilities.draw_pie(filtered_df, values='Quantity',names = 'Material Family', title="Material Family")
-            st.plotly_chart(fig, width='stretch',key="ytd1")
+            utilities.plotly_chart(fig, width='stretch',key="ytd1")
         with col2:
             fig = utilities.draw_pie(filtered_df, values='Quantity',names = 'Material Description', title="Material Description")
-            st.plotly_chart(fig, width='stretch',key="ytd2")
+            utilities.plotly_chart(fig, width='stretch',key="ytd2")
         with col3:
             fig = utilities.draw_sunburst(filtered_df, 
                             path=['Regional Office', 'Material Family','Material Group','Material Description'], 
                             values='Quantity',
                             title='Sales Distribution',
                             )
-            st.plotly_chart(fig, width='stretch',key="ytd3")
+            utilities.plotly_chart(fig, width='stretch',key="ytd3")
     
     # Regional
     with tab_region:
         col1, col2, col3 = st.columns([2,2,3], gap="small")
         with col1:
             fig = utilities.draw_pie(filtered_df, values='Quantity',names = 'Regional Office', title="Region Volumes")
-            st.plotly_chart(fig, width='stretch',key="ytd4")
+            utilities.plotly_chart(fig, width='stretch',key="ytd4")
 
         with col2:
             fig = utilities.draw_histogram_bar(filtered_df, x=['Regional Office'], y='Quantity',
                     color='Material Family')
-            st.plotly_chart(fig,key="ytd5")
+            utilities.plotly_chart(fig,key="ytd5")
 
         with col3:
             fig = utilities.draw_histogram_bar(filtered_df, x=['Regional Office'], y='Quantity',
                     color='Material Group')
-            st.plotly_chart(fig,key="ytd6")
+            utilities.plotly_chart(fig,key="ytd6")
 
     # State
     with tab_state:
         col1, col2, col3 = st.columns([1,2, 2], gap="small")
         with col1:
             fig = utilities.draw_pie(filtered_df, values='Quantity',names = 'Plant Reg State', title="State")
-            st.plotly_chart(fig, width='stretch', key="ytd_5")
+            utilities.plotly_chart(fig, width='stretch', key="ytd_5")
 
         with col2:
             fig = utilities.draw_histogram_bar(filtered_df, x=['Plant Reg State'], y='Quantity',
                     color='Material Family')
-            st.plotly_chart(fig, key="ytd_6")
+            utilities.plotly_chart(fig, key="ytd_6")
         
         with col3:  
             fig = utilities.draw_histogram_bar(filtered_df, x=['Plant Reg State'], y='Quantity',
                     color='Material Description')
-            st.plotly_chart(fig, key="ytd_7")        
+            utilities.plotly_chart(fig, key="ytd_7")        
 
     # DCA
     with tab_dca:
@@ -93,44 +95,44 @@ with st.container(border=True):
         # Plant Description
         with col1:
             fig = utilities.draw_pie(filtered_df, values='Quantity',names = 'Plant Description', title="DCA Volumes")
-            st.plotly_chart(fig, width='stretch',key="ytd7")
+            utilities.plotly_chart(fig, width='stretch',key="ytd7")
 
         with col2:
             fig = utilities.draw_histogram_month_quantity(filtered_df, color="Plant Description", title="Monthly Quantity")
-            st.plotly_chart(fig, width='stretch',key="ytd8")
+            utilities.plotly_chart(fig, width='stretch',key="ytd8")
 
     # Material Family
     with tab_family:
         col1, col2 = st.columns([1,2])
         with col1:
             fig = utilities.draw_pie(filtered_df, values='Quantity',names = 'Material Family', title="Material Category")
-            st.plotly_chart(fig, width='stretch',key="ytd9")
+            utilities.plotly_chart(fig, width='stretch',key="ytd9")
 
         with col2:
             fig = utilities.draw_histogram_month_quantity(filtered_df, color="Material Family", title="Monthly Quantity")
-            st.plotly_chart(fig, width='stretch',key="ytd10")
+            utilities.plotly_chart(fig, width='stretch',key="ytd10")
 
     # Material Group
     with tab_group:
         col1, col2 = st.columns([1,2])
         with col1:
             fig = utilities.draw_pie(filtered_df, values='Quantity',names = 'Material Group', title="Material Group")
-            st.plotly_chart(fig, width='stretch',key="ytd11")
+            utilities.plotly_chart(fig, width='stretch',key="ytd11")
 
         with col2:
             fig = utilities.draw_histogram_month_quantity(filtered_df, color="Material Group", title="Monthly Quantity")
-            st.plotly_chart(fig, width='stretch',key="ytd12")
+            utilities.plotly_chart(fig, width='stretch',key="ytd12")
     
     # Material Description
     with tab_desc:
         col1, col2 = st.columns([1,2])
         with col1:
             fig = utilities.draw_pie(filtered_df, values='Quantity',names = 'Material Description', title="Material Description")
-            st.plotly_chart(fig, width='stretch',key="ytd13")
+            utilities.plotly_chart(fig, width='stretch',key="ytd13")
 
         with col2:
             fig = utilities.draw_histogram_month_quantity(filtered_df, color="Material Description", title="Monthly Quantity")
-            st.plotly_chart(fig, width='stretch',key="ytd14")
+            utilities.plotly_chart(fig, width='stretch',key="ytd14")
     
 # Table
 with st.container(border=True):
@@ -3,6 +3,8 @@ import pandas as pd
 import numpy as np
 from streamlit_calendar import calendar
 from discount_calc import discount
+from discount_cache import discount_cache
+from filter_index import filter_index
 from datetime import datetime
 import utilities
 
@@ -29,7 +31,7 @@ def prepare_material_price_metrics(df: pd.DataFrame) -> pd.DataFrame:
         (df["Net Discount"] * df["Quantity"])
     )
     material_df = (
-        df.groupby("Material Description", as_index=False)
+        df.groupby("Material Description", as_index=False, observed=True)
         .agg(
             Total_Quantity=("Quantity", "sum"),
             Total_Final_Value=("Final Value", "sum")
@@ -71,7 +73,8 @@ def prepare_daily_material_calendar_df(df: pd.DataFrame) -> pd.DataFrame:
     daily = (
         df.groupby(
             ["Billing Date", "Material Description"],
-            as_index=False
+            as_index=False,
+            observed=True
         )
         .agg(
             Total_Quantity=("Quantity", "sum"),
@@ -181,7 +184,8 @@ with st.container(border=True):
     selected_year, selected_month, filter_df = utilities.period_selection(df)
     filtered_df = filter_df
     
-monthly_discounts = discount.filter_discounts_for_month(discount_json, selected_year, selected_month)
+monthly_discounts = discount.filter_discounts_for_month(discount_json, selected_year, selected_month,
+                                                       st.session_state.cache_version)
 
 if not monthly_discounts:
     st.warning("No discounts applicable for the selected month.")
@@ -191,33 +195,29 @@ if filter_df.empty:
     st.warning(f"No sales data found for the period")
     st.stop()
 else:
-    df_with_discount = discount.apply_discount(filter_df,monthly_discounts, selected_year, selected_month)
+    df_with_discount = discount_cache.apply_discount(filter_df,monthly_discounts, selected_year, selected_month,
+                                                     cache_version=st.session_state.cache_version)
     col1, col2, col3,col4,col5 = st.columns(5)
+    # Cascade on row masks of the month's lines, copied once at the end
+    index = filter_index.get(df_with_discount)
+    mask = filter_index.all_rows(index)
 
     with col1:
-        cg = st.multiselect("Customer Group", df_with_discount["Sold-to Group"].unique())
-        if not cg: cg = df_with_discount["Sold-to Group"].unique()
-        df_with_discount = df_with_discount[df_with_discount["Sold-to Group"].isin(cg)]
+        mask = filter_index.multiselect("Customer Group", index, "Sold-to Group", mask)
 
     with col2:
-        cust = st.multiselect("Customer", df_with_discount["Sold-to-Party Name"].unique())
-        if not cust: cust = df_with_discount["Sold-to-Party Name"].unique()
-        df_with_discount = df_with_discount[df_with_discount["Sold-to-Party Name"].isin(cust)]
+        mask = filter_index.multiselect("Customer", index, "Sold-to-Party Name", mask)
 
     with col3:
-        group = st.multiselect("Group", df_with_discount["Material Group"].unique())
-        if not group: group = df_with_discount["Material Group"].unique()
-        df_with_discount = df_with_discount[df_with_discount["Material Group"].isin(group)]
+        mask = filter_index.multiselect("Group", index, "Material Group", mask)
 
     with col4:
-        grade = st.multiselect("Grade", df_with_discount["Material Description"].unique())
-        if not grade: grade = df_with_discount["Material Description"].unique()
-        df_with_discount = df_with_discount[df_with_discount["Material Description"].isin(grade)]
+        mask = filter_index.multiselect("Grade", index, "Material Description", mask)
 
     with col5:
-        dca = st.multiselect("DCA", df_with_discount["Plant Description"].unique())
-        if not dca: dca = df_with_discount["Plant Description"].unique()
-        df_with_discount = df_with_discount[df_with_discount["Plant Description"].isin(dca)]
+        mask = filter_index.multiselect("DCA", index, "Plant Description", mask)
+
+    df_with_discount = filter_index.rows(index, mask)
 
     if len(df_with_discount) ==0 :
         st.warning("No Records Found")
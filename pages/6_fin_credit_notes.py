@@ -3,6 +3,7 @@ from discount_calc import discount
 import pandas as pd
 from calendar import monthrange
 import utilities
+from credit_notes import credit_notes
 
 utilities.apply_common_styles("Credit Notes")
 
@@ -11,8 +12,43 @@ df = st.session_state["Sales Data"]
 # May be modified to read data again post publishing
 discount_json = st.session_state["Discount Data"] = discount.read_json_from_drive(st.session_state.cache_version)
 
+mode = st.radio("Mode", ["Single Month", "Fiscal Year"], horizontal=True)
+
+# Whole fiscal years at once - every month computed in parallel
+if mode == "Fiscal Year":
+    fiscal_years = sorted(df["Fiscal Year"].dropna().unique().astype(int))
+    selected_fys = st.multiselect("Fiscal Year", fiscal_years, default=fiscal_years[-1:])
+
+    batch_key = (tuple(selected_fys), df.attrs.get("data_version"), st.session_state.cache_version)
+    if st.button("Compute Credit Notes", disabled=not selected_fys):
+        with st.spinner("Computing credit notes for every month..."):
+            st.session_state["Credit Note Batch"] = (
+                batch_key, credit_notes.compute_fiscal_years(selected_fys, discount_json,
+                                                          cache_version=st.session_state.cache_version))
+
+    batch = st.session_state.get("Credit Note Batch")
+    if batch is None or batch[0] != batch_key:
+        st.stop()
+    batch_df = batch[1]
+
+    for month, error in batch_df.attrs.get("errors", {}).items():
+        st.error(f"{month}: {error}")
+    if batch_df.empty:
+        st.warning("No credit notes for the selected fiscal years.")
+        st.stop()
+
+    month_summary = (batch_df
+        .groupby(["Fiscal Year", "Year", "Month"], as_index=False)[["Quantity", "Month Credit Note", "Annual Credit Note"]]
+        .sum())
+    st.markdown("#### Monthly Summary")
+    utilities.render_excel_pivot(month_summary, "credit_note_months")
+    st.markdown("#### Credit Notes by Customer and Month")
+    utilities.render_excel_pivot(batch_df, "credit_note_batch")
+    st.stop()
+
 selected_year, selected_month, filtered_df = utilities.period_selection(df)
-monthly_discounts = discount.filter_discounts_for_month(discount_json, selected_year, selected_month)
+monthly_discounts = discount.filter_discounts_for_month(discount_json, selected_year, selected_month,
+                                                       st.session_state.cache_version)
 
 if not monthly_discounts:
     st.warning("No discounts applicable for the selected month.")
@@ -22,10 +58,19 @@ if filtered_df.empty:
     st.warning(f"No sales data found for the period")
     st.stop()
 else:
-    df_with_discount = discount.apply_discount(filtered_df,monthly_discounts, selected_year, selected_month)
+    # Patched in place of a full recompute when only some schemes changed since the last run
+    df_with_discount, scheme_delta = credit_notes.evaluate_month(filtered_df, monthly_discounts, selected_year, selected_month,
+                                                                 st.session_state.cache_version)
+    if scheme_delta is not None:
+        st.markdown("#### Impact of the Last Scheme Change")
+        if scheme_delta.empty:
+            st.info("The last scheme change did not change any credit note this month.")
+        else:
+            utilities.render_excel_pivot(scheme_delta, "scheme_delta")
+
     discount_pivot = (
         df_with_discount[["Regional Office", "Sold-to Party","Sold-to-Party Name", "Sold-to Group", "Quantity", "Month Credit Note"]]
-        .groupby(["Regional Office", "Sold-to Party","Sold-to-Party Name","Sold-to Group"], as_index=False)
+        .groupby(["Regional Office", "Sold-to Party","Sold-to-Party Name","Sold-to Group"], as_index=False, observed=True)
         .agg({"Quantity": "sum","Month Credit Note": "sum"}))
     st.markdown("#### Discount Summary")
     utilities.render_excel_pivot(discount_pivot,"discount_summary")
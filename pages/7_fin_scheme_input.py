@@ -1,7 +1,11 @@
 import streamlit as st
+import copy
 import datetime
 import pandas as pd
+import numpy as np
 from discount_calc import discount
+from discount_rules import discount_rules
+from scheme_simulator import scheme_simulator, SIMULATED_TYPES
 from datetime import date
 from streamlit_calendar import calendar
 import utilities
@@ -41,19 +45,14 @@ def format_discount_amount(record):
 def discounts_to_calendar_events(discount_json: dict, selected_groups, selected_discount_types):
     events = []
 
-    for discount_type, records in discount_json.items():
-        if discount_type not in selected_discount_types:
-            continue
-        for r in records:
-            record_groups = r.get("material_groups", [])
-
-            # BACKWARD-COMPATIBILITY FIX
-            if isinstance(record_groups, str):
-                record_groups = [record_groups]
-
-            if not set(record_groups).intersection(selected_groups):
-                continue
+    # Records of the selected types and groups, straight from the discount index
+    selected = discount_rules.overlapping(
+        discount_json,
+        discount_types=[d for d in discount_json if d in selected_discount_types],
+        material_groups=selected_groups)
 
+    for discount_type, positions in selected.items():
+        for r in (discount_json[discount_type][position] for position in positions):
             amount_text = format_discount_amount(r)
             if discount_type == "Price Change":
                 style = PRICE_CHANGE_STYLE.get(r["direction"], {})
@@ -132,26 +131,12 @@ def select_discount_record(existing_json, key_prefix: str):
 
 # Function for filtering by date
 def filter_discounts_by_date(discount_json: dict, start: date, end: date):
-    
-    start = pd.to_datetime(start).date()
-    end = pd.to_datetime(end).date()
-    filtered = {}
-
-    for dtype, records in discount_json.items():
-        valid_records = []
-
-        for r in records:
-            r_start = pd.to_datetime(r["start_date"]).date()
-            r_end = pd.to_datetime(r["end_date"]).date()
-
-            # STRICT containment logic
-            if r_start <= end and r_end >= start:
-                valid_records.append(r)
 
-        if valid_records:
-            filtered[dtype] = valid_records
+    # Whole days - a record is kept when it is live on any day from start to end
+    start = pd.to_datetime(start).normalize()
+    end = pd.to_datetime(end).normalize() + pd.Timedelta(days=1) - pd.Timedelta(1, "ns")
 
-    return filtered
+    return discount_rules.filter_by_period(discount_json, start, end)
 
 # Find Record Index
 def find_record_index(records, target_record, discount_type):
@@ -265,8 +250,9 @@ def slab_discounts(key_prefix, basis):
 
 utilities.apply_common_styles("Monthly Schemes")
 
-tab_view, tab_cal_view, tab_add, tab_modify, tab_delete = st.tabs(
-    ["View Discounts","📄 Calendar View Discounts", "➕ Add Discount", "✏️ Modify Discount", "🗑️ Delete Discount"]
+tab_view, tab_cal_view, tab_add, tab_modify, tab_delete, tab_simulate = st.tabs(
+    ["View Discounts","📄 Calendar View Discounts", "➕ Add Discount", "✏️ Modify Discount", "🗑️ Delete Discount",
+     "🧪 Simulate Scheme"]
 )
 # View Discounts
 with tab_view:
@@ -627,8 +613,8 @@ with tab_add:
                     new_discount = data_to_save
                     # Read json file from google drive
                     current_add_json = discount.read_json_from_drive(st.session_state.cache_version)
-                    # Add new discount data
-                    updated_json = discount.append_discount(current_add_json, new_discount)
+                    # Add new discount data - to a copy, the loaded file stays as compiled
+                    updated_json = discount.append_discount(copy.deepcopy(current_add_json), new_discount)
                     # Rewrite file to drive
                     discount.overwrite_json_in_drive(updated_json)
                     st.session_state.cache_version += 1
@@ -706,9 +692,11 @@ with tab_modify:
                     discount_type=dtype
                     )
 
-                    current_mod_json[dtype][full_index] = updated_record
+                    # Edit a copy - the loaded file stays as compiled for its cache_version
+                    updated_json = copy.deepcopy(current_mod_json)
+                    updated_json[dtype][full_index] = updated_record
 
-                    discount.overwrite_json_in_drive(current_mod_json)
+                    discount.overwrite_json_in_drive(updated_json)
                     st.session_state.cache_version += 1
                     st.success("Discount updated successfully")
                     # st.rerun()
@@ -782,13 +770,78 @@ with tab_delete:
                     discount_type=dtype
                 )
 
-                del current_del_json[dtype][full_index]
+                # Edit a copy - the loaded file stays as compiled for its cache_version
+                updated_json = copy.deepcopy(current_del_json)
+                del updated_json[dtype][full_index]
 
                 # Clean up empty discount type
-                if not current_del_json[dtype]:
-                    del current_del_json[dtype]
+                if not updated_json[dtype]:
+                    del updated_json[dtype]
 
-                discount.overwrite_json_in_drive(current_del_json)
+                discount.overwrite_json_in_drive(updated_json)
                 st.session_state.cache_version += 1
                 st.success("Discount deleted successfully")
-                # st.rerun()
\ No newline at end of file
+                # st.rerun()
+
+# Simulate Candidate Slab Schemes
+with tab_simulate:
+    st.markdown("### What-If Slab Scheme")
+    df = st.session_state["Sales Data"]
+
+    col1, col2 = st.columns(2)
+    with col1:
+        sim_year = st.selectbox("Year", sorted(df["Year"].dropna().unique().astype(int)),
+                                index=None, placeholder="Select Year", key="sim_year")
+    with col2:
+        sim_month = st.selectbox("Month", sorted(df["Month"].dropna().unique().astype(int)),
+                                 format_func=lambda m: MONTHS[m], key="sim_month")
+    with col1:
+        sim_type = st.selectbox("Discount Type", list(SIMULATED_TYPES), key="sim_type")
+    with col2:
+        sim_groups = st.multiselect("Material Group", ["PP", "LLDPE", "HDPE"], default=["PP"], key="sim_groups")
+    with col1:
+        sim_basis = st.selectbox("Basis of Scheme", SIMULATED_TYPES[sim_type], key="sim_basis")
+    with col2:
+        if sim_basis == "Non-Zero Months Avg%":
+            sim_scheme_months = scheme_month_selection("sim")
+        elif sim_basis == "Flat Discount" and sim_type == "Hidden Discount":
+            sim_scheme_months = st.multiselect("Material Description",
+                    df["Material Description"][df["Material Group"].isin(sim_groups)].unique().tolist(),
+                    key="sim_mat_desc")
+        else:
+            sim_scheme_months = []
+
+    st.markdown("#### Base Slabs")
+    sim_slabs = slab_discounts("sim", sim_basis)
+
+    # Grid of candidates around the base slabs
+    col1, col2 = st.columns(2)
+    with col1:
+        amount_range = st.slider("Amount Scale", 0.1, 3.0, (0.5, 1.5), 0.1, key="sim_amount_range")
+        amount_steps = st.number_input("Amount Steps", 1, 25, 11, key="sim_amount_steps")
+    with col2:
+        criteria_range = st.slider("Criteria Scale", 0.1, 3.0, (0.5, 1.5), 0.1, key="sim_criteria_range")
+        criteria_steps = st.number_input("Criteria Steps", 1, 25, 11, key="sim_criteria_steps")
+
+    if st.button("Run Simulation", disabled=sim_year is None or not sim_groups, key="sim_run"):
+        sim_df = df[(df["Year"] == sim_year) & (df["Month"] == sim_month)]
+        if sim_df.empty:
+            st.warning("No sales data found for the period")
+            st.stop()
+
+        candidates = scheme_simulator.scaled_candidates(
+            {"discount_type": sim_type, "material_groups": sim_groups, "basis": sim_basis,
+             "scheme_months": sim_scheme_months, "discount_amount": sim_slabs},
+            np.unique(np.round(np.linspace(*amount_range, int(amount_steps)), 3)),
+            np.unique(np.round(np.linspace(*criteria_range, int(criteria_steps)), 3)))
+        with st.spinner(f"Simulating {len(candidates)} candidate schemes..."):
+            results = scheme_simulator.simulate(sim_df, candidates, sim_year, sim_month)
+        results["Criteria Scale"] = [c["criteria_scale"] for c in candidates]
+        results["Amount Scale"] = [c["amount_scale"] for c in candidates]
+
+        st.markdown("#### Cost (Criteria Scale × Amount Scale)")
+        st.dataframe(results.pivot(index="Criteria Scale", columns="Amount Scale", values="Cost"))
+        st.markdown("#### Beneficiary Groups (Criteria Scale × Amount Scale)")
+        st.dataframe(results.pivot(index="Criteria Scale", columns="Amount Scale", values="Beneficiaries"))
+        st.markdown("#### All Candidates")
+        utilities.render_excel_pivot(results, "sim_results")
@@ -1,46 +1,361 @@
+import time
+import uuid
+import hashlib
+import threading
 import streamlit as st
 import pandas as pd
-from streamlit_gsheets import GSheetsConnection
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from gsheet_api import gsheet_api
+from data_source import data_source
+from sales_snapshot import snapshot
+from dimension_cache import dimension_cache
+from sales_cube import sales_cube
+from sales_history import sales_history
+from utilities import month_order
+
+RECONCILE_EVERY = timedelta(hours=24)
+# Seconds fetch_sales_data is served from st.cache_data
+SALES_TTL = 3600
+
+# Billing Date layouts tried before falling back to per-value parsing
+DATE_FORMATS = [
+    "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y-%m-%d",
+    "%d/%m/%Y %H:%M:%S", "%d-%m-%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S",
+    "%d-%b-%Y", "%d-%b-%y", "%d %b %Y",
+]
+DATE_FORMAT_SAMPLE = 500
+
+# Sales Data schema - low-cardinality text as categoricals
+SALES_CATEGORY_COLUMNS = [
+    "Regional Office", "Plant Description", "Plant Reg State",
+    "Material Group", "Material Family", "Material Description",
+    "Sold-to Group", "Sold-to-Party Name",
+]
+# IDs stay strings, dictionary-encoded
+SALES_ID_COLUMNS = ["Sold-to Party"]
+# Calendar columns that fit in small integers
+SALES_INT_COLUMNS = {"Year": "int16", "Month": "int8", "Fiscal Year": "int16"}
+
+# Session frame -> worksheet key in st.secrets["file_address"]
+WORKSHEETS = {
+    "Sales Data": "WORKSHEET_SALES",
+    "CMR Data": "WORKSHEET_CMR",
+    "Group Data": "WORKSHEET_GROUP",
+    "MOU Data": "WORKSHEET_MOU",
+}
+DIMENSIONS = ["CMR Data", "Group Data", "MOU Data"]
+
+# Session frame -> frames it is assembled from
+SHEET_DEPENDENCIES = {
+    "CMR Data": [],
+    "Group Data": [],
+    "MOU Data": ["Group Data"],
+    "Sales Data": ["CMR Data", "Group Data"],
+}
 
 class read_data():
-    
+
+    # Load every worksheet once, concurrently, and share results between dependent frames
     @staticmethod
-    def read_gsheet(spreadsheet_url: str, worksheet_name: str):
-        conn = st.connection("gsheets", type=GSheetsConnection)
-        return conn.read(
-            spreadsheet=spreadsheet_url,
-            worksheet=worksheet_name,
-            usecols=None
-        )
-    
+    def load_all_data() -> dict:
+        get_raw = read_data.prefetch_worksheets(read_data.plan_prefetch())
+        loaders = {
+            "CMR Data": lambda resolve: read_data.fetch_cmr_data(get_raw),
+            "Group Data": lambda resolve: read_data.fetch_group_data(get_raw),
+            "MOU Data": lambda resolve: read_data.fetch_mou_data(
+                get_group=lambda: resolve("Group Data"), get_raw=get_raw),
+            "Sales Data": lambda resolve: read_data.fetch_sales_data(
+                _get_dimensions=lambda revision: (read_data.fetch_cmr_data(get_raw, revision),
+                                                  read_data.fetch_group_data(get_raw, revision)),
+                _get_raw=get_raw),
+        }
+        data = read_data.run_dependency_graph(loaders, SHEET_DEPENDENCIES)
+        # Chart rollup, rebuilt only when the sales data was refreshed
+        sales = data["Sales Data"]
+        data["Sales Cube"] = sales_cube.get(sales.attrs.get("data_version"), sales)
+        # Monthly quantity history for the non-zero-average schemes
+        sales_history.refresh(sales)
+        return data
+
+    # Worksheets a rerun may have to read - everything not held by a cache
     @staticmethod
-    @st.cache_data(ttl=3600)
-    def fetch_sales_data():
-        spreadsheet_url = st.secrets["file_address"]["SPREADSHEET_URL"]
-        worksheet_name = st.secrets["file_address"]["WORKSHEET_SALES"]
-        df = read_data.read_gsheet(spreadsheet_url, worksheet_name)
-        
+    def plan_prefetch() -> list[str]:
+        names = [name for name in DIMENSIONS if dimension_cache.needs_load(name)]
+        # fetch_sales_data is served from its cache - it reads no worksheet
+        if read_data.sales_cache_warm():
+            return names
+
+        try:
+            revision = data_source.revision()
+        except Exception:
+            return names
+        if snapshot.is_current(revision):
+            return names
+
+        # Sales rows are merged with CMR and Group as read at this revision
+        names += [name for name in SHEET_DEPENDENCIES["Sales Data"]
+                  if name not in names and dimension_cache.needs_load(name, revision)]
+        # Add the sales sheet if it is due a full read anyway
+        if read_data.reconcile_due(snapshot.read_meta()) or not data_source.supports_incremental():
+            names.append("Sales Data")
+        return names
+
+    # When fetch_sales_data last ran in this process, and the frame it returned
+    @staticmethod
+    @st.cache_resource
+    def get_sales_state() -> dict:
+        return {"built_at": None, "data_version": None, "snapshot_revision": None}
+
+    # Its st.cache_data entry has not expired yet. A cleared cache only costs the sales
+    # sheet its place in the batch
+    @staticmethod
+    def sales_cache_warm() -> bool:
+        built_at = read_data.get_sales_state()["built_at"]
+        return built_at is not None and time.time() - built_at < SALES_TTL
+
+    # Lazy batch - the first loader that needs a planned worksheet fetches all of them
+    # in one request; later loaders take their frame from it
+    @staticmethod
+    def prefetch_worksheets(names: list[str]):
+        lock = threading.Lock()
+        batch = {"frames": None}
+
+        def get_raw(name):
+            if name not in names:
+                return None
+            with lock:
+                if batch["frames"] is None:
+                    batch["frames"] = read_data.read_worksheets(names)
+                # Each frame is handed out once, later reads go to the sheet again
+                return batch["frames"].pop(name, None)
+
+        return get_raw
+
+    # Raw worksheets from the configured source - one values.batchGet round trip on Sheets
+    @staticmethod
+    def read_worksheets(names: list[str]) -> dict:
+        file_address = st.secrets.get("file_address", {})
+        worksheet_names = [file_address.get(WORKSHEETS[name], name) for name in names]
+        frames = data_source.read_worksheets(worksheet_names)
+        return {name: frames[worksheet] for name, worksheet in zip(names, worksheet_names)}
+
+    # Raw worksheet from the shared batch, or on its own if it was not planned
+    @staticmethod
+    def read_worksheet(name: str, get_raw=None) -> pd.DataFrame:
+        df = get_raw(name) if get_raw is not None else None
+        if df is None:
+            df = read_data.read_worksheets([name])[name]
+        return df
+
+    # Every loader starts at once and waits on a dependency only when it needs it,
+    # so the total time is bounded by the slowest single worksheet
+    @staticmethod
+    def run_dependency_graph(loaders: dict, dependencies: dict) -> dict:
+        futures = {}
+
+        def resolve_for(name):
+            def resolve(dependency):
+                if dependency not in dependencies.get(name, []):
+                    raise ValueError(f"{name} does not declare a dependency on {dependency}")
+                return futures[dependency].result()
+            return resolve
+
+        ctx = get_script_run_ctx()
+        with ThreadPoolExecutor(max_workers=len(loaders),
+                                initializer=add_script_run_ctx, initargs=(None, ctx)) as pool:
+            for name, loader in loaders.items():
+                futures[name] = pool.submit(loader, resolve_for(name))
+            return {name: future.result() for name, future in futures.items()}
+
+    @staticmethod
+    @st.cache_data(ttl=SALES_TTL)
+    def fetch_sales_data(_get_dimensions=None, _get_raw=None):
+        state = read_data.get_sales_state()
+        df = read_data.refresh_sales_data(_get_dimensions, _get_raw)
+        df = read_data.apply_sales_schema(df)
+        # Identifies this refresh to the caches built on top of it
+        df.attrs["data_version"] = uuid.uuid4().hex
+        # Appended rows extend the previous frame only if it held the snapshot they were added to
+        base_revision = df.attrs.get("base_revision")
+        if base_revision is not None and base_revision == state["snapshot_revision"]:
+            df.attrs["base_version"] = state["data_version"]
+        state.update(built_at=time.time(), data_version=df.attrs["data_version"],
+                     snapshot_revision=df.attrs.get("snapshot_revision"))
+        return df
+
+    # Cleaned, merged sales frame from the snapshot or the sheet
+    @staticmethod
+    def refresh_sales_data(_get_dimensions=None, _get_raw=None):
+        # Local snapshot is served until the source revision changes
+        try:
+            revision = data_source.revision()
+        except Exception:
+            # Source unreachable - fall back to the last snapshot if there is one
+            revision = None
+            if snapshot.exists():
+                return snapshot.load()
+        if snapshot.is_current(revision):
+            return snapshot.load()
+
+        # Billing rows are appended at the bottom - ingest only the new ones
+        meta = snapshot.read_meta()
+        if (revision is not None and data_source.supports_incremental()
+                and snapshot.exists() and not read_data.reconcile_due(meta)):
+            try:
+                df = read_data.ingest_new_sales_rows(st.secrets["file_address"]["WORKSHEET_SALES"],
+                                                     revision, meta, _get_dimensions)
+            except Exception:
+                # Sheets failing mid-refresh - the full read below can use the fallback
+                df = None
+            if df is not None:
+                return df
+
+        # Full reconcile - whole sheet, catches edits to older rows
+        raw_df = read_data.read_worksheet("Sales Data", _get_raw)
+        sheet_rows, header = raw_df.attrs["sheet_rows"], raw_df.attrs["header"]
+        df_cmr, df_group = read_data.fetch_dimensions(revision, _get_dimensions)
+        df = read_data.build_sales_frame(raw_df, df_cmr, df_group)
+
+        # Replica frames may be older than the revision - the snapshot keeps the last primary read
+        from_fallback = any(data_source.is_fallback(frame) for frame in (raw_df, df_cmr, df_group))
+        if revision is not None and not from_fallback:
+            snapshot.save(df, revision,
+                          sheet_rows=sheet_rows,
+                          columns=header,
+                          raw_dtypes=raw_df.dtypes.astype(str).to_dict(),
+                          dimensions=read_data.dimension_fingerprint(df_cmr, df_group),
+                          full_reconcile_at=datetime.now().isoformat(timespec="seconds"))
+            df.attrs["snapshot_revision"] = revision
+
+        return df
+
+    # Full reconcile once a day even if rows were only appended
+    @staticmethod
+    def reconcile_due(meta: dict) -> bool:
+        last_reconcile = meta.get("full_reconcile_at")
+        if not last_reconcile or "sheet_rows" not in meta or "raw_dtypes" not in meta:
+            return True
+        return datetime.now() - datetime.fromisoformat(last_reconcile) > RECONCILE_EVERY
+
+    # Append rows below the last ingested sheet row to the snapshot
+    @staticmethod
+    def ingest_new_sales_rows(worksheet_name, revision, meta, get_dimensions=None):
+        header, new_values = data_source.read_rows(worksheet_name, meta["sheet_rows"] + 1)
+
+        # Nothing appended means an older row was edited; a new header means a new layout
+        if not new_values or header != meta.get("columns"):
+            return None
+
+        # Cached rows were merged with other CMR / Group tables - all of them need merging again
+        df_cmr, df_group = read_data.fetch_dimensions(revision, get_dimensions)
+        if data_source.is_fallback(df_cmr) or data_source.is_fallback(df_group):
+            return None
+        dimensions = read_data.dimension_fingerprint(df_cmr, df_group)
+        if dimensions != meta.get("dimensions"):
+            return None
+
+        cached_df = snapshot.load()
+        raw_df = read_data.align_dtypes(gsheet_api.values_to_frame(header, new_values), meta["raw_dtypes"])
+        new_df = read_data.build_sales_frame(raw_df, df_cmr, df_group)
+
+        meta_update = {
+            "sheet_rows": meta["sheet_rows"] + len(new_values),
+            "columns": header,
+            "raw_dtypes": meta["raw_dtypes"],
+            "dimensions": dimensions,
+            "full_reconcile_at": meta["full_reconcile_at"],
+        }
+        if new_df.empty:
+            snapshot.write_meta({**meta, **meta_update, "revision": revision})
+            cached_df.attrs["snapshot_revision"] = revision
+            return cached_df
+
+        snapshot.append(new_df, revision, **meta_update)
+        df = pd.concat([cached_df, new_df], ignore_index=True)
+        # Lets tables built on the frame of the previous snapshot patch in just the new rows
+        df.attrs.update(appended_rows=len(new_df), base_revision=meta["revision"], snapshot_revision=revision)
+        return df
+
+    # CMR and Group tables the sales rows are merged with, as of the sales revision - the
+    # cache TTL is skipped so the snapshot saved under that revision matches it
+    @staticmethod
+    def fetch_dimensions(revision, get_dimensions=None) -> tuple[pd.DataFrame, pd.DataFrame]:
+        if get_dimensions is None:
+            return read_data.fetch_cmr_data(revision=revision), read_data.fetch_group_data(revision=revision)
+        return get_dimensions(revision)
+
+    # Hash of the CMR and Group columns the merges read
+    @staticmethod
+    def dimension_fingerprint(df_cmr: pd.DataFrame, df_group: pd.DataFrame) -> str:
+        digest = hashlib.sha256()
+        for frame in (df_cmr[["Ship-to Party", "Regional Office"]], df_group[["Sold-to Party", "Sold-to Group"]]):
+            digest.update(str(len(frame)).encode())
+            digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    # Raw sheet frame to the cleaned, merged sales frame
+    @staticmethod
+    def build_sales_frame(raw_df: pd.DataFrame, df_cmr: pd.DataFrame, df_group: pd.DataFrame) -> pd.DataFrame:
+        df = read_data.clean_sales_data(raw_df)
+        timings = df.attrs.get("clean_timings", {})
+        started = time.perf_counter()
+        df = read_data.merge_sales_dimensions(df, df_cmr, df_group)
+        # Merges drop attrs, so the timings are put back
+        df.attrs["clean_timings"] = {**timings, "merge dimensions": round(time.perf_counter() - started, 4)}
+        return df
+
+    # A handful of new rows can infer other types than the full sheet did
+    @staticmethod
+    def align_dtypes(df: pd.DataFrame, dtypes: dict) -> pd.DataFrame:
+        for col, dtype in dtypes.items():
+            if col not in df.columns or str(df[col].dtype) == dtype:
+                continue
+            try:
+                df[col] = df[col].astype(dtype)
+            except (ValueError, TypeError):
+                pass
+        return df
+
+    @staticmethod
+    def clean_sales_data(df: pd.DataFrame) -> pd.DataFrame:
+        # Seconds spent per cleaning step
+        timings = {}
+        started = time.perf_counter()
+        def lap(step):
+            nonlocal started
+            now = time.perf_counter()
+            timings[step] = round(now - started, 4)
+            started = now
+
         #Data Cleaning
         #Remove Blank Rows and Columns
         df = df.dropna(subset=["Billing Date"])
         df = df.loc[:, ~df.columns.str.contains("Unnamed")]
+        lap("drop blanks")
 
-
-        # Convert Net Billing with commas to Float
-        df["Net Value of Billing item"] = (
+        # Convert Net Billing with commas to Float - nearly every value is distinct,
+        # so one vectorized pass beats parsing the uniques
+        df["Net Value of Billing item"] = pd.to_numeric(
             df["Net Value of Billing item"]
-            .str.replace(",", "")
-            .astype("Float64")  # nullable integer
-        )
-        
+            .astype("string")  # a few appended rows may already parse as numbers
+            .str.replace(",", "", regex=False)
+        ).astype("Float64")  # nullable float
+        lap("net value")
+
         # Convert Date to Datetime
-        df["Billing Date"] = pd.to_datetime(df["Billing Date"],dayfirst=True, format="mixed")
+        df["Billing Date"] = read_data.parse_billing_dates(df["Billing Date"])
+        lap("billing date")
+
         df["Year"] = df["Billing Date"].dt.year
         df["Month"] = df["Billing Date"].dt.month
-        df['Month Name'] = df['Billing Date'].dt.month_name()
+        # A few hundred billing days - name each once
+        df['Month Name'] = read_data.map_unique(df['Billing Date'], lambda values: values.dt.month_name())
+        lap("calendar columns")
 
         # Keeping Customer ID as string
-        df["Sold-to Party"] = df["Sold-to Party"].astype(str)
+        df["Sold-to Party"] = read_data.map_unique(df["Sold-to Party"], lambda values: values.astype(str))
         # df["Ship-to Party"] = df["Ship-to Party"].astype(str)
         # df["Billing Document No."] = df["Billing Document No."].astype(str)
         # df["Material"] = df["Material"].astype(str)
@@ -48,19 +363,108 @@ class read_data():
         # df["Fiscal Year"] = df["Fiscal Year"].astype(str)
         # df["Year"] = df["Year"].astype(str)
         # df["Month"] = df["Month"].astype(str)
-        
-        # Replace part of string - Material Description
-        df["Material Description"] = df["Material Description"].apply(lambda x: x.replace("HP DURAPOL ", ""))
-        df["Material Description"] = df["Material Description"].apply(lambda x: x.replace("-MS", ""))
-        
-        # Call Function Fetch CMR Data
-        df_cmr = read_data.fetch_cmr_data()
+        lap("customer id")
+
+        # Replace part of string - Material Description (a few dozen grades)
+        df["Material Description"] = read_data.map_unique(
+            df["Material Description"],
+            lambda values: values
+            .str.replace("HP DURAPOL ", "", regex=False)
+            .str.replace("-MS", "", regex=False)
+        )
+        lap("material description")
+
+        df.attrs["clean_timings"] = timings
+        return df
+
+    # Apply a column transform to the distinct values only and map the results back
+    @staticmethod
+    def map_unique(series: pd.Series, transform) -> pd.Series:
+        # Missing values get a code of their own, so they are transformed like any other value
+        codes, uniques = pd.factorize(series, use_na_sentinel=False)
+        parsed = transform(pd.Series(uniques))
+        return pd.Series(parsed.to_numpy()[codes], index=series.index, name=series.name)
+
+    # Billing dates in the sheet's dominant format, the odd ones parsed individually
+    @staticmethod
+    def parse_billing_dates(dates: pd.Series) -> pd.Series:
+        if not (pd.api.types.is_object_dtype(dates) or pd.api.types.is_string_dtype(dates)):
+            return pd.to_datetime(dates, dayfirst=True, format="mixed")
+
+        def parse(values):
+            values = values.astype(str).str.strip()
+            date_format = read_data.detect_date_format(values)
+            if date_format is None:
+                return pd.to_datetime(values, dayfirst=True, format="mixed")
+
+            parsed = pd.to_datetime(values, format=date_format, errors="coerce")
+            outliers = parsed.isna()
+            if outliers.any():
+                parsed[outliers] = pd.to_datetime(values[outliers], dayfirst=True, format="mixed")
+            return parsed
+
+        return read_data.map_unique(dates, parse)
+
+    # Format that parses most of a sample exactly like the mixed day-first parser
+    @staticmethod
+    def detect_date_format(values: pd.Series):
+        sample = values.sample(min(len(values), DATE_FORMAT_SAMPLE), random_state=0)
+        try:
+            expected = pd.to_datetime(sample, dayfirst=True, format="mixed")
+        except (ValueError, TypeError):
+            return None
+
+        best_format, best_hits = None, 0
+        for date_format in DATE_FORMATS:
+            parsed = pd.to_datetime(sample, format=date_format, errors="coerce")
+            if (parsed.notna() & (parsed != expected)).any():
+                continue  # would read day and month the other way round
+            hits = int(parsed.notna().sum())
+            if hits > best_hits:
+                best_format, best_hits = date_format, hits
+        return best_format
+
+    # Compact in-memory types for the session frame
+    @staticmethod
+    def apply_sales_schema(df: pd.DataFrame) -> pd.DataFrame:
+        bytes_before = df.memory_usage(deep=True).sum()
+
+        for col in SALES_CATEGORY_COLUMNS + SALES_ID_COLUMNS:
+            if col in df.columns:
+                df[col] = df[col].astype("category")
+
+        # Fiscal month order, so sorting by month needs no extra mapping
+        if "Month Name" in df.columns:
+            df["Month Name"] = pd.Categorical(df["Month Name"], categories=month_order, ordered=True)
+
+        # Downcast only whole, non-missing values
+        for col, dtype in SALES_INT_COLUMNS.items():
+            if col not in df.columns:
+                continue
+            values = pd.to_numeric(df[col], errors="coerce")
+            if values.notna().all() and (values % 1 == 0).all():
+                df[col] = values.astype(dtype)
+
+        # Quantity stays float64 - float32 sums drift on credit-note totals
+
+        bytes_after = df.memory_usage(deep=True).sum()
+        rows = max(len(df), 1)
+        df.attrs["schema_report"] = {
+            "rows": len(df),
+            "bytes_per_row_before": round(float(bytes_before) / rows, 1),
+            "bytes_per_row_after": round(float(bytes_after) / rows, 1),
+            "mb_before": round(float(bytes_before) / 2**20, 2),
+            "mb_after": round(float(bytes_after) / 2**20, 2),
+        }
+        return df
+
+    # Regional Office, Customer Group and Material Family
+    @staticmethod
+    def merge_sales_dimensions(df: pd.DataFrame, df_cmr: pd.DataFrame, df_group: pd.DataFrame) -> pd.DataFrame:
         df = df.merge(df_cmr[["Ship-to Party", "Regional Office"]],on="Ship-to Party",how="left")
         df["Regional Office"] = df["Regional Office"].fillna("Unknown")
         
 
-        # Call Function Customer Group
-        df_group = read_data.fetch_group_data()
         df = df.merge(df_group[["Sold-to Party", "Sold-to Group"]],on="Sold-to Party",how="left")
         df["Sold-to Group"] = df["Sold-to Group"].fillna(df["Sold-to-Party Name"])
 
@@ -75,29 +479,37 @@ class read_data():
 
         return df
     
-    def fetch_cmr_data():
-        spreadsheet_url = st.secrets["file_address"]["SPREADSHEET_URL"]
-        worksheet_name = st.secrets["file_address"]["WORKSHEET_CMR"]
-        df = read_data.read_gsheet(spreadsheet_url, worksheet_name)
+    # Dimension tables are served from the shared dimension cache
+    def fetch_cmr_data(get_raw=None, revision=None):
+        return dimension_cache.get("CMR Data", lambda: read_data.read_cmr_data(get_raw), revision)
+
+    def fetch_group_data(get_raw=None, revision=None):
+        return dimension_cache.get("Group Data", lambda: read_data.read_group_data(get_raw), revision)
+
+    def fetch_mou_data(get_group=None, get_raw=None):
+        return dimension_cache.get("MOU Data", lambda: read_data.read_mou_data(get_group, get_raw))
+
+    # Drop cached dimension tables so the next fetch re-reads the sheets
+    def invalidate_dimensions(names=None):
+        dimension_cache.invalidate(names)
+
+    def read_cmr_data(get_raw=None):
+        df = read_data.read_worksheet("CMR Data", get_raw)
         # Keeping Customer ID as string
         df["Sold-to Party"] = df["Sold-to Party"].astype(str)
 
         return df
     
-    def fetch_group_data():
-        spreadsheet_url = st.secrets["file_address"]["SPREADSHEET_URL"]
-        worksheet_name = st.secrets["file_address"]["WORKSHEET_GROUP"]
-        df = read_data.read_gsheet(spreadsheet_url, worksheet_name)
+    def read_group_data(get_raw=None):
+        df = read_data.read_worksheet("Group Data", get_raw)
 
         # Keeping Customer ID as string
         df["Sold-to Party"] = df["Sold-to Party"].astype(str)
 
         return df
     
-    def fetch_mou_data():
-        spreadsheet_url = st.secrets["file_address"]["SPREADSHEET_URL"]
-        worksheet_name = st.secrets["file_address"]["WORKSHEET_MOU"]
-        df = read_data.read_gsheet(spreadsheet_url, worksheet_name)
+    def read_mou_data(get_group=None, get_raw=None):
+        df = read_data.read_worksheet("MOU Data", get_raw)
         # Blank cells as 0
         df["PP"] = df["PP"].fillna(0)
         df["PE"] = df["PE"].fillna(0)
@@ -106,10 +518,13 @@ class read_data():
         # Date Correction
         df["MOU Start Date"] = pd.to_datetime(df["MOU Start Date"])
         df["MOU End Date"] = pd.to_datetime(df["MOU End Date"])
-        # Call Function Customer Group
-        df_group = read_data.fetch_group_data()
+        # Customer Group - shared with the loader when given
+        df_group = get_group() if get_group is not None else read_data.fetch_group_data()
+        attrs = df.attrs
         df = df.merge(df_group[["Sold-to Party", "Sold-to Group"]],on="Sold-to Party",how="left")
         df["Sold-to Group"] = df["Sold-to Group"].fillna(df["Sold-to-Party Name"])
+        # Merges drop attrs, so the source tag is put back
+        df.attrs.update(attrs)
         # Rename specific columns
         # df = df.rename(columns={"PP": "MOU PP", "PE": "MOU PE"})
         return df
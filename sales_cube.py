@@ -0,0 +1,44 @@
+import streamlit as st
+import pandas as pd
+from filter_index import filter_index
+
+
+# Grain of the cube - month x organisation x material. Billing dates and customers would
+# leave it at nearly one row per billing line; views that need them look the lines up
+# with matching_rows. (Fiscal Year, Year and Month Name follow from the month, so they add no rows)
+CUBE_DIMENSIONS = [
+    "Fiscal Year", "Year", "Month", "Month Name",
+    "Regional Office", "Plant Reg State", "Plant Description",
+    "Material Family", "Material Group", "Material Description",
+]
+CUBE_MEASURES = ["Quantity"]
+
+class sales_cube():
+
+    # Quantity summed per dimension combination. Groups keep the order of their first
+    # billing line, so charts and filter options list values as they did on raw rows
+    @staticmethod
+    def build(df: pd.DataFrame) -> pd.DataFrame:
+        dims = [col for col in CUBE_DIMENSIONS if col in df.columns]
+        return df.groupby(dims, observed=True, dropna=False, sort=False, as_index=False)[CUBE_MEASURES].sum()
+
+    # Built once per data refresh, shared by every session
+    @staticmethod
+    @st.cache_data(max_entries=2)
+    def get(data_version: str, _df: pd.DataFrame) -> pd.DataFrame:
+        cube = sales_cube.build(_df)
+        cube.attrs["data_version"] = data_version
+        cube.attrs["source_rows"] = len(_df)
+        return cube
+
+    # Billing lines behind a filtered slice of the cube (for the detailed tables).
+    # Valid for slices filtered column by column, which is how every page filters.
+    # Narrowed on df's filter index, so lines of the loaded sales data keep their selection
+    @staticmethod
+    def matching_rows(df: pd.DataFrame, cube_slice: pd.DataFrame) -> pd.DataFrame:
+        index = filter_index.get(df)
+        mask = filter_index.all_rows(index)
+        for col in CUBE_DIMENSIONS:
+            if col in df.columns and col in cube_slice.columns:
+                mask = filter_index.narrow(index, col, cube_slice[col].unique(), mask)
+        return filter_index.rows(index, mask)
@@ -0,0 +1,113 @@
+import threading
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+
+FISCAL_START = 4  # April
+HISTORY_KEYS = ["Sold-to Group", "Material Family"]
+
+class sales_history():
+
+    # Process-wide monthly quantity table, shared by all sessions
+    @staticmethod
+    @st.cache_resource
+    def get_store():
+        return {
+            "version": None,    # data_version of the sales frame the table was built from
+            "rows": 0,
+            "table": None,      # Fiscal Year, Month, Sold-to Group, Material Family -> Quantity
+            "dense": {},        # Fiscal Year -> (group keys, groups x 12 month matrix)
+            "answers": {},      # (Fiscal Year, scheme months) -> non-zero averages
+            "lock": threading.Lock(),
+        }
+
+    # Fiscal Year * 100 + Month of every row
+    @staticmethod
+    def period_keys(df: pd.DataFrame) -> np.ndarray:
+        month = pd.to_numeric(df["Month"]).to_numpy(dtype=float)
+        year = pd.to_numeric(df["Year"]).to_numpy(dtype=float)
+        return np.where(month >= FISCAL_START, year, year - 1) * 100 + month
+
+    # Quantity per (Fiscal Year, Month, Sold-to Group, Material Family), group keys
+    # normalised the way discount.prepare_group_pivot does it
+    @staticmethod
+    def monthly_quantity(df: pd.DataFrame) -> pd.DataFrame:
+        month = pd.to_numeric(df["Month"])
+        frame = pd.DataFrame({
+            "Fiscal Year": np.where(month >= FISCAL_START, df["Year"], df["Year"] - 1),
+            "Month": month,
+            "Quantity": pd.to_numeric(df["Quantity"], errors="coerce").fillna(0),
+        })
+        for col in HISTORY_KEYS:
+            frame[col] = df[col].astype(object).fillna("UNKNOWN").astype(str).to_numpy()
+        return frame.groupby(["Fiscal Year", "Month"] + HISTORY_KEYS, as_index=False)["Quantity"].sum()
+
+    # Groups x months matrix of one fiscal year
+    @staticmethod
+    def dense_year(table: pd.DataFrame, fiscal_year) -> tuple[dict, np.ndarray]:
+        year = table[table["Fiscal Year"] == fiscal_year]
+        keys = year[HISTORY_KEYS].drop_duplicates()
+        codes = pd.MultiIndex.from_frame(keys).get_indexer(pd.MultiIndex.from_frame(year[HISTORY_KEYS]))
+        matrix = np.zeros((len(keys), 12))
+        matrix[codes, year["Month"].to_numpy(dtype=int) - 1] = year["Quantity"].to_numpy()
+        return {col: keys[col].to_numpy() for col in HISTORY_KEYS}, matrix
+
+    # Table for this sales frame - rebuilt after a full reload, patched when rows were
+    # only appended (just the months the new rows fall in are regrouped). A patch goes only
+    # onto the table of the frame the rows were appended to - its data_version is the new
+    # frame's base_version
+    @staticmethod
+    def refresh(df: pd.DataFrame) -> dict:
+        store = sales_history.get_store()
+        version = df.attrs.get("data_version")
+        with store["lock"]:
+            if store["table"] is not None and version is not None and store["version"] == version:
+                return store
+
+            appended = df.attrs.get("appended_rows")
+            base_version = df.attrs.get("base_version")
+            if (store["table"] is not None and appended and base_version is not None
+                    and store["version"] == base_version and store["rows"] == len(df) - appended):
+                periods = sales_history.period_keys(df)
+                new_periods = pd.unique(periods[len(df) - appended:])
+                new_periods = new_periods[~np.isnan(new_periods)]
+
+                table = store["table"]
+                table_periods = table["Fiscal Year"].to_numpy(dtype=float) * 100 + table["Month"].to_numpy(dtype=float)
+                kept = ~np.isin(table_periods, new_periods)
+                table = pd.concat([table[kept], sales_history.monthly_quantity(df[np.isin(periods, new_periods)])],
+                                  ignore_index=True)
+                years = pd.unique(new_periods // 100)
+            else:
+                table = sales_history.monthly_quantity(df)
+                store["dense"] = {}
+                years = table["Fiscal Year"].unique()
+
+            for fiscal_year in years:
+                store["dense"][fiscal_year] = sales_history.dense_year(table, fiscal_year)
+            store.update(version=version, rows=len(df), table=table, answers={})
+            return store
+
+    # Average monthly quantity over the scheme months with sales, per group and family
+    @staticmethod
+    def non_zero_average(df: pd.DataFrame, fiscal_year, scheme_months: list[int]) -> pd.DataFrame:
+        store = sales_history.refresh(df)
+        months = [m - 1 for m in dict.fromkeys(scheme_months) if 1 <= m <= 12]
+        answer_key = (fiscal_year, tuple(months))
+
+        if answer_key not in store["answers"]:
+            empty = ({col: np.array([], dtype=object) for col in HISTORY_KEYS}, np.zeros((0, 12)))
+            keys, matrix = store["dense"].get(fiscal_year, empty)
+
+            window = matrix[:, months]
+            sold = window > 0
+            counts = sold.sum(axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                average = np.where(sold, window, 0.0).sum(axis=1) / counts
+
+            has_sales = counts > 0
+            store["answers"][answer_key] = pd.DataFrame(
+                {**{col: values[has_sales] for col, values in keys.items()},
+                 "Non-Zero Avg Qty": average[has_sales]})
+        return store["answers"][answer_key].copy()
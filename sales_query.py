@@ -0,0 +1,98 @@
+import duckdb
+import streamlit as st
+import pandas as pd
+
+
+# Name the frame is registered under inside each query
+VIEW_NAME = "sales"
+
+class sales_query():
+
+    # One in-process DuckDB per server - queries run on their own cursors
+    @staticmethod
+    @st.cache_resource
+    def get_connection():
+        return duckdb.connect(database=":memory:")
+
+    @staticmethod
+    def quote(identifier: str) -> str:
+        return '"' + str(identifier).replace('"', '""') + '"'
+
+    # Run SQL against the frame, registered as the view "sales" without copying it
+    # (DuckDB scans the pandas buffers directly, categoricals arrive as ENUMs)
+    @staticmethod
+    def sql(df: pd.DataFrame, query: str, params: list = None) -> pd.DataFrame:
+        cursor = sales_query.get_connection().cursor()
+        try:
+            cursor.register(VIEW_NAME, df)
+            return cursor.execute(query, params or []).df()
+        finally:
+            cursor.close()
+
+    # {column: value} -> WHERE clause; list-like values become IN, a (start, end) pair
+    # for Billing Date becomes an inclusive range
+    @staticmethod
+    def where(filters: dict = None) -> tuple[str, list]:
+        clauses, params = [], []
+        for col, value in (filters or {}).items():
+            column = sales_query.quote(col)
+            if col == "Billing Date" and isinstance(value, tuple):
+                clauses.append(f"{column} BETWEEN ? AND ?")
+                params.extend(pd.Timestamp(v) for v in value)
+            elif pd.api.types.is_list_like(value):
+                values = [sales_query.param(v) for v in value]
+                if not values:
+                    clauses.append("FALSE")
+                    continue
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(sales_query.param(value))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    # NumPy scalars to plain Python values for the DuckDB bindings
+    @staticmethod
+    def param(value):
+        return value.item() if hasattr(value, "item") and not isinstance(value, pd.Timestamp) else value
+
+    # Quantity (or other values) summed by the given columns, filters pushed into the scan.
+    # Same rows, order and key types as
+    # df.groupby(group_by, observed=True, as_index=False, sort=sort, dropna=dropna).sum()
+    @staticmethod
+    def sum_by(df: pd.DataFrame, group_by: list, filters: dict = None, values: list = None,
+               sort: bool = True, dropna: bool = True) -> pd.DataFrame:
+        values = values or ["Quantity"]
+        keys = ", ".join(sales_query.quote(col) for col in group_by)
+        sums = ", ".join(
+            f"COALESCE(SUM({sales_query.quote(col)}), 0) AS {sales_query.quote(col)}" for col in values)
+
+        where, params = sales_query.where(filters)
+        # groupby drops missing keys unless dropna=False
+        not_null = " AND ".join(f"{sales_query.quote(col)} IS NOT NULL" for col in group_by)
+        if not_null and dropna:
+            where = (where + " AND " + not_null) if where else " WHERE " + not_null
+
+        source = VIEW_NAME
+        if group_by and not sort:
+            # Groups in order of first appearance - row numbers follow the scan order
+            source = f"(SELECT *, ROW_NUMBER() OVER () AS __row FROM {VIEW_NAME})"
+        select = f"SELECT {keys + ', ' if keys else ''}{sums} FROM {source}{where}"
+        if keys:
+            select += f" GROUP BY {keys}"
+        if group_by and not sort:
+            select += " ORDER BY MIN(__row)"
+        result = sales_query.sql(df, select, params)
+
+        if not group_by:
+            return result
+        # Back to the frame's own key types, sorted the way groupby sorts them
+        result = result.astype({col: df[col].dtype for col in group_by})
+        if sort:
+            result = result.sort_values(group_by, kind="stable")
+        return result.reset_index(drop=True)
+
+    # Single total, e.g. the Total Quantity tiles
+    @staticmethod
+    def total(df: pd.DataFrame, filters: dict = None, value: str = "Quantity") -> float:
+        return float(sales_query.sum_by(df, [], filters, [value])[value].iloc[0])
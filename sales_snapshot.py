@@ -0,0 +1,123 @@
+import os
+import json
+import shutil
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+
+FISCAL_START = 4  # April
+SNAPSHOT_DIR = os.path.join(".cache", "sales_snapshot")
+PARTITION_DIR = os.path.join(SNAPSHOT_DIR, "partitions")
+META_FILE = os.path.join(SNAPSHOT_DIR, "meta.json")
+# Original sheet order is kept through the fiscal-year partitions
+ROW_COLUMN = "_source_row"
+
+class snapshot():
+
+    # Metadata of the stored snapshot (empty if none)
+    @staticmethod
+    def read_meta() -> dict:
+        if not os.path.exists(META_FILE):
+            return {}
+        with open(META_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    # Snapshot matches the current spreadsheet revision
+    @staticmethod
+    def is_current(revision) -> bool:
+        meta = snapshot.read_meta()
+        return bool(meta) and revision is not None and meta.get("revision") == revision
+
+    @staticmethod
+    def exists() -> bool:
+        return bool(snapshot.read_meta()) and os.path.isdir(PARTITION_DIR)
+
+    # Load the cleaned, merged sales frame from local Parquet
+    @staticmethod
+    def load() -> pd.DataFrame:
+        # Partitions are read one by one - their inferred column types may differ
+        parts = [
+            pd.read_parquet(os.path.join(PARTITION_DIR, name))
+            for name in sorted(os.listdir(PARTITION_DIR)) if name.endswith(".parquet")
+        ]
+        df = pd.concat(parts, ignore_index=True)
+        df = df.sort_values(ROW_COLUMN, kind="stable").drop(columns=[ROW_COLUMN]).reset_index(drop=True)
+        # Revision the stored rows match
+        df.attrs["snapshot_revision"] = snapshot.read_meta().get("revision")
+        return df
+
+    # Write the sales frame partitioned by fiscal year, plus metadata
+    @staticmethod
+    def save(df: pd.DataFrame, revision, **meta):
+        out = df.reset_index(drop=True)
+        out[ROW_COLUMN] = np.arange(len(out))
+        out = snapshot.to_arrow_safe(out)
+
+        billing_date = out["Billing Date"]
+        fiscal_year = (billing_date.dt.year - (billing_date.dt.month < FISCAL_START)).fillna(0)
+
+        # Write to a temp folder first so a crash never leaves half a snapshot
+        tmp_dir = PARTITION_DIR + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for fy, part in out.groupby(fiscal_year):
+            part.to_parquet(os.path.join(tmp_dir, f"FY{int(fy)}.parquet"), index=False)
+
+        shutil.rmtree(PARTITION_DIR, ignore_errors=True)
+        os.replace(tmp_dir, PARTITION_DIR)
+
+        high_water_mark = billing_date.max()
+        snapshot.write_meta({
+            "revision": revision,
+            "rows": len(out),
+            "billing_date_high_water_mark": high_water_mark.isoformat() if pd.notna(high_water_mark) else None,
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+            **meta,
+        })
+
+    # Append new rows - only the fiscal-year partitions they fall in are rewritten
+    @staticmethod
+    def append(new_df: pd.DataFrame, revision, **meta):
+        old_meta = snapshot.read_meta()
+        out = new_df.reset_index(drop=True)
+        out[ROW_COLUMN] = np.arange(len(out)) + old_meta.get("rows", 0)
+        out = snapshot.to_arrow_safe(out)
+
+        billing_date = out["Billing Date"]
+        fiscal_year = (billing_date.dt.year - (billing_date.dt.month < FISCAL_START)).fillna(0)
+
+        for fy, part in out.groupby(fiscal_year):
+            path = os.path.join(PARTITION_DIR, f"FY{int(fy)}.parquet")
+            if os.path.exists(path):
+                part = pd.concat([pd.read_parquet(path), part], ignore_index=True)
+            tmp_path = os.path.join(PARTITION_DIR, f"FY{int(fy)}.tmp")
+            part.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, path)
+
+        high_water_mark = billing_date.max()
+        if old_meta.get("billing_date_high_water_mark"):
+            old_mark = pd.Timestamp(old_meta["billing_date_high_water_mark"])
+            high_water_mark = old_mark if pd.isna(high_water_mark) else max(old_mark, high_water_mark)
+        snapshot.write_meta({
+            **old_meta,
+            "revision": revision,
+            "rows": old_meta.get("rows", 0) + len(out),
+            "billing_date_high_water_mark": high_water_mark.isoformat() if pd.notna(high_water_mark) else None,
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+            **meta,
+        })
+
+    @staticmethod
+    def write_meta(meta: dict):
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        with open(META_FILE, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+    # Sheet columns can hold mixed numbers and text, which Parquet rejects
+    @staticmethod
+    def to_arrow_safe(df: pd.DataFrame) -> pd.DataFrame:
+        for col in df.select_dtypes(include=["object"]).columns:
+            if pd.api.types.infer_dtype(df[col], skipna=True).startswith("mixed"):
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+        return df
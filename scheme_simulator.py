@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+from discount_calc import discount
+from discount_engine import discount_engine
+from discount_rules import discount_rules
+
+
+# Slab schemes that can be simulated, and the bases each one is read against
+SIMULATED_TYPES = {
+    "X-Y Scheme": ["MOU%", "Flat Discount", "Non-Zero Months Avg%"],
+    "Hidden Discount": ["MOU%", "Flat Discount", "Non-Zero Months Avg%"],
+}
+SIMULATION_COLUMNS = ["Candidate", "Discount Type", "Basis", "Material Groups",
+                      "Cost", "Beneficiaries", "Covered Quantity"]
+
+class scheme_simulator():
+
+    # Month quantity per (Sold-to Group, Material Group) over the lines a record can match -
+    # Sold-to Groups keyed as discount_engine.lookup keys them
+    @staticmethod
+    def month_quantity(filtered_df: pd.DataFrame) -> tuple[list, list, np.ndarray]:
+        dates = filtered_df["Billing Date"].to_numpy(dtype="datetime64[ns]")
+        lines = filtered_df[~np.isnat(dates) & filtered_df["Material Group"].notna().to_numpy()]
+
+        group_codes, groups = discount_engine.key_codes(lines, ["Sold-to Group"])
+        material_codes, material_groups = pd.factorize(lines["Material Group"])
+        quantity = np.zeros((len(groups), len(material_groups)))
+        np.add.at(quantity, (group_codes, material_codes),
+                  pd.to_numeric(lines["Quantity"], errors="coerce").fillna(0).to_numpy(dtype=float))
+        return groups, list(material_groups), quantity
+
+    # Cost and beneficiary count of every candidate, as if each were the only scheme of its
+    # type in the month. Candidates are discount records (discount_type, material_groups,
+    # basis, scheme_months, discount_amount slabs). The basis is computed once per distinct
+    # (type, basis, family, scheme months) from the shared group aggregates, then every
+    # candidate's slabs are resolved against it in one pass
+    @staticmethod
+    def simulate(filtered_df: pd.DataFrame, candidates: list[dict], select_year, select_month,
+                 memo: dict = None) -> pd.DataFrame:
+        if not candidates:
+            return pd.DataFrame(columns=SIMULATION_COLUMNS)
+        memo = discount_engine.new_memo() if memo is None else memo
+        groups, material_groups, quantity = scheme_simulator.month_quantity(filtered_df)
+
+        rules = []
+        for position, candidate in enumerate(candidates):
+            discount_type = candidate.get("discount_type", "X-Y Scheme")
+            if candidate.get("basis") not in SIMULATED_TYPES.get(discount_type, []):
+                raise ValueError(f"Cannot simulate {discount_type} on basis {candidate.get('basis')}")
+            rules.append(discount_rules.compile_record(discount_type, position, candidate))
+
+        # Basis of each Sold-to Group, once per distinct basis
+        basis_rows, basis_index = [], {}
+        for rule in rules:
+            basis_key = (rule.discount_type, rule.basis, rule.material_family, rule.scheme_months)
+            if basis_key not in basis_index:
+                basis_map = discount.slab_basis(filtered_df, rule, select_year, select_month, memo).to_dict()
+                basis_index[basis_key] = len(basis_rows)
+                basis_rows.append([basis_map.get(group, np.nan) for group in groups])
+        basis = np.array(basis_rows, dtype=float).reshape(len(basis_rows), len(groups))
+        values = basis[[basis_index[(r.discount_type, r.basis, r.material_family, r.scheme_months)]
+                        for r in rules]]
+
+        # Slabs padded to one width - unreachable criteria past each candidate's last slab
+        width = max(len(r.slab_criteria) for r in rules)
+        criteria = np.full((len(rules), width), np.inf)
+        best = np.zeros((len(rules), width + 1))
+        for i, rule in enumerate(rules):
+            criteria[i, :len(rule.slab_criteria)] = rule.slab_criteria
+            best[i, 1:len(rule.slab_best) + 1] = rule.slab_best
+
+        # Highest reached slab per (candidate, group) - 0.0 when none is reached or the basis is missing
+        reached = (values[:, :, None] >= criteria[:, None, :]).sum(axis=2)
+        rate = np.take_along_axis(best, reached, axis=1)
+
+        # Quantity of each group a candidate covers, through its material groups
+        covers = np.array([[group in rule.material_groups for group in material_groups] for rule in rules],
+                          dtype=float).reshape(len(rules), len(material_groups))
+        covered = covers @ quantity.T
+
+        return pd.DataFrame({
+            "Candidate": [candidate.get("name", f"Candidate {i + 1}") for i, candidate in enumerate(candidates)],
+            "Discount Type": [rule.discount_type for rule in rules],
+            "Basis": [rule.basis for rule in rules],
+            "Material Groups": [", ".join(rule.material_groups) for rule in rules],
+            "Cost": (rate * covered).sum(axis=1),
+            "Beneficiaries": ((rate > 0) & (covered > 0)).sum(axis=1),
+            "Covered Quantity": covered.sum(axis=1),
+        })
+
+    # Candidates from one slab table, its amounts and criteria each scaled over a grid
+    @staticmethod
+    def scaled_candidates(record: dict, amount_scales, criteria_scales) -> list[dict]:
+        candidates = []
+        for criteria_scale in criteria_scales:
+            for amount_scale in amount_scales:
+                slabs = [{"criteria": s["criteria"] * criteria_scale, "amount": s["amount"] * amount_scale}
+                         for s in record["discount_amount"]]
+                candidates.append({**record, "discount_amount": slabs,
+                                   "name": f"Criteria x{criteria_scale:g} / Amount x{amount_scale:g}",
+                                   "criteria_scale": criteria_scale, "amount_scale": amount_scale})
+        return candidates
@@ -1,29 +1,37 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+from filter_index import filter_index
 
-def apply_multiselect_filters(df, columns):
-    filtered_df = df.copy()
+# Each filter lists the values left by the ones before it. Works on row masks of the
+# frame's filter_index - one copy of the selected rows at the end
+def apply_multiselect_filters(df, columns, mask=None):
+    index = filter_index.get(df)
+    mask = multiselect_mask(index, columns, mask)
+    return filter_index.rows(index, mask)
+
+def multiselect_mask(index, columns, mask=None):
     exclude_columns = ['Billing Date']
     for col in columns:
         if col not in exclude_columns:
-            selected = st.multiselect(col, filtered_df[col].unique())
-            if not selected:
-                selected = filtered_df[col].unique()
-            filtered_df = filtered_df[filtered_df[col].isin(selected)]
-    
-    return filtered_df
+            mask = filter_index.multiselect(col, index, col, mask)
+    return filter_index.all_rows(index) if mask is None else mask
 
-def render_sidebar(original_df=None, columns_to_filter=["Regional Office"]):
+# mask - rows of original_df already picked by the page's own filters (all when None)
+def render_sidebar(original_df=None, columns_to_filter=["Regional Office"], mask=None):
 
-    df = original_df.copy()
+    index = filter_index.get(original_df)
+    mask = filter_index.all_rows(index) if mask is None else mask
 
     with st.sidebar:
         st.title("Filters")
 
         if("Billing Date" in columns_to_filter):
             # Date Slider
-            min_date = df["Billing Date"].min()
-            max_date = df["Billing Date"].max()
+            dates = original_df["Billing Date"].to_numpy(dtype="datetime64[ns]")[mask]
+            dates = dates[~np.isnat(dates)]
+            min_date = pd.Timestamp(dates.min()) if len(dates) else pd.NaT
+            max_date = pd.Timestamp(dates.max()) if len(dates) else pd.NaT
 
             if pd.notna(min_date) and pd.notna(max_date):
                 start_date, end_date = st.slider(
@@ -34,12 +42,9 @@ def render_sidebar(original_df=None, columns_to_filter=["Regional Office"]):
                     format="DD-MM-YYYY",
                     key="billing_date_range"  # 🔑 important
                 )
-            filtered_df = df[
-            (df["Billing Date"].dt.date >= start_date) &
-            (df["Billing Date"].dt.date <= end_date)]
-
-        filtered_df = apply_multiselect_filters(filtered_df, columns_to_filter)
+            mask = filter_index.date_range(index, "Billing Date", start_date, end_date, mask)
 
+        mask = multiselect_mask(index, columns_to_filter, mask)
 
-    return filtered_df
 
+    return filter_index.rows(index, mask)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+import streamlit as st
+import credit_notes as credit_notes_module
+from credit_notes import credit_notes
+
+
+SLABS = [{"criteria": 0, "amount": 10.0}, {"criteria": 50000, "amount": 25.5}]
+
+def sales_frame(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2024-04-01") + pd.to_timedelta(rng.integers(0, 365, n), "D")
+    df = pd.DataFrame({
+        "Billing Date": dates,
+        "Sold-to Party": rng.integers(100000, 100050, n).astype(str),
+        "Ship-to Party": rng.integers(200000, 200050, n),
+        "Sold-to-Party Name": np.array([f"Cust {i}" for i in range(50)])[rng.integers(0, 50, n)],
+        "Sold-to Group": np.array([f"Grp {i}" for i in range(10)])[rng.integers(0, 10, n)],
+        "Regional Office": np.array(["North", "South", "East", "West"])[rng.integers(0, 4, n)],
+        "Material Group": np.array(["PP", "LLDPE", "HDPE"])[rng.integers(0, 3, n)],
+        "Quantity": rng.integers(1, 50, n) * 1000.0,
+    })
+    df["Year"] = df["Billing Date"].dt.year
+    df["Month"] = df["Billing Date"].dt.month
+    df["Fiscal Year"] = df["Year"] - (df["Month"] < 4)
+    df["Material Family"] = df["Material Group"].map({"PP": "PP", "LLDPE": "PE", "HDPE": "PE"})
+    df.attrs["data_version"] = "test"
+    return df
+
+def discount_json():
+    records = {"Early Bird": [], "Quantity Discount": []}
+    for month in pd.period_range("2024-04", "2025-03", freq="M"):
+        period = {"start_date": str(month.start_time.date()), "end_date": str(month.end_time.date())}
+        records["Early Bird"].append({"material_groups": ["HDPE"], "discount_amount": 20.0, **period})
+        records["Quantity Discount"].append({"material_groups": ["PP"], "discount_amount": SLABS, **period})
+    return records
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setitem(st.session_state, "Sales Data", sales_frame())
+    monkeypatch.setitem(st.session_state, "CMR Data", pd.DataFrame(
+        {"Ship-to Party": np.arange(200000, 200050), "Warehouse Distance": 100.0}))
+    monkeypatch.setitem(st.session_state, "MOU Data", pd.DataFrame(
+        columns=["Sold-to Party", "Sold-to Group", "MOU Start Date", "MOU End Date", "PP", "PE"]))
+
+# Pool that remembers how many worker processes it started
+class CountingPool(credit_notes_module.ProcessPoolExecutor):
+    processes_used = 0
+
+    def shutdown(self, *args, **kwargs):
+        CountingPool.processes_used = max(CountingPool.processes_used, len(self._processes or {}))
+        super().shutdown(*args, **kwargs)
+
+def test_single_fiscal_year_runs_months_in_parallel(session, monkeypatch, tmp_path):
+    monkeypatch.setattr(credit_notes_module, "ProcessPoolExecutor", CountingPool)
+
+    # Each run in a directory of its own, so neither reads the other's cached results
+    (tmp_path / "pool").mkdir()
+    monkeypatch.chdir(tmp_path / "pool")
+    parallel = credit_notes.compute_fiscal_years([2024], discount_json(), workers=2)
+    (tmp_path / "serial").mkdir()
+    monkeypatch.chdir(tmp_path / "serial")
+    serial = credit_notes.compute_fiscal_years([2024], discount_json(), workers=1)
+
+    assert CountingPool.processes_used > 1
+    assert serial.attrs["errors"] == {} and serial.attrs["months_computed"] == 12
+    assert parallel.attrs == serial.attrs
+    pd.testing.assert_frame_equal(parallel, serial, check_exact=True)
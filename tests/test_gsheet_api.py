@@ -0,0 +1,20 @@
+import pandas as pd
+from gsheet_api import gsheet_api
+
+
+def test_values_to_frame_empty_worksheet():
+    df = gsheet_api.values_to_frame([], [])
+    assert df.empty
+    assert list(df.columns) == []
+
+
+def test_values_to_frame_header_only():
+    df = gsheet_api.values_to_frame(["Billing Date", "Quantity"], [])
+    assert df.empty
+    assert list(df.columns) == ["Billing Date", "Quantity"]
+
+
+def test_values_to_frame_pads_short_rows():
+    df = gsheet_api.values_to_frame(["Billing Date", "Quantity"], [["01.05.2025", 5], ["02.05.2025"]])
+    assert len(df) == 2
+    assert pd.isna(df["Quantity"].iloc[1])
@@ -1,11 +1,15 @@
 from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
 import pandas as pd
+import numpy as np
 import plotly.express as px
 from io import BytesIO
 import streamlit as st
 from mitosheet.streamlit.v1 import spreadsheet
 import requests
+import logging
 from bs4 import BeautifulSoup
+from figure_cache import figure_cache
+from sales_query import sales_query
 
 
 FISCAL_START = 4
@@ -15,6 +19,8 @@ month_order = ["April", "May", "June",
 
 PREFERRED_MATERIAL_ORDER = ["HR033","HM120A","F01019S","F02020"]
 
+logger = logging.getLogger(__name__)
+
 def latest_data (df):
     display_year = df.iloc[-1]['Year']
     display_month = df.iloc[-1]['Month Name']
@@ -86,7 +92,7 @@ def render_excel_pivot(df,key):
             valueFormatter="x == null ? '' : x.toLocaleString('en-IN')"
         )
     # ✅ NEW: Configure string columns explicitly to prevent numeric formatting
-    string_cols = df_copy.select_dtypes(include=["object"]).columns.tolist()
+    string_cols = df_copy.select_dtypes(include=["object", "category"]).columns.tolist()
     for col in string_cols:
         gb.configure_column(
             col,
@@ -132,15 +138,86 @@ def render_excel_pivot(df,key):
     )
     df_actions(df_copy,'polymer_sales_report.xlsx',key=key)
 
+# Sum of values per distinct combination of a chart's dimensions. Groups keep the order
+# their first row appears in, so Plotly assigns the same colours and category order it
+# would give the raw lines, while the figure carries one point per bar or slice
+def aggregate_for_chart(df, dims, values):
+    dims = list(dict.fromkeys(dim for dim in dims if dim is not None))
+    # Summed in DuckDB - groups in order of first appearance, missing keys kept
+    return sales_query.sum_by(df, dims, values=[values], sort=False, dropna=False)
+
+# Size of the figure JSON sent to the browser. Logged, and kept in the figure's meta (so
+# cached figures carry it too) for plotly_chart to show under the chart
+def report_payload(fig, name, source_rows):
+    payload_bytes = len(fig.to_json())
+    logger.info("%s: %d rows -> %d bytes", name, source_rows, payload_bytes)
+    fig.update_layout(meta={"payload": {"chart": name, "source_rows": source_rows, "bytes": payload_bytes}})
+    return fig
+
+# st.plotly_chart, with the figure's payload size below it while "Show chart payload sizes"
+# is on in the sidebar
+def plotly_chart(fig, **kwargs):
+    chart = st.plotly_chart(fig, **kwargs)
+    meta = fig.layout.meta
+    payload = meta.get("payload") if isinstance(meta, dict) else None
+    if payload and st.session_state.get("show_payloads"):
+        st.caption(f"{payload['chart']}: {payload['source_rows']:,} rows -> "
+                   f"{payload['bytes'] / 1024:,.1f} KB sent to the browser")
+    return chart
+
+DAY_BINS = [1, 2, 3, 7, 14]
+MONTH_BINS = [1, 2, 3, 6, 12]
+
+# Bin width Plotly's histogram auto-binning picks for these dates - ("D", days) or
+# ("M", months). About 2 std / n^0.4, never narrower than the closest two dates (a gap
+# Plotly rounds up to the next 1/1.9/4.9/9.9 step), rounded up to a calendar width
+def date_bin(dates: pd.Series) -> tuple[str, int]:
+    values = dates.dropna().to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    distinct = np.unique(values)
+    if len(distinct) < 2:
+        return "D", 1
+    min_gap = np.diff(distinct).min()
+    scale = 10 ** np.floor(np.log10(min_gap))
+    min_size = scale * next(step for step in [0.9, 1.9, 4.9, 9.9] if step >= min_gap / scale)
+    size = max(min_size, 2 * values.std() / len(values) ** 0.4)
+
+    days = size / pd.Timedelta(days=1).value
+    if days <= DAY_BINS[-1]:
+        return "D", next(step for step in DAY_BINS if step >= days)
+    months = days / 30.4375
+    return "M", next((step for step in MONTH_BINS if step >= months), int(np.ceil(months / 12)) * 12)
+
+# Per-date sums re-summed into the date_bin intervals of the billing dates, each interval
+# dated by its first day (day bins count from the first date)
+def bin_by_date(data, col, keys, values, dates):
+    unit, size = date_bin(dates)
+    if unit == "D":
+        first = data[col].min().normalize()
+        start = first + pd.to_timedelta((data[col] - first).dt.days // size * size, unit="D")
+    else:
+        months = data[col].dt.year * 12 + data[col].dt.month - 1
+        months = months // size * size
+        start = pd.to_datetime(pd.DataFrame({"year": months // 12, "month": months % 12 + 1, "day": 1}))
+    data = data.assign(**{col: start})
+    data = data.groupby([col] + keys, sort=False, observed=True, dropna=False)[values].sum().reset_index()
+    # Bar span and tick step in Plotly's terms
+    period = size * pd.Timedelta(days=1).value // 10**6 if unit == "D" else f"M{size}"
+    return data, unit, period
+
+# Figures are cached across sessions by rows and parameters - see figure_cache
+@figure_cache.cached()
 def draw_pie(df, values, names, title):
-    fig = px.pie(df, values=values,names = names, title=title)
+    fig = px.pie(aggregate_for_chart(df, [names], values), values=values,names = names, title=title)
     fig.update_traces(texttemplate='<b>%{label}</b>: <br>%{value:.0f} (%{percent:.1%})')
     fig.update_layout(showlegend=False)
-    return fig
+    return report_payload(fig, f"pie {names}", len(df))
 
+@figure_cache.cached()
 def draw_sunburst(df,path,values,title):
-    fig = px.sunburst(df, path=path, values=values, title=title)
-    return fig
+    # Unused categories would become empty sectors
+    df = df.astype({col: object for col in path if isinstance(df[col].dtype, pd.CategoricalDtype)})
+    fig = px.sunburst(aggregate_for_chart(df, path, values), path=path, values=values, title=title)
+    return report_payload(fig, f"sunburst {path[-1]}", len(df))
 
 def prep_matdesc_category_order(df, color = None):
     category_orders = {}
@@ -155,6 +232,7 @@ def prep_matdesc_category_order(df, color = None):
         category_orders[color] = PREFERRED_MATERIAL_ORDER + remaining
     return category_orders
 
+@figure_cache.cached(columns=["Month Name", "Quantity"])
 def draw_histogram_month_quantity(df, color = None, title=None):
     # Get only months that exist in the data, in the correct order
     months_in_data = [m for m in month_order if m in df['Month Name'].unique()]
@@ -167,8 +245,9 @@ def draw_histogram_month_quantity(df, color = None, title=None):
     category_orders.update(
         prep_matdesc_category_order(df, color)
     )
-    fig = px.histogram(
-            df.sort_values(by='Month Name'),
+    # Pre-summed bars, labelled as the sum histogram they replace
+    fig = px.bar(
+            aggregate_for_chart(df.sort_values(by='Month Name'), ["Month Name", color], "Quantity"),
             x="Month Name",
             y="Quantity",
             # pattern_shape="Material Group",
@@ -176,28 +255,45 @@ def draw_histogram_month_quantity(df, color = None, title=None):
             title=title,
             # barmode="group", # Groups the bars side-by-side
             category_orders=category_orders,
+            labels={"Quantity": "sum of Quantity"},
             text_auto=True
             )
+    # Bar labels read the same summed value the histogram labels showed
+    fig.update_traces(texttemplate="%{value}")
     fig.update_layout(
         legend=dict(orientation="h", yanchor="bottom", y=-0.4, xanchor="center", x=0.5),
         xaxis_title="",
         yaxis_title="",
         margin=dict(l=50, r=50, t=80, b=100)  # Adjust left margin
     )
-    return fig
+    return report_payload(fig, f"monthly {color}", len(df))
 
+@figure_cache.cached()
 def draw_histogram_bar(df,x,y,color):
 
     category_orders = prep_matdesc_category_order(df, color)
-    fig = px.histogram(df, x=x, y=y,
-                    color=color, barmode='group',text_auto=True, category_orders=category_orders)
+    data = aggregate_for_chart(df, list(x) + [color], y)
+    # Dates are binned into intervals as the histogram binned them, not one bar per date
+    unit = None
+    if pd.api.types.is_datetime64_any_dtype(data[x[0]]):
+        keys = [col for col in [color] if col is not None and col != x[0]]
+        data, unit, period = bin_by_date(data, x[0], keys, y, df[x[0]])
+    # x is a one-column list - labelled "value" as the wide-form histogram labelled it
+    fig = px.bar(data, x=x[0], y=y,
+                    color=color, barmode='group',text_auto=True, category_orders=category_orders,
+                    labels={x[0]: "value", y: f"sum of {y}"})
+    fig.update_traces(texttemplate="%{value}")
+    if unit is not None:
+        # Each bar spans its interval, ticks one per interval
+        fig.update_traces(xperiod=period, xperiodalignment="middle")
+        fig.update_xaxes(dtick=period, tickformat="%b-%Y" if unit == "M" else "%d-%b")
     fig.update_layout(
         legend=dict(orientation="h", yanchor="bottom", y=-0.4, xanchor="center", x=0.5),
         xaxis_title="",
         yaxis_title="",
         margin=dict(l=50, r=50, t=80, b=100)  # Adjust left margin
     )
-    return fig
+    return report_payload(fig, f"bars {x[0]} by {color}", len(df))
 
 def download_excel(df, filename='data.xlsx', button_label='📥 Download Excel', key='download_button'):
     """
@@ -298,6 +394,7 @@ def period_selection(df):
 def apply_common_styles(title):
     st.set_page_config(layout="wide",initial_sidebar_state="collapsed") 
     st.markdown(f"### {title}")
+    st.sidebar.toggle("Show chart payload sizes", key="show_payloads")
     st.markdown("""
         <style>
         .block-container {